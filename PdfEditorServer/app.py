@@ -1,17 +1,50 @@
 # app.py
+import io
 import os
 import re
 import json
+import gzip
 import base64
+import hashlib
 import mimetypes
 import subprocess
 import tempfile
 import shutil
+import threading
+import time
+import uuid
+import multiprocessing
+import math
+import itertools
+import struct
+import sys
+import zlib
+from array import array
+from collections import OrderedDict
+from contextlib import contextmanager
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 from typing import List, Tuple, Optional
 
-from flask import Flask, jsonify, request
+from flask import Flask, Response, jsonify, request, send_file
 from flask_cors import CORS
 
+from spatial_index import GridIndex, UnionFind, merge_overlapping_rects, rect_manhattan_distance, rects_overlap
+
+# Optional response encodings; gzip is always available
+try:
+    import brotli
+except ImportError:
+    brotli = None
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+# Optional binary payload format (?format=msgpack)
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
 app = Flask(__name__)
 CORS(app)
 
@@ -20,6 +53,289 @@ ALLOWED_EXTENSIONS = {"pdf"}
 app.config["UPLOAD_FOLDER"] = UPLOAD_FOLDER
 os.makedirs(UPLOAD_FOLDER, exist_ok=True)
 
+# Uploads are stored by content hash and expire after UPLOAD_TTL_SECONDS without use
+UPLOAD_TTL_SECONDS = 60 * 60
+UPLOAD_MAX_DISK_BYTES = 1024 * 1024 * 1024
+UPLOAD_SWEEP_INTERVAL_SECONDS = 60
+# PDFs up to this size are kept in memory and opened from the request stream
+UPLOAD_INMEMORY_MAX_BYTES = 8 * 1024 * 1024
+UPLOAD_MAX_MEMORY_BYTES = 256 * 1024 * 1024
+
+# Bump whenever extractor output changes so stale cached results are not served
+EXTRACTOR_VERSION = "2"
+
+RESULT_CACHE_DIR = "cache"
+RESULT_CACHE_MAX_MEMORY_BYTES = 128 * 1024 * 1024
+RESULT_CACHE_MAX_DISK_BYTES = 2 * 1024 * 1024 * 1024
+RESULT_CACHE_GZIP_LEVEL = 6
+app.config["RESULT_CACHE_DIR"] = RESULT_CACHE_DIR
+
+# Content-Encoding negotiation (Accept-Encoding). Results are cached gzip
+# compressed; br/zstd variants are produced once per cache entry on demand.
+RESPONSE_BROTLI_QUALITY = 5
+RESPONSE_ZSTD_LEVEL = 6
+RESPONSE_STREAM_GZIP_LEVEL = 6
+
+# ?schema=2 compact payloads: coordinates are rounded to this many decimals
+# unless the request asks for ?precision=N (0..SCHEMA_V2_MAX_PRECISION)
+SCHEMA_V2_PRECISION = 4
+SCHEMA_V2_MAX_PRECISION = 10
+
+# ?vectors=layers packs each page's vector paths into a few layered SVGs of
+# at most this many paths, instead of one item (and one SVG) per path
+VECTOR_LAYER_MAX_PATHS = 5000
+
+# ?coalesce=1 merges neighbouring same-style vector paths (table grids,
+# hairlines) into compound paths of at most VECTOR_COALESCE_MAX_PATHS paths
+# whose bbox covers at most VECTOR_COALESCE_MAX_AREA of the page; paths
+# closer than VECTOR_COALESCE_GAP points count as adjacent
+VECTOR_COALESCE_MAX_PATHS = 1000
+VECTOR_COALESCE_MAX_AREA = 0.5
+VECTOR_COALESCE_GAP = 1.0
+
+# Extracted images/vectors served from GET /assets/<sha256> (?assets=url).
+# Keep the budget at least as large as the result cache: cached url-mode
+# results reference these files.
+ASSET_DIR = "assets"
+ASSET_MAX_DISK_BYTES = 4 * 1024 * 1024 * 1024
+ASSET_MAX_AGE_SECONDS = 365 * 24 * 60 * 60
+app.config["ASSET_DIR"] = ASSET_DIR
+
+# Background extraction jobs (POST /jobs)
+JOB_WORKERS = 4
+JOB_MAX_PENDING = 64
+JOB_RESULT_TTL_SECONDS = 15 * 60
+
+# Page-parallel extraction: documents with at least EXTRACT_PARALLEL_MIN_PAGES
+# pages are sharded into page ranges across a process pool (0/1 workers disables)
+EXTRACT_PROCESS_WORKERS = os.cpu_count() or 1
+EXTRACT_PARALLEL_MIN_PAGES = 16
+EXTRACT_PARALLEL_CHUNK_PAGES = 8
+
+# ========= request timing =========
+
+class StageTimer:
+    """
+    Wall-clock time per pipeline stage, per page and item counts for one
+    request or job, reported as a Server-Timing header and one JSON log line.
+
+    Timers are passed explicitly because extraction also runs in job threads
+    and worker processes, outside any request context; page timers from
+    workers are merged back in, so with parallel extraction the stage sums
+    can exceed the wall time ("total").
+    """
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.stages: dict = {}
+        self.page_seconds: dict = {}
+        self.item_counts: dict = {}
+        self.drawing_count = 0
+        self.extractor: Optional[str] = None  # "manifest" or "pymupdf" once known
+
+    @contextmanager
+    def stage(self, name: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(name, time.perf_counter() - start)
+
+    def add(self, name: str, seconds: float) -> None:
+        self.stages[name] = self.stages.get(name, 0.0) + seconds
+
+    def add_page(self, page_index: int, seconds: float) -> None:
+        self.page_seconds[page_index] = seconds
+
+    def count_items(self, items: List[dict]) -> None:
+        for item in items:
+            kind = item.get("type") or ("text" if "text" in item else "image")
+            self.item_counts[kind] = self.item_counts.get(kind, 0) + 1
+
+    def merge(self, other: "StageTimer") -> None:
+        for name, seconds in other.stages.items():
+            self.add(name, seconds)
+        self.page_seconds.update(other.page_seconds)
+        for kind, count in other.item_counts.items():
+            self.item_counts[kind] = self.item_counts.get(kind, 0) + count
+        self.drawing_count += other.drawing_count
+
+    def elapsed(self) -> float:
+        return time.perf_counter() - self.started
+
+    def server_timing(self) -> str:
+        parts = [f"{name};dur={seconds * 1000:.1f}" for name, seconds in self.stages.items()]
+        parts.append(f"total;dur={self.elapsed() * 1000:.1f}")
+        return ", ".join(parts)
+
+    def log(self, **fields) -> None:
+        slowest = sorted(self.page_seconds.items(), key=lambda kv: kv[1], reverse=True)[:3]
+        record = {
+            "event": "extraction_timing",
+            **fields,
+            "totalMs": round(self.elapsed() * 1000, 1),
+            "stagesMs": {name: round(seconds * 1000, 1) for name, seconds in self.stages.items()},
+            "pagesExtracted": len(self.page_seconds),
+            "items": self.item_counts,
+            "slowestPages": [{"index": i, "ms": round(sec * 1000, 1)} for i, sec in slowest],
+        }
+        if self.extractor:
+            record["extractor"] = self.extractor
+        print(json.dumps(record, separators=(",", ":")), flush=True)
+        _observe_request_metrics(self, fields)
+
+# ========= metrics (Prometheus text format) =========
+
+def _escape_label_value(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+def _format_labels(labels: Tuple[Tuple[str, str], ...]) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape_label_value(value)}"' for name, value in labels) + "}"
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+class _Metric:
+    kind = "untyped"
+
+    def __init__(self, name: str, help_text: str, label_names: Tuple[str, ...] = ()):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = label_names
+        self._values: dict = {}
+        self._lock = threading.Lock()
+
+    def _key(self, labels: dict) -> Tuple[Tuple[str, str], ...]:
+        return tuple((name, str(labels.get(name, ""))) for name in self.label_names)
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} {self.kind}"]
+        with self._lock:
+            for key, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_format_labels(key)} {_format_value(value)}")
+        return lines
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, amount: float = 1, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def inc(self, amount: float = 1, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount: float = 1, **labels) -> None:
+        self.inc(-amount, **labels)
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, help_text: str, buckets: Tuple[float, ...],
+                 label_names: Tuple[str, ...] = ()):
+        super().__init__(name, help_text, label_names)
+        self.buckets = tuple(sorted(buckets)) + (float("inf"),)
+
+    def observe(self, value: float, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            counts, total = self._values.get(key) or ([0] * len(self.buckets), 0.0)
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[i] += 1
+            self._values[key] = (counts, total + value)
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} {self.kind}"]
+        with self._lock:
+            for key, (counts, total) in sorted(self._values.items()):
+                for bound, count in zip(self.buckets, counts):
+                    labels = _format_labels(key + (("le", _format_value(bound)),))
+                    lines.append(f"{self.name}_bucket{labels} {count}")
+                lines.append(f"{self.name}_sum{_format_labels(key)} {_format_value(total)}")
+                lines.append(f"{self.name}_count{_format_labels(key)} {counts[-1]}")
+        return lines
+
+class MetricsRegistry:
+    """
+    In-process metrics rendered in the Prometheus text exposition format for
+    GET /metrics. Values are per server process; scrape each worker.
+    """
+
+    def __init__(self):
+        self._metrics: List[_Metric] = []
+
+    def register(self, metric: _Metric) -> _Metric:
+        self._metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        lines: List[str] = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+_LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+_COUNT_BUCKETS = (0, 1, 2, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000)
+_BYTES_BUCKETS = tuple(1024 * 4 ** i for i in range(10))  # 1 KiB .. 256 MiB
+
+metrics = MetricsRegistry()
+metric_request_seconds = metrics.register(Histogram(
+    "pdfeditor_request_duration_seconds", "Request latency.",
+    _LATENCY_BUCKETS, ("route", "cache")))
+metric_stage_seconds = metrics.register(Histogram(
+    "pdfeditor_extraction_stage_duration_seconds",
+    "Time spent per extraction pipeline stage, per request.",
+    _LATENCY_BUCKETS, ("stage",)))
+metric_extractions = metrics.register(Counter(
+    "pdfeditor_extractions_total",
+    "Extractions by source: embedded manifest hit or PyMuPDF fallback.", ("extractor",)))
+metric_cache_lookups = metrics.register(Counter(
+    "pdfeditor_result_cache_lookups_total", "Result cache lookups.", ("route", "cache")))
+metric_document_pages = metrics.register(Histogram(
+    "pdfeditor_document_pages", "Pages extracted per document.", _COUNT_BUCKETS))
+metric_document_drawings = metrics.register(Histogram(
+    "pdfeditor_document_drawings", "Vector drawings (get_drawings paths) per document.", _COUNT_BUCKETS))
+metric_document_images = metrics.register(Histogram(
+    "pdfeditor_document_images", "Placed raster images per document.", _COUNT_BUCKETS))
+metric_response_bytes = metrics.register(Histogram(
+    "pdfeditor_response_bytes", "Response payload size as sent.", _BYTES_BUCKETS, ("route",)))
+metric_extractions_in_flight = metrics.register(Gauge(
+    "pdfeditor_extractions_in_flight", "Extractions currently running."))
+metric_extraction_errors = metrics.register(Counter(
+    "pdfeditor_extraction_errors_total", "Failed extractions.", ("route",)))
+
+def _observe_request_metrics(timer: StageTimer, fields: dict) -> None:
+    """Fold one finished request (or job) into the aggregate metrics."""
+    route = fields.get("route", "")
+    cache = fields.get("cache", "")
+    metric_request_seconds.observe(timer.elapsed(), route=route, cache=cache)
+    if cache:
+        metric_cache_lookups.inc(route=route, cache=cache)
+    for stage, seconds in timer.stages.items():
+        metric_stage_seconds.observe(seconds, stage=stage)
+    if fields.get("payloadBytes") is not None:
+        metric_response_bytes.observe(fields["payloadBytes"], route=route)
+    if fields.get("error"):
+        metric_extraction_errors.inc(route=route)
+    if timer.extractor:
+        metric_extractions.inc(extractor=timer.extractor)
+    if timer.extractor == "pymupdf":
+        metric_document_pages.observe(len(timer.page_seconds))
+        metric_document_drawings.observe(timer.drawing_count)
+        metric_document_images.observe(timer.item_counts.get("image", 0))
+
 # ========= manifest helpers (pypdf) =========
 
 def _iter_name_tree(node, reader):
@@ -81,22 +397,97 @@ def _coerce_to_bytes(value):
             return None
     return None
 
-def _decode_json_bytes(b):
-    """Try multiple decodings to turn bytes into JSON."""
-    if not b:
-        return None
-    for enc in ("utf-8", "latin-1"):
+_JSON_DECODER = json.JSONDecoder()
+_JSON_WS_RE = re.compile(r"[ \t\n\r]*")
+
+def _scan_manifest(text: str) -> Tuple[dict, Optional[List[Tuple[int, int]]]]:
+    """
+    Parse the top level of a manifest JSON object into (the keys other than
+    "pages", [(start, end) of each "pages" element] or None). Every value is
+    consumed by the C decoder one at a time, so at most one page is ever
+    materialized. Raises ValueError if text is not a JSON object.
+    """
+    ws = _JSON_WS_RE.match
+    top: dict = {}
+    spans = None
+
+    def expect(i: int, chars: str) -> Tuple[int, str]:
+        c = text[i:i + 1]
+        if not c or c not in chars:
+            raise ValueError(f"Expected one of {chars!r} at offset {i}")
+        return ws(text, i + 1).end(), c
+
+    i, _ = expect(ws(text, 0).end(), "{")
+    if text[i:i + 1] == "}":
+        return top, spans
+    while True:
+        key, i = _JSON_DECODER.raw_decode(text, i)
+        if not isinstance(key, str):
+            raise ValueError(f"Expected a key at offset {i}")
+        i, _ = expect(ws(text, i).end(), ":")
+        if key == "pages" and text[i:i + 1] == "[":
+            spans = []
+            i = ws(text, i + 1).end()
+            if text[i:i + 1] == "]":
+                i += 1
+            else:
+                while True:
+                    _, end = _JSON_DECODER.raw_decode(text, i)
+                    spans.append((i, end))
+                    i, c = expect(ws(text, end).end(), ",]")
+                    if c == "]":
+                        break
+        else:
+            top[key], i = _JSON_DECODER.raw_decode(text, i)
+        i, c = expect(ws(text, i).end(), ",}")
+        if c == "}":
+            return top, spans
+
+class LazyManifest:
+    """
+    A manifest.json whose pages are materialized on demand. Loading parses
+    the top-level keys and records where each "pages" element starts and
+    ends; page(i) then parses just that page, so memory stays at the JSON
+    text plus the pages in use.
+    """
+
+    def __init__(self, text: str, top: dict, spans: List[Tuple[int, int]]):
+        self._text = text
+        self._top = top
+        self._spans = spans
+
+    @classmethod
+    def load(cls, data) -> Optional["LazyManifest"]:
+        """Index manifest.json bytes; None unless they hold a JSON object."""
+        if not data:
+            return None
+        data = bytes(data)
         try:
-            return json.loads(b.decode(enc))
-        except Exception:
-            pass
-    try:
-        return json.loads(b.decode("utf-8", "ignore"))
-    except Exception:
-        return None
+            text = data.decode("utf-8")
+        except UnicodeDecodeError:
+            text = data.decode("latin-1")
+        try:
+            top, spans = _scan_manifest(text)
+        except ValueError:
+            return None
+        return cls(text, top, spans or [])
 
-def _extract_manifest_with_pypdf(path):
-    """Try reading an embedded 'manifest.json' using pypdf."""
+    @property
+    def page_count(self) -> int:
+        return len(self._spans)
+
+    def get(self, key: str, default=None):
+        """A top-level manifest key other than "pages"."""
+        return self._top.get(key, default)
+
+    def page(self, index: int) -> dict:
+        """Parse and return pages[index] ({} if it is not an object)."""
+        start, end = self._spans[index]
+        page = json.loads(self._text[start:end])
+        return page if isinstance(page, dict) else {}
+
+def _extract_manifest_with_pypdf(source):
+    """Try reading an embedded 'manifest.json' using pypdf (source: path or bytes)."""
     try:
         from pypdf import PdfReader
         from pypdf.generic import DictionaryObject
@@ -104,7 +495,10 @@ def _extract_manifest_with_pypdf(path):
         return None
 
     try:
-        reader = PdfReader(path)
+        if isinstance(source, (bytes, bytearray, memoryview)):
+            reader = PdfReader(io.BytesIO(source))
+        else:
+            reader = PdfReader(source)
 
         # 0) Non-standard: reader.embeddedFiles
         if hasattr(reader, "embeddedFiles") and reader.embeddedFiles:
@@ -134,7 +528,7 @@ def _extract_manifest_with_pypdf(path):
                         name = "manifest.json"
 
                 if str(name).lower().endswith("manifest.json"):
-                    manifest = _decode_json_bytes(data_bytes)
+                    manifest = LazyManifest.load(data_bytes)
                     if manifest is not None:
                         return manifest
 
@@ -166,7 +560,7 @@ def _extract_manifest_with_pypdf(path):
                         fs = fs_indirect.get_object()
                         name, data = _extract_file_from_filespec(fs)
                         if data:
-                            manifest = _decode_json_bytes(data)
+                            manifest = LazyManifest.load(data)
                             if manifest is not None:
                                 return manifest
 
@@ -179,7 +573,7 @@ def _extract_manifest_with_pypdf(path):
                     continue
                 name, data = _extract_file_from_filespec(fs)
                 if data and str(name).lower().endswith("manifest.json"):
-                    manifest = _decode_json_bytes(data)
+                    manifest = LazyManifest.load(data)
                     if manifest is not None:
                         return manifest
 
@@ -194,7 +588,7 @@ def _extract_manifest_with_pypdf(path):
                     continue
                 name, data = _extract_file_from_filespec(fs)
                 if data and str(name).lower().endswith("manifest.json"):
-                    manifest = _decode_json_bytes(data)
+                    manifest = LazyManifest.load(data)
                     if manifest is not None:
                         return manifest
 
@@ -203,9 +597,55 @@ def _extract_manifest_with_pypdf(path):
 
     return None
 
-def try_extract_manifest(path):
-    """Return parsed manifest dict if present, else None."""
-    manifest = _extract_manifest_with_pypdf(path)
+def _find_manifest_with_pymupdf(doc):
+    """
+    Look for an embedded manifest.json through an already open PyMuPDF
+    document: catalog /Names /EmbeddedFiles, catalog /AF, then page /AF.
+    Documents whose catalog has no attachments at all (the common case)
+    return None straight away; only otherwise are the pages' /AF entries
+    scanned.
+    """
+    catalog = doc.pdf_catalog()
+    embedded = doc.embfile_names()
+    catalog_files = _af_filespecs(doc, catalog)
+    if not embedded and not catalog_files:
+        return None
+
+    for name in embedded:
+        if name.lower().endswith("manifest.json"):
+            manifest = LazyManifest.load(doc.embfile_get(name))
+            if manifest is not None:
+                return manifest
+
+    def _manifest_from(filespecs):
+        for name, filespec_xref in filespecs:
+            if name.lower().endswith("manifest.json"):
+                manifest = LazyManifest.load(_filespec_data(doc, filespec_xref))
+                if manifest is not None:
+                    return manifest
+        return None
+
+    manifest = _manifest_from(catalog_files)
+    for page_index in range(doc.page_count):
+        if manifest is not None:
+            break
+        manifest = _manifest_from(_af_filespecs(doc, doc.page_xref(page_index)))
+    return manifest
+
+def try_extract_manifest(source, doc=None):
+    """
+    Return the embedded manifest as a LazyManifest if present, else None.
+    Only its top-level keys are parsed when it is found; each page is
+    parsed when LazyManifest.page() asks for it. Given the open PyMuPDF
+    document, it is probed directly; pypdf (imported on first use) only
+    reads the source if that probe fails.
+    """
+    if doc is not None:
+        try:
+            return _find_manifest_with_pymupdf(doc)
+        except Exception as e:
+            print(f"[try_extract_manifest] PyMuPDF manifest probe failed, falling back to pypdf: {e}")
+    manifest = _extract_manifest_with_pypdf(source)
     return manifest
 
 # ========= image helpers / manifest flatten =========
@@ -220,18 +660,19 @@ def _guess_mime_from_name(name: str, fallback="image/png"):
     guess, _ = mimetypes.guess_type(name)
     return guess or fallback
 
+_BASE64_RE = re.compile(r"[A-Za-z0-9+/]*={0,2}")
+
 def _looks_like_base64(s: str) -> bool:
-    if not isinstance(s, str) or len(s) < 16:
-        return False
-    try:
-        base64.b64decode(s, validate=True)
-        return True
-    except Exception:
+    """Strict base64 syntax check; never decodes (manifest images can be many MB)."""
+    if not isinstance(s, str) or len(s) < 16 or len(s) % 4:
         return False
+    return _BASE64_RE.fullmatch(s) is not None
 
 def _ensure_data_uri_from_ref_or_data(im: dict) -> Optional[str]:
     """
     Ensure a manifest image entry produces a data: URI when possible.
+    Data URIs pass through untouched and bare base64 is wrapped as is, so
+    base64 image data is never decoded and re-encoded.
     """
     ref = im.get("ref")
     if isinstance(ref, str) and ref.startswith("data:"):
@@ -245,11 +686,7 @@ def _ensure_data_uri_from_ref_or_data(im: dict) -> Optional[str]:
     mime = _guess_mime_from_name(name)
 
     if isinstance(ref, str) and _looks_like_base64(ref):
-        try:
-            raw = base64.b64decode(ref, validate=True)
-            return _data_uri(mime, raw)
-        except Exception:
-            pass
+        return f"data:{mime};base64,{ref}"
 
     val = im.get("data")
     if val is not None:
@@ -259,193 +696,202 @@ def _ensure_data_uri_from_ref_or_data(im: dict) -> Optional[str]:
             if val.startswith("data:"):
                 return val
             if _looks_like_base64(val):
-                try:
-                    raw = base64.b64decode(val, validate=True)
-                    return _data_uri(mime, raw)
-                except Exception:
-                    pass
+                return f"data:{mime};base64,{val}"
     return None
 
 def flatten_manifest_to_payload(manifest):
     """
-    Convert embedded manifest into the flat list your frontend consumes.
+    Yield the flat items your frontend consumes from an embedded manifest
+    (a dict or LazyManifest), one page at a time, each page in z-order.
     (No clamping of normalized coords.)
     """
-    if not isinstance(manifest, dict):
-        return None
-    pages = manifest.get("pages")
-    if not isinstance(pages, list):
-        return None
+    if isinstance(manifest, LazyManifest):
+        pages = (manifest.page(i) for i in range(manifest.page_count))
+    elif isinstance(manifest, dict) and isinstance(manifest.get("pages"), list):
+        pages = manifest["pages"]
+    else:
+        return
+    for i, page in enumerate(pages):
+        yield from _flatten_manifest_page(page if isinstance(page, dict) else {}, i)
 
+def _z_order_key(item: dict) -> int:
+    return item["zOrder"]
+
+def _flatten_manifest_page(page: dict, i: int) -> List[dict]:
+    """Flatten one manifest page (page index i) into payload items, in z-order."""
     out = []
-    for i, page in enumerate(pages):
-        # TEXT
-        text_span_counter = 0
-        for t in (page.get("texts") or []):
-            x_norm = t.get("xNorm")
-            y_norm_top = t.get("yNormTop")
+    # TEXT
+    text_span_counter = 0
+    for t in (page.get("texts") or []):
+        x_norm = t.get("xNorm")
+        y_norm_top = t.get("yNormTop")
+        if x_norm is None or y_norm_top is None:
+            continue
+        text_content = t.get("text", "")
+        font_size = float(t.get("fontSize")) if t.get("fontSize") is not None else None
+
+        z_index = t.get("zIndex", 10)
+        item = {
+            "text": text_content,
+            "xNorm": float(x_norm),
+            "yNormTop": float(y_norm_top),
+            "fontSize": font_size,
+            "index": i,
+            "anchor": "top",
+            # Use zIndex from manifest for proper layer ordering
+            "zOrder": int(z_index) if z_index is not None else (2_000_000 + len(out)),
+            "zIndex": int(z_index) if z_index is not None else 10,
+        }
+        if "boxPadding" in t and t["boxPadding"] is not None:
+            try:
+                item["boxPadding"] = float(t["boxPadding"])
+            except Exception:
+                pass
+        if "fontFamily" in t and t["fontFamily"]:
+            item["fontFamily"] = str(t["fontFamily"])
+        # Include color if available (preserve original text color)
+        if "color" in t and t["color"]:
+            item["color"] = str(t["color"])
+        # Include text item ID for annotation linking if available
+        if "id" in t and t["id"]:
+            item["id"] = str(t["id"])
+        # Layer properties
+        if "visible" in t:
+            item["visible"] = bool(t["visible"])
+        if "locked" in t:
+            item["locked"] = bool(t["locked"])
+        if "name" in t and t["name"]:
+            item["name"] = str(t["name"])
+        out.append(item)
+
+    # TEXT SPANS - prefer pre-computed textSpans from manifest if available
+    # Otherwise generate from texts array
+    manifest_text_spans = page.get("textSpans") or []
+    if manifest_text_spans:
+        # Use pre-computed textSpans from manifest (accurate measurements from client)
+        for ts in manifest_text_spans:
+            x_norm = ts.get("xNorm")
+            y_norm_top = ts.get("yNormTop")
             if x_norm is None or y_norm_top is None:
                 continue
-            text_content = t.get("text", "")
-            font_size = float(t.get("fontSize")) if t.get("fontSize") is not None else None
 
-            z_index = t.get("zIndex", 10)
-            item = {
-                "text": text_content,
+            text_span_item = {
+                "type": "textSpan",
+                "text": ts.get("text", ""),
                 "xNorm": float(x_norm),
                 "yNormTop": float(y_norm_top),
-                "fontSize": font_size,
+                "widthNorm": float(ts.get("widthNorm", 0)),
+                "heightNorm": float(ts.get("heightNorm", 0)),
+                "fontSize": float(ts.get("fontSize")) if ts.get("fontSize") is not None else None,
                 "index": i,
-                "anchor": "top",
-                # Use zIndex from manifest for proper layer ordering
-                "zOrder": int(z_index) if z_index is not None else (2_000_000 + len(out)),
-                "zIndex": int(z_index) if z_index is not None else 10,
+                "zOrder": 2_500_000 + text_span_counter,
             }
-            if "boxPadding" in t and t["boxPadding"] is not None:
-                try:
-                    item["boxPadding"] = float(t["boxPadding"])
-                except Exception:
-                    pass
-            if "fontFamily" in t and t["fontFamily"]:
-                item["fontFamily"] = str(t["fontFamily"])
-            # Include color if available (preserve original text color)
-            if "color" in t and t["color"]:
-                item["color"] = str(t["color"])
-            # Include text item ID for annotation linking if available
-            if "id" in t and t["id"]:
-                item["id"] = str(t["id"])
-            # Layer properties
-            if "visible" in t:
-                item["visible"] = bool(t["visible"])
-            if "locked" in t:
-                item["locked"] = bool(t["locked"])
-            if "name" in t and t["name"]:
-                item["name"] = str(t["name"])
-            out.append(item)
 
-        # TEXT SPANS - prefer pre-computed textSpans from manifest if available
-        # Otherwise generate from texts array
-        manifest_text_spans = page.get("textSpans") or []
-        if manifest_text_spans:
-            # Use pre-computed textSpans from manifest (accurate measurements from client)
-            for ts in manifest_text_spans:
-                x_norm = ts.get("xNorm")
-                y_norm_top = ts.get("yNormTop")
-                if x_norm is None or y_norm_top is None:
-                    continue
+            # Include font metrics if available
+            if ts.get("ascentRatio") is not None:
+                text_span_item["ascentRatio"] = float(ts["ascentRatio"])
+            if ts.get("descentRatio") is not None:
+                text_span_item["descentRatio"] = float(ts["descentRatio"])
+
+            out.append(text_span_item)
+            text_span_counter += 1
+    else:
+        # Fallback: generate textSpans from texts array
+        for t in (page.get("texts") or []):
+            x_norm = t.get("xNorm")
+            y_norm_top = t.get("yNormTop")
+            if x_norm is None or y_norm_top is None:
+                continue
+            text_content = t.get("text", "")
+            font_size = float(t.get("fontSize")) if t.get("fontSize") is not None else None
+
+            # Only generate textSpan if we have text content and font size
+            if text_content and font_size:
+                # Try to get accurate dimensions from manifest
+                width_norm = t.get("widthNorm")
+                height_norm = t.get("heightNorm")
+                ascent_ratio = t.get("ascentRatio")  # baseline position from top
+                descent_ratio = t.get("descentRatio")
+
+                # Fall back to estimates if not available
+                if width_norm is None:
+                    # Rough character width estimate (0.5 * fontSize for average char)
+                    # Assume A4 page width of 595 points (standard PDF)
+                    char_width_estimate = font_size * 0.5
+                    text_width_points = len(text_content) * char_width_estimate
+                    width_norm = text_width_points / 595.0
+                if height_norm is None:
+                    # Estimate: textHeight ≈ fontSize (ascent + descent)
+                    # A4 height is 842 points
+                    height_norm = font_size / 842.0
 
                 text_span_item = {
                     "type": "textSpan",
-                    "text": ts.get("text", ""),
+                    "text": text_content,
                     "xNorm": float(x_norm),
                     "yNormTop": float(y_norm_top),
-                    "widthNorm": float(ts.get("widthNorm", 0)),
-                    "heightNorm": float(ts.get("heightNorm", 0)),
-                    "fontSize": float(ts.get("fontSize")) if ts.get("fontSize") is not None else None,
+                    "widthNorm": float(width_norm),
+                    "heightNorm": float(height_norm),
+                    "fontSize": font_size,
                     "index": i,
                     "zOrder": 2_500_000 + text_span_counter,
                 }
 
-                # Include font metrics if available
-                if ts.get("ascentRatio") is not None:
-                    text_span_item["ascentRatio"] = float(ts["ascentRatio"])
-                if ts.get("descentRatio") is not None:
-                    text_span_item["descentRatio"] = float(ts["descentRatio"])
+                # Include font metrics if available for accurate annotation positioning
+                if ascent_ratio is not None:
+                    text_span_item["ascentRatio"] = float(ascent_ratio)
+                if descent_ratio is not None:
+                    text_span_item["descentRatio"] = float(descent_ratio)
 
                 out.append(text_span_item)
                 text_span_counter += 1
-        else:
-            # Fallback: generate textSpans from texts array
-            for t in (page.get("texts") or []):
-                x_norm = t.get("xNorm")
-                y_norm_top = t.get("yNormTop")
-                if x_norm is None or y_norm_top is None:
-                    continue
-                text_content = t.get("text", "")
-                font_size = float(t.get("fontSize")) if t.get("fontSize") is not None else None
-
-                # Only generate textSpan if we have text content and font size
-                if text_content and font_size:
-                    # Try to get accurate dimensions from manifest
-                    width_norm = t.get("widthNorm")
-                    height_norm = t.get("heightNorm")
-                    ascent_ratio = t.get("ascentRatio")  # baseline position from top
-                    descent_ratio = t.get("descentRatio")
-
-                    # Fall back to estimates if not available
-                    if width_norm is None:
-                        # Rough character width estimate (0.5 * fontSize for average char)
-                        # Assume A4 page width of 595 points (standard PDF)
-                        char_width_estimate = font_size * 0.5
-                        text_width_points = len(text_content) * char_width_estimate
-                        width_norm = text_width_points / 595.0
-                    if height_norm is None:
-                        # Estimate: textHeight ≈ fontSize (ascent + descent)
-                        # A4 height is 842 points
-                        height_norm = font_size / 842.0
-
-                    text_span_item = {
-                        "type": "textSpan",
-                        "text": text_content,
-                        "xNorm": float(x_norm),
-                        "yNormTop": float(y_norm_top),
-                        "widthNorm": float(width_norm),
-                        "heightNorm": float(height_norm),
-                        "fontSize": font_size,
-                        "index": i,
-                        "zOrder": 2_500_000 + text_span_counter,
-                    }
 
-                    # Include font metrics if available for accurate annotation positioning
-                    if ascent_ratio is not None:
-                        text_span_item["ascentRatio"] = float(ascent_ratio)
-                    if descent_ratio is not None:
-                        text_span_item["descentRatio"] = float(descent_ratio)
+    # IMAGES
+    for im in (page.get("images") or []):
+        try:
+            x_norm = float(im["xNorm"])
+            y_norm_top = float(im["yNormTop"])
+            width_norm = float(im["widthNorm"])
+            height_norm = float(im["heightNorm"])
+        except Exception:
+            continue
 
-                    out.append(text_span_item)
-                    text_span_counter += 1
+        z_index = im.get("zIndex", -100)
+        img_item = {
+            "type": "image",
+            "xNorm": x_norm,
+            "yNormTop": y_norm_top,
+            "widthNorm": width_norm,
+            "heightNorm": height_norm,
+            "index": i,
+            # Use zIndex from manifest for proper layer ordering
+            "zOrder": int(z_index) if z_index is not None else (1_000_000 + len(out)),
+            "zIndex": int(z_index) if z_index is not None else -100,
+        }
 
-        # IMAGES
-        for im in (page.get("images") or []):
+        if "name" in im:
+            img_item["name"] = im.get("name")
+        # Layer properties
+        if "visible" in im:
+            img_item["visible"] = bool(im["visible"])
+        if "locked" in im:
+            img_item["locked"] = bool(im["locked"])
+        if "pixelWidth" in im:
             try:
-                x_norm = float(im["xNorm"])
-                y_norm_top = float(im["yNormTop"])
-                width_norm = float(im["widthNorm"])
-                height_norm = float(im["heightNorm"])
+                img_item["pixelWidth"] = int(im["pixelWidth"]) if im["pixelWidth"] is not None else None
             except Exception:
-                continue
-
-            z_index = im.get("zIndex", -100)
-            img_item = {
-                "type": "image",
-                "xNorm": x_norm,
-                "yNormTop": y_norm_top,
-                "widthNorm": width_norm,
-                "heightNorm": height_norm,
-                "index": i,
-                # Use zIndex from manifest for proper layer ordering
-                "zOrder": int(z_index) if z_index is not None else (1_000_000 + len(out)),
-                "zIndex": int(z_index) if z_index is not None else -100,
-            }
-
-            if "name" in im:
-                img_item["name"] = im.get("name")
-            # Layer properties
-            if "visible" in im:
-                img_item["visible"] = bool(im["visible"])
-            if "locked" in im:
-                img_item["locked"] = bool(im["locked"])
-            if "pixelWidth" in im:
-                try:
-                    img_item["pixelWidth"] = int(im["pixelWidth"]) if im["pixelWidth"] is not None else None
-                except Exception:
-                    img_item["pixelWidth"] = None
-            if "pixelHeight" in im:
-                try:
-                    img_item["pixelHeight"] = int(im["pixelHeight"]) if im["pixelHeight"] is not None else None
-                except Exception:
-                    img_item["pixelHeight"] = None
+                img_item["pixelWidth"] = None
+        if "pixelHeight" in im:
+            try:
+                img_item["pixelHeight"] = int(im["pixelHeight"]) if im["pixelHeight"] is not None else None
+            except Exception:
+                img_item["pixelHeight"] = None
 
+        if isinstance(im.get("asset"), str):
+            # Manifest v2: bytes live in a separate embedded file, resolved
+            # by _resolve_manifest_assets without any base64 round trip
+            img_item["asset"] = im["asset"]
+        else:
             data_uri = _ensure_data_uri_from_ref_or_data(im)
             if data_uri:
                 img_item["ref"] = data_uri
@@ -453,220 +899,344 @@ def flatten_manifest_to_payload(manifest):
                 if "ref" in im:
                     img_item["ref"] = im.get("ref")
 
-            out.append(img_item)
+        out.append(img_item)
 
-        # SHAPES (rectangle, circle, line, arrow, triangle, diamond, freehand)
-        shape_counter = 0
-        for shape in (page.get("shapes") or []):
-            shape_type = shape.get("type")
-            if not shape_type:
-                continue
+    # SHAPES (rectangle, circle, line, arrow, triangle, diamond, freehand)
+    shape_counter = 0
+    for shape in (page.get("shapes") or []):
+        shape_type = shape.get("type")
+        if not shape_type:
+            continue
+
+        try:
+            x_norm = float(shape.get("xNorm", 0))
+            y_norm_top = float(shape.get("yNormTop", 0))
+            width_norm = float(shape.get("widthNorm", 0))
+            height_norm = float(shape.get("heightNorm", 0))
+        except Exception:
+            continue
 
+        z_index = shape.get("zIndex", 0)
+        shape_item = {
+            "type": "shape",
+            "shapeType": str(shape_type),
+            "xNorm": x_norm,
+            "yNormTop": y_norm_top,
+            "widthNorm": width_norm,
+            "heightNorm": height_norm,
+            "index": i,
+            # Use zIndex from manifest for proper layer ordering
+            "zOrder": int(z_index) if z_index is not None else (500_000 + shape_counter),
+            "zIndex": int(z_index) if z_index is not None else 0,
+        }
+
+        # Include stroke properties
+        if shape.get("strokeColor"):
+            shape_item["strokeColor"] = str(shape["strokeColor"])
+        if shape.get("strokeWidth") is not None:
             try:
-                x_norm = float(shape.get("xNorm", 0))
-                y_norm_top = float(shape.get("yNormTop", 0))
-                width_norm = float(shape.get("widthNorm", 0))
-                height_norm = float(shape.get("heightNorm", 0))
+                shape_item["strokeWidth"] = float(shape["strokeWidth"])
             except Exception:
-                continue
+                pass
 
-            z_index = shape.get("zIndex", 0)
-            shape_item = {
-                "type": "shape",
-                "shapeType": str(shape_type),
-                "xNorm": x_norm,
-                "yNormTop": y_norm_top,
-                "widthNorm": width_norm,
-                "heightNorm": height_norm,
-                "index": i,
-                # Use zIndex from manifest for proper layer ordering
-                "zOrder": int(z_index) if z_index is not None else (500_000 + shape_counter),
-                "zIndex": int(z_index) if z_index is not None else 0,
-            }
+        # Include fill color if available
+        if shape.get("fillColor") and shape["fillColor"] != "transparent":
+            shape_item["fillColor"] = str(shape["fillColor"])
+
+        # Layer properties
+        if "visible" in shape:
+            shape_item["visible"] = bool(shape["visible"])
+        if "locked" in shape:
+            shape_item["locked"] = bool(shape["locked"])
+        if "name" in shape and shape["name"]:
+            shape_item["name"] = str(shape["name"])
+
+        # Include freehand points if available
+        if shape_type == "freehand" and shape.get("points"):
+            shape_item["points"] = shape["points"]
+
+        out.append(shape_item)
+        shape_counter += 1
+
+    # FORM FIELDS (textInput, textarea, checkbox, radio, dropdown)
+    form_field_counter = 0
+    for field in (page.get("formFields") or []):
+        field_type = field.get("type")
+        if not field_type:
+            continue
 
-            # Include stroke properties
-            if shape.get("strokeColor"):
-                shape_item["strokeColor"] = str(shape["strokeColor"])
-            if shape.get("strokeWidth") is not None:
-                try:
-                    shape_item["strokeWidth"] = float(shape["strokeWidth"])
-                except Exception:
-                    pass
+        try:
+            x_norm = float(field.get("xNorm", 0))
+            y_norm_top = float(field.get("yNormTop", 0))
+            width_norm = float(field.get("widthNorm", 0))
+            height_norm = float(field.get("heightNorm", 0))
+        except Exception:
+            continue
 
-            # Include fill color if available
-            if shape.get("fillColor") and shape["fillColor"] != "transparent":
-                shape_item["fillColor"] = str(shape["fillColor"])
-
-            # Layer properties
-            if "visible" in shape:
-                shape_item["visible"] = bool(shape["visible"])
-            if "locked" in shape:
-                shape_item["locked"] = bool(shape["locked"])
-            if "name" in shape and shape["name"]:
-                shape_item["name"] = str(shape["name"])
-
-            # Include freehand points if available
-            if shape_type == "freehand" and shape.get("points"):
-                shape_item["points"] = shape["points"]
-
-            out.append(shape_item)
-            shape_counter += 1
-
-        # FORM FIELDS (textInput, textarea, checkbox, radio, dropdown)
-        form_field_counter = 0
-        for field in (page.get("formFields") or []):
-            field_type = field.get("type")
-            if not field_type:
-                continue
+        z_index = field.get("zIndex", 100)
+        form_field_item = {
+            "type": "formField",
+            "fieldType": str(field_type),
+            "fieldName": str(field.get("fieldName", f"field_{form_field_counter}")),
+            "xNorm": x_norm,
+            "yNormTop": y_norm_top,
+            "widthNorm": width_norm,
+            "heightNorm": height_norm,
+            "index": i,
+            # Use zIndex from manifest for proper layer ordering
+            "zOrder": int(z_index) if z_index is not None else (4_000_000 + form_field_counter),
+            "zIndex": int(z_index) if z_index is not None else 100,
+        }
 
+        # Include optional properties
+        if field.get("label"):
+            form_field_item["label"] = str(field["label"])
+        if field.get("placeholder"):
+            form_field_item["placeholder"] = str(field["placeholder"])
+        if field.get("defaultValue"):
+            form_field_item["defaultValue"] = str(field["defaultValue"])
+        if field.get("required"):
+            form_field_item["required"] = bool(field["required"])
+
+        # Radio/dropdown options
+        if field.get("options") and isinstance(field["options"], list):
+            form_field_item["options"] = field["options"]
+        if field.get("groupName"):
+            form_field_item["groupName"] = str(field["groupName"])
+
+        # Styling properties
+        if field.get("fontSize") is not None:
             try:
-                x_norm = float(field.get("xNorm", 0))
-                y_norm_top = float(field.get("yNormTop", 0))
-                width_norm = float(field.get("widthNorm", 0))
-                height_norm = float(field.get("heightNorm", 0))
+                form_field_item["fontSize"] = float(field["fontSize"])
             except Exception:
-                continue
-
-            z_index = field.get("zIndex", 100)
-            form_field_item = {
-                "type": "formField",
-                "fieldType": str(field_type),
-                "fieldName": str(field.get("fieldName", f"field_{form_field_counter}")),
-                "xNorm": x_norm,
-                "yNormTop": y_norm_top,
-                "widthNorm": width_norm,
-                "heightNorm": height_norm,
-                "index": i,
-                # Use zIndex from manifest for proper layer ordering
-                "zOrder": int(z_index) if z_index is not None else (4_000_000 + form_field_counter),
-                "zIndex": int(z_index) if z_index is not None else 100,
-            }
-
-            # Include optional properties
-            if field.get("label"):
-                form_field_item["label"] = str(field["label"])
-            if field.get("placeholder"):
-                form_field_item["placeholder"] = str(field["placeholder"])
-            if field.get("defaultValue"):
-                form_field_item["defaultValue"] = str(field["defaultValue"])
-            if field.get("required"):
-                form_field_item["required"] = bool(field["required"])
-
-            # Radio/dropdown options
-            if field.get("options") and isinstance(field["options"], list):
-                form_field_item["options"] = field["options"]
-            if field.get("groupName"):
-                form_field_item["groupName"] = str(field["groupName"])
-
-            # Styling properties
-            if field.get("fontSize") is not None:
-                try:
-                    form_field_item["fontSize"] = float(field["fontSize"])
-                except Exception:
-                    form_field_item["fontSize"] = 14
-            if field.get("fontFamily"):
-                form_field_item["fontFamily"] = str(field["fontFamily"])
-            if field.get("textColor"):
-                form_field_item["textColor"] = str(field["textColor"])
-            if field.get("backgroundColor"):
-                form_field_item["backgroundColor"] = str(field["backgroundColor"])
-            if field.get("borderColor"):
-                form_field_item["borderColor"] = str(field["borderColor"])
-            if field.get("borderWidth") is not None:
-                try:
-                    form_field_item["borderWidth"] = float(field["borderWidth"])
-                except Exception:
-                    pass
+                form_field_item["fontSize"] = 14
+        if field.get("fontFamily"):
+            form_field_item["fontFamily"] = str(field["fontFamily"])
+        if field.get("textColor"):
+            form_field_item["textColor"] = str(field["textColor"])
+        if field.get("backgroundColor"):
+            form_field_item["backgroundColor"] = str(field["backgroundColor"])
+        if field.get("borderColor"):
+            form_field_item["borderColor"] = str(field["borderColor"])
+        if field.get("borderWidth") is not None:
+            try:
+                form_field_item["borderWidth"] = float(field["borderWidth"])
+            except Exception:
+                pass
 
-            # Layer properties
-            if "visible" in field:
-                form_field_item["visible"] = bool(field["visible"])
-            if "locked" in field:
-                form_field_item["locked"] = bool(field["locked"])
-            if "name" in field and field["name"]:
-                form_field_item["name"] = str(field["name"])
-
-            out.append(form_field_item)
-            form_field_counter += 1
-
-        # ANNOTATIONS (highlight, strikethrough, underline)
-        annotation_counter = 0
-        for ann in (page.get("annotations") or []):
-            ann_id = ann.get("id")
-            ann_type = ann.get("type")
-            if not ann_type:
-                continue
+        # Layer properties
+        if "visible" in field:
+            form_field_item["visible"] = bool(field["visible"])
+        if "locked" in field:
+            form_field_item["locked"] = bool(field["locked"])
+        if "name" in field and field["name"]:
+            form_field_item["name"] = str(field["name"])
+
+        out.append(form_field_item)
+        form_field_counter += 1
+
+    # ANNOTATIONS (highlight, strikethrough, underline)
+    annotation_counter = 0
+    for ann in (page.get("annotations") or []):
+        ann_id = ann.get("id")
+        ann_type = ann.get("type")
+        if not ann_type:
+            continue
 
-            spans = ann.get("spans") or []
-            if not spans:
-                continue
+        spans = ann.get("spans") or []
+        if not spans:
+            continue
 
-            # Build span objects with all necessary fields for linked annotations
-            span_items = []
-            for s in spans:
-                span_item = {
-                    "xNorm": float(s.get("xNorm", 0)),
-                    "yNormTop": float(s.get("yNormTop", 0)),
-                    "widthNorm": float(s.get("widthNorm", 0)),
-                    "heightNorm": float(s.get("heightNorm", 0)),
-                }
-                # Include text and fontSize for accurate visual rendering
-                if s.get("text"):
-                    span_item["text"] = str(s["text"])
-                if s.get("fontSize") is not None:
-                    span_item["fontSize"] = float(s["fontSize"])
-                # Include relative offsets for linked annotations
-                if s.get("relativeXNorm") is not None:
-                    span_item["relativeXNorm"] = float(s["relativeXNorm"])
-                if s.get("relativeYNorm") is not None:
-                    span_item["relativeYNorm"] = float(s["relativeYNorm"])
-                # Include font metrics if available
-                if s.get("ascentRatio") is not None:
-                    span_item["ascentRatio"] = float(s["ascentRatio"])
-                if s.get("descentRatio") is not None:
-                    span_item["descentRatio"] = float(s["descentRatio"])
-                span_items.append(span_item)
-
-            z_index = ann.get("zIndex", -50)
-            annotation_item = {
-                "type": "annotation",
-                "annotationType": str(ann_type),
-                "spans": span_items,
-                "color": str(ann.get("color", "#FFFF00")),
-                "opacity": float(ann.get("opacity", 0.4)),
-                "index": i,
-                # Use zIndex from manifest for proper layer ordering
-                "zOrder": int(z_index) if z_index is not None else (3_000_000 + annotation_counter),
-                "zIndex": int(z_index) if z_index is not None else -50,
+        # Build span objects with all necessary fields for linked annotations
+        span_items = []
+        for s in spans:
+            span_item = {
+                "xNorm": float(s.get("xNorm", 0)),
+                "yNormTop": float(s.get("yNormTop", 0)),
+                "widthNorm": float(s.get("widthNorm", 0)),
+                "heightNorm": float(s.get("heightNorm", 0)),
             }
+            # Include text and fontSize for accurate visual rendering
+            if s.get("text"):
+                span_item["text"] = str(s["text"])
+            if s.get("fontSize") is not None:
+                span_item["fontSize"] = float(s["fontSize"])
+            # Include relative offsets for linked annotations
+            if s.get("relativeXNorm") is not None:
+                span_item["relativeXNorm"] = float(s["relativeXNorm"])
+            if s.get("relativeYNorm") is not None:
+                span_item["relativeYNorm"] = float(s["relativeYNorm"])
+            # Include font metrics if available
+            if s.get("ascentRatio") is not None:
+                span_item["ascentRatio"] = float(s["ascentRatio"])
+            if s.get("descentRatio") is not None:
+                span_item["descentRatio"] = float(s["descentRatio"])
+            span_items.append(span_item)
+
+        z_index = ann.get("zIndex", -50)
+        annotation_item = {
+            "type": "annotation",
+            "annotationType": str(ann_type),
+            "spans": span_items,
+            "color": str(ann.get("color", "#FFFF00")),
+            "opacity": float(ann.get("opacity", 0.4)),
+            "index": i,
+            # Use zIndex from manifest for proper layer ordering
+            "zOrder": int(z_index) if z_index is not None else (3_000_000 + annotation_counter),
+            "zIndex": int(z_index) if z_index is not None else -50,
+        }
 
-            # Include annotation ID
-            if ann_id:
-                annotation_item["id"] = str(ann_id)
+        # Include annotation ID
+        if ann_id:
+            annotation_item["id"] = str(ann_id)
 
-            # Include linked text item ID for annotations linked to text items
-            if ann.get("linkedTextItemId"):
-                annotation_item["linkedTextItemId"] = str(ann["linkedTextItemId"])
+        # Include linked text item ID for annotations linked to text items
+        if ann.get("linkedTextItemId"):
+            annotation_item["linkedTextItemId"] = str(ann["linkedTextItemId"])
 
-            # Include annotated text for reference
-            if ann.get("annotatedText"):
-                annotation_item["annotatedText"] = str(ann["annotatedText"])
+        # Include annotated text for reference
+        if ann.get("annotatedText"):
+            annotation_item["annotatedText"] = str(ann["annotatedText"])
 
-            # Layer properties
-            if "visible" in ann:
-                annotation_item["visible"] = bool(ann["visible"])
-            if "locked" in ann:
-                annotation_item["locked"] = bool(ann["locked"])
-            if "name" in ann and ann["name"]:
-                annotation_item["name"] = str(ann["name"])
+        # Layer properties
+        if "visible" in ann:
+            annotation_item["visible"] = bool(ann["visible"])
+        if "locked" in ann:
+            annotation_item["locked"] = bool(ann["locked"])
+        if "name" in ann and ann["name"]:
+            annotation_item["name"] = str(ann["name"])
 
-            out.append(annotation_item)
-            annotation_counter += 1
+        out.append(annotation_item)
+        annotation_counter += 1
 
+    # Manifest zIndex values interleave the element types; only this page is sorted
+    out.sort(key=_z_order_key)
     return out
 
+def _manifest_has_items(manifest: LazyManifest) -> bool:
+    """True if any manifest page flattens to items; stops at the first that does."""
+    return any(_flatten_manifest_page(manifest.page(i), i) for i in range(manifest.page_count))
+
+def _resolve_manifest_assets(items: List[dict], manifest: "LazyManifest", image_assets: "ImageAssets",
+                             asset_mode: str) -> None:
+    """
+    Resolve manifest v2 image references in place. A v2 manifest lists its
+    images once under "assets": {sha256: {"file", "mime"}}, each stored as a
+    separate embedded file, and image entries refer to them by
+    {"asset": sha256}. The bytes are read straight from the embedded file and
+    handed out like extracted images: a data: URI in "ref" (inline), or an
+    "asset" id (table) plus "url" (url).
+    """
+    files = manifest.get("assets") if isinstance(manifest.get("assets"), dict) else {}
+    resolved: dict = {}
+    for item in items:
+        ref = item.get("asset")
+        if item.get("type") != "image" or not isinstance(ref, str):
+            continue
+        if ref not in resolved:
+            spec = files.get(ref)
+            if isinstance(spec, dict) and spec.get("file"):
+                mime = spec.get("mime") or _guess_mime_from_name(spec["file"])
+                resolved[ref] = image_assets.add_embedded_file(str(spec["file"]), mime, sha256=ref)
+            else:
+                print(f"[_resolve_manifest_assets] No embedded file for asset {ref}")
+                resolved[ref] = None
+
+        asset_id = resolved[ref]
+        if asset_id is None:
+            del item["asset"]
+        elif asset_mode == "inline":
+            del item["asset"]
+            item["ref"] = image_assets.assets[asset_id]["data"]
+        else:
+            item["asset"] = asset_id
+            if asset_mode == "url":
+                item["url"] = image_assets.assets[asset_id]["url"]
+
 # ========= PyMuPDF extractors (text + raster) =========
 
+def _open_pdf(source):
+    """Open a PDF with PyMuPDF from a filesystem path or from in-memory bytes."""
+    import fitz  # PyMuPDF
+
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        return fitz.open(stream=bytes(source), filetype="pdf")
+    return fitz.open(source)
+
+def _page_dimensions(page) -> dict:
+    rect = page.rect
+    return {"width": float(rect.width), "height": float(rect.height)}
+
+def _inherited_rotation(doc, xref: int, parent_rotations: dict) -> int:
+    """/Rotate of a page object, following /Parent for inherited values."""
+    chain = []
+    rotation = 0
+    while xref:
+        if xref in parent_rotations:
+            rotation = parent_rotations[xref]
+            break
+        chain.append(xref)
+        kind, value = doc.xref_get_key(xref, "Rotate")
+        if kind == "int":
+            rotation = int(value)
+            break
+        kind, value = doc.xref_get_key(xref, "Parent")
+        xref = int(value.split()[0]) if kind == "xref" else 0
+    for visited in chain[1:]:
+        parent_rotations[visited] = rotation
+    return rotation % 360
+
+def _iter_page_tree_info(doc):
+    """
+    Yield (page_xref, info) for every page, read from the page tree alone:
+    the pages are not loaded and no content streams are parsed. info holds
+    width/height as the page is displayed (matching _page_dimensions), the
+    crop box origin and the rotation.
+    """
+    parent_rotations: dict = {}
+    for page_index in range(len(doc)):
+        xref = doc.page_xref(page_index)
+        cropbox = doc.page_cropbox(page_index)
+        rotation = _inherited_rotation(doc, xref, parent_rotations)
+        width, height = float(cropbox.width), float(cropbox.height)
+        if rotation in (90, 270):
+            width, height = height, width
+        yield xref, {
+            "index": page_index,
+            "width": width,
+            "height": height,
+            "originX": float(cropbox.x0),
+            "originY": float(cropbox.y0),
+            "rotation": rotation,
+        }
+
+def _af_filespecs(doc, xref: int) -> List[Tuple[str, int]]:
+    """(file name, filespec xref) of each entry in an object's /AF (associated files) array."""
+    kind, value = doc.xref_get_key(xref, "AF")
+    if kind == "xref":
+        value = doc.xref_object(int(value.split()[0]), compressed=True)
+    elif kind != "array":
+        return []
+    filespecs = []
+    for ref in re.findall(r"(\d+) 0 R", value):
+        for key in ("UF", "F"):
+            kind, name = doc.xref_get_key(int(ref), key)
+            if kind == "string":
+                filespecs.append((name, int(ref)))
+                break
+    return filespecs
+
+def _af_file_names(doc, xref: int) -> List[str]:
+    """File names of the filespecs in an object's /AF (associated files) entry."""
+    return [name for name, _ in _af_filespecs(doc, xref)]
+
+def _filespec_data(doc, filespec_xref: int) -> Optional[bytes]:
+    """Contents of the embedded file stream (/EF /F) of a filespec, if any."""
+    kind, value = doc.xref_get_key(filespec_xref, "EF/F")
+    if kind != "xref":
+        return None
+    return doc.xref_stream(int(value.split()[0]))
+
 def _ext_to_mime(ext: str) -> str:
     ext = (ext or "").lower().lstrip(".")
     if ext == "png":
@@ -685,16 +1255,85 @@ def _ext_to_mime(ext: str) -> str:
         return "image/x-portable-pixmap"
     return "application/octet-stream"
 
-def _data_uri_from_image_dict(img_dict: dict) -> Optional[str]:
+class ImageAssets:
     """
-    PyMuPDF doc.extract_image(xref) returns:
-      {"ext": "...", "image": b"...", "width": W, "height": H, ...}
+    Document-wide table of extracted raster images.
+
+    Each image xref (or embedded file, for v2 manifests) is extracted and
+    base64-encoded at most once per document, and images with identical
+    bytes share a single asset keyed by the SHA-256 of the image data.
+    Entries are {"mime", "data", "width", "height"} where data is a data:
+    URI. When an AssetStore is given the image bytes are written there
+    instead and entries carry "url" in place of "data".
     """
-    raw = img_dict.get("image")
-    if not raw:
-        return None
-    mime = _ext_to_mime(img_dict.get("ext"))
-    return _data_uri(mime, raw)
+
+    def __init__(self, doc, store: Optional["AssetStore"] = None):
+        self.doc = doc
+        self.store = store
+        self.assets: dict = {}
+        self._by_xref: dict = {}
+        self._by_file: dict = {}
+        self._new: List[str] = []
+
+    def lookup(self, xref: int) -> Optional[str]:
+        """Return the asset id for an image xref, extracting it on first use."""
+        if xref in self._by_xref:
+            return self._by_xref[xref]
+
+        asset_id = None
+        try:
+            img_dict = self.doc.extract_image(xref)
+            raw = img_dict.get("image") if img_dict else None
+            if raw:
+                asset_id = self.add(raw, _ext_to_mime(img_dict.get("ext")),
+                                    img_dict.get("width"), img_dict.get("height"))
+        except Exception as e:
+            print(f"[ImageAssets.lookup] Failed to extract image {xref}: {e}")
+
+        self._by_xref[xref] = asset_id
+        return asset_id
+
+    def add(self, raw: bytes, mime: str, width: Optional[int] = None, height: Optional[int] = None) -> str:
+        """Add image bytes (if new) and return their asset id."""
+        asset_id = hashlib.sha256(raw).hexdigest()
+        if asset_id not in self.assets:
+            entry = {"mime": mime}
+            if self.store is not None:
+                self.store.put(raw, mime, asset_id=asset_id)
+                entry["url"] = _asset_url(asset_id)
+            else:
+                entry["data"] = _data_uri(mime, raw)
+            entry["width"] = width
+            entry["height"] = height
+            self.assets[asset_id] = entry
+            self._new.append(asset_id)
+        return asset_id
+
+    def add_embedded_file(self, name: str, mime: str, sha256: Optional[str] = None) -> Optional[str]:
+        """
+        Add an embedded file's bytes as an image asset and return its id.
+        The id is always the hash of the bytes read; a differing sha256
+        from the referencing manifest is reported.
+        """
+        if name in self._by_file:
+            return self._by_file[name]
+
+        asset_id = None
+        try:
+            asset_id = self.add(self.doc.embfile_get(name), mime)
+            if sha256 and sha256.lower() != asset_id:
+                print(f"[ImageAssets.add_embedded_file] {name!r} does not match its manifest hash {sha256}")
+        except Exception as e:
+            print(f"[ImageAssets.add_embedded_file] Failed to read embedded file {name!r}: {e}")
+
+        self._by_file[name] = asset_id
+        return asset_id
+
+    def drain_new(self) -> dict:
+        """Return the assets added since the previous call, keyed by id."""
+        new = {asset_id: self.assets[asset_id] for asset_id in self._new}
+        self._new = []
+        return new
 
 def _int_color_to_hex(color_int: int) -> str:
     """
@@ -737,396 +1376,537 @@ def _normalize_font_name(font_name: str) -> str:
 # Extracts text, images, and vectors in their true PDF paint order
 # --------------------------------------------------------------------------
 
-def _extract_unified_content_stream(path: str) -> Tuple[List[dict], dict]:
+def _extract_unified_content_stream(source, order: str = "stream") -> Tuple[List[dict], dict]:
     """
     Extract all PDF content (text, images, vectors) in unified content stream order.
     This ensures elements are rendered in the exact order they appear in the PDF.
+    See _extract_unified_page for the order modes.
 
     Returns tuple: (items_list, page_dimensions)
     """
-    import fitz  # PyMuPDF
-
     out: List[dict] = []
     page_dimensions = {"width": 595.0, "height": 842.0}  # Default A4
 
     try:
-        doc = fitz.open(path)
+        doc = _open_pdf(source)
     except Exception as e:
         print(f"[_extract_unified_content_stream] Failed to open PDF: {e}")
         return out, page_dimensions
 
-    for page_index in range(len(doc)):
-        page = doc[page_index]
-        page_rect = page.rect
-        page_w = float(page_rect.width)
-        page_h = float(page_rect.height)
-        page_origin_x = float(page_rect.x0)
-        page_origin_y = float(page_rect.y0)
+    image_assets = ImageAssets(doc)
 
+    for page_index in range(len(doc)):
+        dimensions, items = _extract_unified_page(doc, page_index, image_assets, order)
         if page_index == 0:
-            page_dimensions = {"width": page_w, "height": page_h}
+            page_dimensions = dimensions
+        out.extend(items)
 
-        # Collect all items with their approximate content stream order
-        # We use a unified approach: trace through content and assign order
-        page_items = []
-        global_order = 0
+    doc.close()
+    return out, page_dimensions
 
-        # --- STEP 1: Extract all drawings (vectors) with their order ---
-        # PyMuPDF's get_drawings() returns paths in content stream order
-        try:
-            drawings = page.get_drawings()
-            for draw_order, drawing in enumerate(drawings):
-                rect = drawing.get("rect")
-                if not rect:
-                    continue
 
-                fill_color = drawing.get("fill")
-                stroke_color = drawing.get("color")
-                stroke_width = drawing.get("width", 0)
+def _extract_unified_page(doc, page_index: int, image_assets: ImageAssets, order: str = "stream",
+                          asset_mode: str = "inline") -> Tuple[dict, List[dict]]:
+    """
+    One page of _extract_unified_content_stream: (page_dimensions, items)
+    with items in paint order and zOrder/zIndex set to their position.
+
+    order "stream" estimates the order by parsing the content stream and
+    matching items to operations by position (_parse_content_stream_order);
+    order "paint" takes each item's paint sequence number from PyMuPDF
+    instead (see _text_paint_seqnos and _image_paint_seqnos), which is exact
+    for form XObjects and inline images and decodes no streams.
+    Images follow asset_mode like _extract_page_with_pymupdf.
+    """
+    out: List[dict] = []
+    page = doc[page_index]
+    page_rect = page.rect
+    page_w = float(page_rect.width)
+    page_h = float(page_rect.height)
+    page_origin_x = float(page_rect.x0)
+    page_origin_y = float(page_rect.y0)
+
+    # Collect all items with their approximate content stream order
+    # We use a unified approach: trace through content and assign order
+    page_items = []
+    global_order = 0
+    paint_order = order == "paint"
+
+    # --- STEP 1: Extract all drawings (vectors) with their order ---
+    # PyMuPDF's get_drawings() returns paths in content stream order
+    try:
+        drawings = page.get_drawings()
+        for draw_order, drawing in enumerate(drawings):
+            rect = drawing.get("rect")
+            if not rect:
+                continue
 
-                has_fill = fill_color is not None
-                has_stroke = stroke_color is not None and stroke_width > 0
+            fill_color = drawing.get("fill")
+            stroke_color = drawing.get("color")
+            stroke_width = drawing.get("width", 0)
 
-                if not has_fill and not has_stroke:
-                    continue
+            has_fill = fill_color is not None
+            has_stroke = stroke_color is not None and stroke_width > 0
 
-                if has_fill and _is_white_color(fill_color) and not has_stroke:
-                    continue
+            if not has_fill and not has_stroke:
+                continue
 
-                x0 = float(rect.x0) - page_origin_x
-                y0 = float(rect.y0) - page_origin_y
-                x1 = float(rect.x1) - page_origin_x
-                y1 = float(rect.y1) - page_origin_y
-                w = x1 - x0
-                h = y1 - y0
+            if has_fill and _is_white_color(fill_color) and not has_stroke:
+                continue
 
-                if w < 1 or h < 1:
-                    continue
+            x0 = float(rect.x0) - page_origin_x
+            y0 = float(rect.y0) - page_origin_y
+            x1 = float(rect.x1) - page_origin_x
+            y1 = float(rect.y1) - page_origin_y
+            w = x1 - x0
+            h = y1 - y0
 
-                svg_path_data = _drawing_to_svg_path(drawing)
-                if not svg_path_data:
-                    continue
+            if w < 1 or h < 1:
+                continue
 
-                # Build SVG
-                style_parts = []
-                fill_opacity = drawing.get("fill_opacity", 1)
-                stroke_opacity = drawing.get("stroke_opacity", 1)
-
-                if has_fill:
-                    fill_hex = _color_to_hex(fill_color)
-                    if fill_hex:
-                        style_parts.append(f"fill:{fill_hex}")
-                        if fill_opacity < 1:
-                            style_parts.append(f"fill-opacity:{fill_opacity:.2f}")
-                else:
-                    style_parts.append("fill:none")
-
-                if has_stroke:
-                    stroke_hex = _color_to_hex(stroke_color)
-                    if stroke_hex:
-                        style_parts.append(f"stroke:{stroke_hex}")
-                        style_parts.append(f"stroke-width:{stroke_width:.2f}")
-                        if stroke_opacity < 1:
-                            style_parts.append(f"stroke-opacity:{stroke_opacity:.2f}")
-                else:
-                    style_parts.append("stroke:none")
+            svg_path_data = _drawing_to_svg_path(drawing)
+            if not svg_path_data:
+                continue
 
-                if drawing.get("even_odd"):
-                    style_parts.append("fill-rule:evenodd")
+            # Build SVG
+            style_parts = []
+            fill_opacity = drawing.get("fill_opacity", 1)
+            stroke_opacity = drawing.get("stroke_opacity", 1)
 
-                style_str = ";".join(style_parts)
-                view_x0 = float(rect.x0)
-                view_y0 = float(rect.y0)
+            if has_fill:
+                fill_hex = _color_to_hex(fill_color)
+                if fill_hex:
+                    style_parts.append(f"fill:{fill_hex}")
+                    if fill_opacity < 1:
+                        style_parts.append(f"fill-opacity:{fill_opacity:.2f}")
+            else:
+                style_parts.append("fill:none")
 
-                mini_svg = (
-                    f'<svg xmlns="http://www.w3.org/2000/svg" '
-                    f'viewBox="{view_x0:.2f} {view_y0:.2f} {w:.2f} {h:.2f}" '
-                    f'width="{w:.2f}" height="{h:.2f}">'
-                    f'<path d="{svg_path_data}" style="{style_str}"/>'
-                    f'</svg>'
-                )
-                data_uri = _svg_data_uri(mini_svg)
+            if has_stroke:
+                stroke_hex = _color_to_hex(stroke_color)
+                if stroke_hex:
+                    style_parts.append(f"stroke:{stroke_hex}")
+                    style_parts.append(f"stroke-width:{stroke_width:.2f}")
+                    if stroke_opacity < 1:
+                        style_parts.append(f"stroke-opacity:{stroke_opacity:.2f}")
+            else:
+                style_parts.append("stroke:none")
 
-                page_items.append({
-                    "_content_order": draw_order,  # Will be used for sorting
-                    "_item_type": "vector",
-                    "_y_pos": y0,  # For secondary sorting
-                    "type": "vector",
-                    "data": data_uri,
-                    "xNorm": float(x0 / page_w if page_w else 0.0),
-                    "yNormTop": float(y0 / page_h if page_h else 0.0),
-                    "widthNorm": float(w / page_w if page_w else 0.0),
-                    "heightNorm": float(h / page_h if page_h else 0.0),
-                    "index": page_index,
-                })
-        except Exception as e:
-            print(f"[_extract_unified] Error extracting drawings on page {page_index}: {e}")
+            if drawing.get("even_odd"):
+                style_parts.append("fill-rule:evenodd")
 
-        # --- STEP 2: Extract text with position info ---
-        try:
-            text_dict = page.get_text("dict")
-            text_order = 0
+            style_str = ";".join(style_parts)
+            view_x0 = float(rect.x0)
+            view_y0 = float(rect.y0)
+
+            mini_svg = (
+                f'<svg xmlns="http://www.w3.org/2000/svg" '
+                f'viewBox="{view_x0:.2f} {view_y0:.2f} {w:.2f} {h:.2f}" '
+                f'width="{w:.2f}" height="{h:.2f}">'
+                f'<path d="{svg_path_data}" style="{style_str}"/>'
+                f'</svg>'
+            )
+
+            page_items.append({
+                "_content_order": draw_order,  # Will be used for sorting
+                "_seqno": drawing.get("seqno"),
+                "_item_type": "vector",
+                "_y_pos": y0,  # For secondary sorting
+                "type": "vector",
+                **_vector_ref(mini_svg, image_assets.store),
+                "xNorm": float(x0 / page_w if page_w else 0.0),
+                "yNormTop": float(y0 / page_h if page_h else 0.0),
+                "widthNorm": float(w / page_w if page_w else 0.0),
+                "heightNorm": float(h / page_h if page_h else 0.0),
+                "index": page_index,
+            })
+    except Exception as e:
+        print(f"[_extract_unified] Error extracting drawings on page {page_index}: {e}")
+
+    # --- STEP 2: Extract text with position info ---
+    try:
+        text_dict = page.get_text("dict")
+        text_order = 0
+        text_seqnos = _text_paint_seqnos(page) if paint_order else {}
+
+        for blk in text_dict.get("blocks", []):
+            if blk.get("type", 0) != 0:
+                continue
+
+            for line in blk.get("lines", []):
+                spans = line.get("spans", [])
+                if not spans:
+                    continue
 
-            for blk in text_dict.get("blocks", []):
-                if blk.get("type", 0) != 0:
+                line_bbox = line.get("bbox")
+                if not (isinstance(line_bbox, (list, tuple)) and len(line_bbox) == 4):
                     continue
 
-                for line in blk.get("lines", []):
-                    spans = line.get("spans", [])
-                    if not spans:
+                line_x0, line_y0, line_x1, line_y1 = line_bbox
+                line_height = float(line_y1 - line_y0)
+                adjusted_line_y = line_y0 - page_origin_y
+                line_y_norm = adjusted_line_y / page_h if page_h else 0.0
+                line_height_norm = line_height / page_h if page_h else 0.0
+
+                # Group consecutive spans with same font
+                current_group = None
+
+                for span in spans:
+                    span_text = span.get("text", "")
+                    if not span_text:
                         continue
 
-                    line_bbox = line.get("bbox")
-                    if not (isinstance(line_bbox, (list, tuple)) and len(line_bbox) == 4):
+                    span_bbox = span.get("bbox")
+                    if not (isinstance(span_bbox, (list, tuple)) and len(span_bbox) == 4):
                         continue
 
-                    line_x0, line_y0, line_x1, line_y1 = line_bbox
-                    line_height = float(line_y1 - line_y0)
-                    adjusted_line_y = line_y0 - page_origin_y
-                    line_y_norm = adjusted_line_y / page_h if page_h else 0.0
-                    line_height_norm = line_height / page_h if page_h else 0.0
-
-                    # Group consecutive spans with same font
-                    current_group = None
-
-                    for span in spans:
-                        span_text = span.get("text", "")
-                        if not span_text:
-                            continue
-
-                        span_bbox = span.get("bbox")
-                        if not (isinstance(span_bbox, (list, tuple)) and len(span_bbox) == 4):
-                            continue
-
-                        sx0, sy0, sx1, sy1 = span_bbox
-                        span_height = float(sy1 - sy0)
-
-                        # Font properties
-                        ascender = span.get("ascender")
-                        descender = span.get("descender")
-                        nominal_size = span.get("size")
-
-                        font_size = None
-                        if ascender is not None and descender is not None and span_height > 0:
-                            height_ratio = float(ascender) - float(descender)
-                            if height_ratio > 0:
-                                font_size = span_height / height_ratio
-                        if font_size is None and isinstance(nominal_size, (int, float)):
-                            font_size = float(nominal_size)
-
-                        color = span.get("color")
-                        font_color = _int_color_to_hex(color) if color is not None else "#000000"
-                        font = span.get("font")
-                        font_family = _normalize_font_name(font) if font else "sans-serif"
-
-                        same_font = (
-                            current_group is not None and
-                            current_group["font_family"] == font_family and
-                            abs((current_group["font_size"] or 0) - (font_size or 0)) < 0.5 and
-                            current_group["font_color"] == font_color
-                        )
-
-                        if same_font:
-                            current_group["text"] += span_text
-                            current_group["x1"] = sx1
-                        else:
-                            if current_group and current_group["text"].strip():
-                                adj_x0 = current_group["x0"] - page_origin_x
-                                adj_x1 = current_group["x1"] - page_origin_x
-                                x_norm = adj_x0 / page_w if page_w else 0.0
-                                width_norm = (adj_x1 - adj_x0) / page_w if page_w else 0.0
-
-                                text_item = {
-                                    "_content_order": 1000000 + text_order,  # Text after vectors in base order
-                                    "_item_type": "text",
-                                    "_y_pos": adjusted_line_y,
-                                    "type": "text",
-                                    "text": current_group["text"].strip(),
-                                    "xNorm": float(x_norm),
-                                    "yNormTop": float(line_y_norm),
-                                    "fontSize": float(current_group["font_size"]) if current_group["font_size"] else None,
-                                    "fontFamily": current_group["font_family"],
-                                    "index": page_index,
-                                    "anchor": "top",
-                                }
-                                if current_group["font_color"] != "#000000":
-                                    text_item["color"] = current_group["font_color"]
-
-                                page_items.append(text_item)
-
-                                # Also add textSpan
-                                text_span = {
-                                    "_content_order": 1000000 + text_order,
-                                    "_item_type": "textSpan",
-                                    "_y_pos": adjusted_line_y,
-                                    "type": "textSpan",
-                                    "text": current_group["text"].strip(),
-                                    "xNorm": float(x_norm),
-                                    "yNormTop": float(line_y_norm),
-                                    "widthNorm": float(width_norm),
-                                    "heightNorm": float(line_height_norm),
-                                    "fontSize": float(current_group["font_size"]) if current_group["font_size"] else None,
-                                    "fontFamily": current_group["font_family"],
-                                    "index": page_index,
-                                }
-                                if current_group["font_color"] != "#000000":
-                                    text_span["color"] = current_group["font_color"]
-                                page_items.append(text_span)
-
-                                text_order += 1
-
-                            current_group = {
-                                "text": span_text,
-                                "font_size": font_size,
-                                "font_family": font_family,
-                                "font_color": font_color,
-                                "x0": sx0,
-                                "x1": sx1,
+                    sx0, sy0, sx1, sy1 = span_bbox
+                    span_height = float(sy1 - sy0)
+
+                    # Font properties
+                    ascender = span.get("ascender")
+                    descender = span.get("descender")
+                    nominal_size = span.get("size")
+
+                    font_size = None
+                    if ascender is not None and descender is not None and span_height > 0:
+                        height_ratio = float(ascender) - float(descender)
+                        if height_ratio > 0:
+                            font_size = span_height / height_ratio
+                    if font_size is None and isinstance(nominal_size, (int, float)):
+                        font_size = float(nominal_size)
+
+                    color = span.get("color")
+                    font_color = _int_color_to_hex(color) if color is not None else "#000000"
+                    font = span.get("font")
+                    font_family = _normalize_font_name(font) if font else "sans-serif"
+
+                    same_font = (
+                        current_group is not None and
+                        current_group["font_family"] == font_family and
+                        abs((current_group["font_size"] or 0) - (font_size or 0)) < 0.5 and
+                        current_group["font_color"] == font_color
+                    )
+
+                    if same_font:
+                        current_group["text"] += span_text
+                        current_group["x1"] = sx1
+                        if current_group["seqno"] is None:
+                            # Spaces the text extractor inserts were never painted
+                            current_group["seqno"] = text_seqnos.get(_paint_point_key(span.get("origin")))
+                    else:
+                        if current_group and current_group["text"].strip():
+                            adj_x0 = current_group["x0"] - page_origin_x
+                            adj_x1 = current_group["x1"] - page_origin_x
+                            x_norm = adj_x0 / page_w if page_w else 0.0
+                            width_norm = (adj_x1 - adj_x0) / page_w if page_w else 0.0
+
+                            text_item = {
+                                "_content_order": 1000000 + text_order,  # Text after vectors in base order
+                                "_seqno": current_group["seqno"],
+                                "_item_type": "text",
+                                "_y_pos": adjusted_line_y,
+                                "type": "text",
+                                "text": current_group["text"].strip(),
+                                "xNorm": float(x_norm),
+                                "yNormTop": float(line_y_norm),
+                                "fontSize": float(current_group["font_size"]) if current_group["font_size"] else None,
+                                "fontFamily": current_group["font_family"],
+                                "index": page_index,
+                                "anchor": "top",
                             }
-
-                    # Final group
-                    if current_group and current_group["text"].strip():
-                        adj_x0 = current_group["x0"] - page_origin_x
-                        adj_x1 = current_group["x1"] - page_origin_x
-                        x_norm = adj_x0 / page_w if page_w else 0.0
-                        width_norm = (adj_x1 - adj_x0) / page_w if page_w else 0.0
-
-                        text_item = {
-                            "_content_order": 1000000 + text_order,
-                            "_item_type": "text",
-                            "_y_pos": adjusted_line_y,
-                            "type": "text",
-                            "text": current_group["text"].strip(),
-                            "xNorm": float(x_norm),
-                            "yNormTop": float(line_y_norm),
-                            "fontSize": float(current_group["font_size"]) if current_group["font_size"] else None,
-                            "fontFamily": current_group["font_family"],
-                            "index": page_index,
-                            "anchor": "top",
-                        }
-                        if current_group["font_color"] != "#000000":
-                            text_item["color"] = current_group["font_color"]
-                        page_items.append(text_item)
-
-                        text_span = {
-                            "_content_order": 1000000 + text_order,
-                            "_item_type": "textSpan",
-                            "_y_pos": adjusted_line_y,
-                            "type": "textSpan",
-                            "text": current_group["text"].strip(),
-                            "xNorm": float(x_norm),
-                            "yNormTop": float(line_y_norm),
-                            "widthNorm": float(width_norm),
-                            "heightNorm": float(line_height_norm),
-                            "fontSize": float(current_group["font_size"]) if current_group["font_size"] else None,
-                            "fontFamily": current_group["font_family"],
-                            "index": page_index,
+                            if current_group["font_color"] != "#000000":
+                                text_item["color"] = current_group["font_color"]
+
+                            page_items.append(text_item)
+
+                            # Also add textSpan
+                            text_span = {
+                                "_content_order": 1000000 + text_order,
+                                "_seqno": current_group["seqno"],
+                                "_item_type": "textSpan",
+                                "_y_pos": adjusted_line_y,
+                                "type": "textSpan",
+                                "text": current_group["text"].strip(),
+                                "xNorm": float(x_norm),
+                                "yNormTop": float(line_y_norm),
+                                "widthNorm": float(width_norm),
+                                "heightNorm": float(line_height_norm),
+                                "fontSize": float(current_group["font_size"]) if current_group["font_size"] else None,
+                                "fontFamily": current_group["font_family"],
+                                "index": page_index,
+                            }
+                            if current_group["font_color"] != "#000000":
+                                text_span["color"] = current_group["font_color"]
+                            page_items.append(text_span)
+
+                            text_order += 1
+
+                        current_group = {
+                            "text": span_text,
+                            "font_size": font_size,
+                            "font_family": font_family,
+                            "font_color": font_color,
+                            "x0": sx0,
+                            "x1": sx1,
+                            # A group is painted with its first span
+                            "seqno": text_seqnos.get(_paint_point_key(span.get("origin"))),
                         }
-                        if current_group["font_color"] != "#000000":
-                            text_span["color"] = current_group["font_color"]
-                        page_items.append(text_span)
-                        text_order += 1
 
-        except Exception as e:
-            print(f"[_extract_unified] Error extracting text on page {page_index}: {e}")
-
-        # --- STEP 3: Extract images ---
-        try:
-            img_list = page.get_images(full=True)
-            for img_order, img in enumerate(img_list):
-                xref = img[0]
-                try:
-                    img_rects = page.get_image_rects(xref)
-                    if not img_rects:
-                        continue
+                # Final group
+                if current_group and current_group["text"].strip():
+                    adj_x0 = current_group["x0"] - page_origin_x
+                    adj_x1 = current_group["x1"] - page_origin_x
+                    x_norm = adj_x0 / page_w if page_w else 0.0
+                    width_norm = (adj_x1 - adj_x0) / page_w if page_w else 0.0
+
+                    text_item = {
+                        "_content_order": 1000000 + text_order,
+                        "_seqno": current_group["seqno"],
+                        "_item_type": "text",
+                        "_y_pos": adjusted_line_y,
+                        "type": "text",
+                        "text": current_group["text"].strip(),
+                        "xNorm": float(x_norm),
+                        "yNormTop": float(line_y_norm),
+                        "fontSize": float(current_group["font_size"]) if current_group["font_size"] else None,
+                        "fontFamily": current_group["font_family"],
+                        "index": page_index,
+                        "anchor": "top",
+                    }
+                    if current_group["font_color"] != "#000000":
+                        text_item["color"] = current_group["font_color"]
+                    page_items.append(text_item)
+
+                    text_span = {
+                        "_content_order": 1000000 + text_order,
+                        "_seqno": current_group["seqno"],
+                        "_item_type": "textSpan",
+                        "_y_pos": adjusted_line_y,
+                        "type": "textSpan",
+                        "text": current_group["text"].strip(),
+                        "xNorm": float(x_norm),
+                        "yNormTop": float(line_y_norm),
+                        "widthNorm": float(width_norm),
+                        "heightNorm": float(line_height_norm),
+                        "fontSize": float(current_group["font_size"]) if current_group["font_size"] else None,
+                        "fontFamily": current_group["font_family"],
+                        "index": page_index,
+                    }
+                    if current_group["font_color"] != "#000000":
+                        text_span["color"] = current_group["font_color"]
+                    page_items.append(text_span)
+                    text_order += 1
 
-                    base_img = doc.extract_image(xref)
-                    if not base_img:
-                        continue
+    except Exception as e:
+        print(f"[_extract_unified] Error extracting text on page {page_index}: {e}")
 
-                    img_bytes = base_img.get("image")
-                    img_ext = base_img.get("ext", "png")
-                    if not img_bytes:
-                        continue
+    # --- STEP 3: Extract images ---
+    try:
+        img_list = page.get_images(full=True)
+        image_seqnos = _image_paint_seqnos(page) if paint_order and img_list else {}
+        for img_order, img in enumerate(img_list):
+            xref = img[0]
+            try:
+                img_rects = page.get_image_rects(xref)
+                if not img_rects:
+                    continue
 
-                    b64 = base64.b64encode(img_bytes).decode("utf-8")
-                    mime = f"image/{img_ext}" if img_ext else "image/png"
-                    data_uri = f"data:{mime};base64,{b64}"
-
-                    for rect in img_rects:
-                        x0 = float(rect.x0) - page_origin_x
-                        y0 = float(rect.y0) - page_origin_y
-                        w = float(rect.width)
-                        h = float(rect.height)
-
-                        if w < 1 or h < 1:
-                            continue
-
-                        page_items.append({
-                            "_content_order": 500000 + img_order,  # Images between vectors and text
-                            "_item_type": "image",
-                            "_y_pos": y0,
-                            "type": "image",
-                            "data": data_uri,
-                            "xNorm": float(x0 / page_w if page_w else 0.0),
-                            "yNormTop": float(y0 / page_h if page_h else 0.0),
-                            "widthNorm": float(w / page_w if page_w else 0.0),
-                            "heightNorm": float(h / page_h if page_h else 0.0),
-                            "pixelWidth": base_img.get("width"),
-                            "pixelHeight": base_img.get("height"),
-                            "index": page_index,
-                        })
-                except Exception as e:
-                    print(f"[_extract_unified] Error processing image {xref}: {e}")
+                # Extracted and encoded once per document, not once per page
+                asset_id = image_assets.lookup(xref)
+                if not asset_id:
                     continue
-        except Exception as e:
-            print(f"[_extract_unified] Error extracting images on page {page_index}: {e}")
+                asset = image_assets.assets[asset_id]
+
+                for rect in img_rects:
+                    x0 = float(rect.x0) - page_origin_x
+                    y0 = float(rect.y0) - page_origin_y
+                    w = float(rect.width)
+                    h = float(rect.height)
 
-        # --- STEP 4: Try to determine true content stream order ---
+                    if w < 1 or h < 1:
+                        continue
+
+                    image_item = {
+                        "_content_order": 500000 + img_order,  # Images between vectors and text
+                        "_seqno": _take_image_seqno(image_seqnos, rect),
+                        "_item_type": "image",
+                        "_y_pos": y0,
+                        "type": "image",
+                        "xNorm": float(x0 / page_w if page_w else 0.0),
+                        "yNormTop": float(y0 / page_h if page_h else 0.0),
+                        "widthNorm": float(w / page_w if page_w else 0.0),
+                        "heightNorm": float(h / page_h if page_h else 0.0),
+                        "pixelWidth": asset["width"],
+                        "pixelHeight": asset["height"],
+                        "index": page_index,
+                    }
+                    if asset_mode == "table":
+                        image_item["asset"] = asset_id
+                    elif asset_mode == "url":
+                        image_item["asset"] = asset_id
+                        image_item["url"] = asset["url"]
+                    else:
+                        image_item["data"] = asset["data"]
+                    page_items.append(image_item)
+            except Exception as e:
+                print(f"[_extract_unified] Error processing image {xref}: {e}")
+                continue
+    except Exception as e:
+        print(f"[_extract_unified] Error extracting images on page {page_index}: {e}")
+
+    # --- STEP 4: Try to determine true content stream order ---
+    if paint_order:
+        # Sequence numbers are the paint order. Items without one (e.g. text
+        # the trace missed) go after all the others, in their base order
+        for item in page_items:
+            seqno = item.get("_seqno")
+            if seqno is not None:
+                item["_content_order"] = (0, seqno)
+            else:
+                item["_content_order"] = (1, item["_content_order"])
+    else:
         # Parse the actual content stream to get operation order
         try:
             content_order_map = _parse_content_stream_order(page, doc)
             if content_order_map:
                 # Re-assign content order based on parsed stream
-                for item in page_items:
-                    item_type = item.get("_item_type")
-                    y_pos = item.get("_y_pos", 0)
-                    x_norm = item.get("xNorm", 0)
-
-                    # Find matching operation in content stream
-                    best_order = item.get("_content_order", 0)
-                    best_distance = float('inf')
-
-                    for op_order, op_type, op_y, op_x in content_order_map:
-                        if op_type == item_type or (op_type == "path" and item_type == "vector"):
-                            # Calculate distance
-                            dist = abs(y_pos - op_y) + abs(x_norm * 100 - op_x * 100)
-                            if dist < best_distance:
-                                best_distance = dist
-                                best_order = op_order
-
-                    item["_content_order"] = best_order
+                _match_content_stream_order(page_items, content_order_map, page_w, page_h)
         except Exception as e:
             print(f"[_extract_unified] Content stream parsing failed on page {page_index}: {e}")
             # Fall back to position-based ordering
 
-        # --- STEP 5: Sort by content order and assign zIndex ---
-        page_items.sort(key=lambda x: (x.get("_content_order", 0), x.get("_y_pos", 0)))
+    # --- STEP 5: Sort by content order and assign zIndex ---
+    page_items.sort(key=lambda x: (x.get("_content_order", 0), x.get("_y_pos", 0)))
 
-        for final_order, item in enumerate(page_items):
-            # Remove internal keys
-            item.pop("_content_order", None)
-            item.pop("_item_type", None)
-            item.pop("_y_pos", None)
+    for final_order, item in enumerate(page_items):
+        # Remove internal keys
+        item.pop("_content_order", None)
+        item.pop("_seqno", None)
+        item.pop("_item_type", None)
+        item.pop("_y_pos", None)
 
-            # Assign zIndex based on final order
-            item["zIndex"] = final_order
-            item["zOrder"] = final_order
+        # Assign zIndex based on final order
+        item["zIndex"] = final_order
+        item["zOrder"] = final_order
 
-            out.append(item)
+        out.append(item)
+
+    return {"width": page_w, "height": page_h}, out
+
+
+def _paint_point_key(point) -> Optional[Tuple[float, float]]:
+    if not point:
+        return None
+    return (round(float(point[0]), 1), round(float(point[1]), 1))
+
+
+def _text_paint_seqnos(page) -> dict:
+    """
+    {character origin: paint sequence number} from page.get_texttrace().
+    Keyed per character, since get_text("dict") may start a span part-way
+    through a traced span; look a span up by its "origin".
+    """
+    seqnos: dict = {}
+    try:
+        for span in page.get_texttrace():
+            seqno = span.get("seqno")
+            for char in span.get("chars", ()):
+                seqnos.setdefault(_paint_point_key(char[2]), seqno)
+    except Exception as e:
+        print(f"[_text_paint_seqnos] get_texttrace failed: {e}")
+    return seqnos
 
-    doc.close()
-    return out, page_dimensions
+
+def _image_paint_seqnos(page) -> dict:
+    """
+    {rounded image bbox: [paint sequence numbers]} from page.get_bboxlog(),
+    whose entries are indexed by the same sequence numbers as get_drawings()
+    and get_texttrace().
+    """
+    seqnos: dict = {}
+    try:
+        for seqno, (kind, bbox) in enumerate(page.get_bboxlog()):
+            if kind in ("fill-image", "fill-imgmask"):
+                seqnos.setdefault(tuple(round(float(v), 1) for v in bbox), []).append(seqno)
+    except Exception as e:
+        print(f"[_image_paint_seqnos] get_bboxlog failed: {e}")
+    return seqnos
+
+
+def _take_image_seqno(image_seqnos: dict, rect) -> Optional[int]:
+    """
+    Sequence number of the image painted at rect. Images stacked on the same
+    bbox take theirs in turn; the last one is kept for repeated lookups.
+    """
+    seqnos = image_seqnos.get(tuple(round(float(v), 1) for v in rect))
+    if not seqnos:
+        return None
+    return seqnos.pop(0) if len(seqnos) > 1 else seqnos[0]
+
+
+def _content_op_pool(ops: List[Tuple[int, float, float]]) -> Tuple[GridIndex, dict]:
+    """
+    GridIndex of the distinct operation points (x * 100, y), each keyed by
+    the earliest operation at it, and {order: next order at the same point}.
+    The simple parser often leaves many operations at one point.
+    """
+    following: dict = {}
+    earliest: dict = {}
+    for op_order, x, y in reversed(ops):
+        if (x, y) in earliest:
+            following[op_order] = earliest[(x, y)]
+        earliest[(x, y)] = op_order
+    xs = [x for x, _ in earliest]
+    ys = [y for _, y in earliest]
+    extent_x, extent_y = max(xs) - min(xs), max(ys) - min(ys)
+    # About one point per cell, also when the points lie on a line
+    cell = max(math.sqrt(extent_x * extent_y / len(earliest)), max(extent_x, extent_y) / len(earliest), 1e-6)
+    pool = GridIndex(cell)
+    for (x, y), op_order in earliest.items():
+        pool.insert(op_order, (x, y, x, y))
+    return pool, following
+
+
+def _match_content_stream_order(page_items: List[dict],
+                                content_order_map: List[Tuple[int, str, float, float]],
+                                page_w: float, page_h: float) -> None:
+    """
+    Set each item's _content_order to the order of the nearest operation of
+    its type ("path" for vectors) in content_order_map, at distance
+    |dy| + |dx| * 100 with x normalized. Operations are in PDF space (y up
+    from the bottom), so their y is flipped to the items' top-down _y_pos.
+
+    Operations sit in one GridIndex per type, so a lookup only visits
+    nearby cells instead of every operation. A matched operation is
+    consumed, and ties go to the earliest operation, so items at the same
+    spot take successive operations in extraction order; once every
+    operation of a type is taken its pool refills. Items without operations
+    of their type (textSpan) keep their order.
+    """
+    ops_by_type: dict = {}
+    for op_order, op_type, op_y, op_x in content_order_map:
+        item_type = "vector" if op_type == "path" else op_type
+        x_norm = op_x / page_w if page_w else 0.0
+        ops_by_type.setdefault(item_type, []).append((op_order, x_norm * 100, page_h - op_y))
+
+    pools: dict = {}
+    for item in page_items:
+        item_type = item.get("_item_type")
+        ops = ops_by_type.get(item_type)
+        if not ops:
+            continue
+        pool, following = pools.get(item_type) or (None, None)
+        if not pool:
+            pool, following = pools[item_type] = _content_op_pool(ops)
+        x = item.get("xNorm", 0) * 100
+        y = item.get("_y_pos", 0)
+        op_order, _ = pool.nearest((x, y, x, y), distance=rect_manhattan_distance)
+        point = pool.rects[op_order]
+        pool.remove(op_order)
+        if op_order in following:
+            pool.insert(following[op_order], point)
+        item["_content_order"] = op_order
 
 
 def _parse_content_stream_order(page, doc) -> List[Tuple[int, str, float, float]]:
@@ -1448,12 +2228,13 @@ def _extract_text_with_html_method(page, page_index: int, page_w: float, page_h:
 
 def _extract_text_with_rawdict_method(page, page_index: int, page_w: float, page_h: float,
                                        page_origin_x: float, page_origin_y: float,
-                                       z_base_text: int) -> List[dict]:
+                                       z_base_text: int, textpage=None) -> List[dict]:
     """
     Extract text using PyMuPDF's rawdict output for character-level precision.
 
     The rawdict format includes character-level bounding boxes which allows
-    for the most precise positioning possible.
+    for the most precise positioning possible. Pass textpage to reuse a
+    TextPage already built for this page instead of parsing it again.
 
     Returns list of text items with normalized coordinates.
     """
@@ -1463,7 +2244,7 @@ def _extract_text_with_rawdict_method(page, page_index: int, page_w: float, page
 
     try:
         # Get rawdict output - includes character-level data
-        raw_dict = page.get_text("rawdict")
+        raw_dict = page.get_text("rawdict", textpage=textpage)
     except Exception as e:
         print(f"[_extract_text_with_rawdict_method] Failed to get rawdict: {e}")
         return out
@@ -1608,132 +2389,125 @@ def _extract_text_with_rawdict_method(page, page_index: int, page_w: float, page
     return out
 
 
-def _extract_with_pymupdf(path):
+def _extract_page_with_pymupdf(doc, page, page_index: int, textpage=None,
+                               image_assets: Optional[ImageAssets] = None,
+                               asset_mode: str = "inline",
+                               timer: Optional[StageTimer] = None) -> List[dict]:
     """
-    Fallback extractor using PyMuPDF (fitz).
-    Returns tuple: (items_list, page_dimensions)
-      - items_list: flat list of {type:"text"|"image", xNorm, yNormTop, ...}
-      - page_dimensions: {"width": float, "height": float} of first page (or default A4)
+    Extract text and raster images from an already loaded page of doc.
+    Returns a flat list of text/textSpan items and image items (no "type" key).
+
+    Images are resolved through image_assets (a document-wide ImageAssets),
+    so repeated images are only extracted once. With asset_mode "inline"
+    image items carry the data URI in "data"; with "table" they carry only
+    the asset id in "asset"; with "url" they carry the asset id and its
+    /assets URL in "url".
     """
-    import fitz  # PyMuPDF
-
+    if image_assets is None:
+        image_assets = ImageAssets(doc)
+    timer = timer or StageTimer()
     out = []
-    page_dimensions = {"width": 595.0, "height": 842.0}  # Default A4 dimensions
-    doc = fitz.open(path)
+    page_rect = page.rect
+    page_w = float(page_rect.width)
+    page_h = float(page_rect.height)
+
+    # Get page origin offset (some PDFs have non-zero origin)
+    page_origin_x = float(page_rect.x0)
+    page_origin_y = float(page_rect.y0)
+
+    # zOrder bases to avoid collisions with pdf2svg DOM order
+    Z_BASE_IMAGES = 1_000_000
+    Z_BASE_TEXT   = 2_000_000
+    z_counter_images = 0
+
+    # ---------- TEXT (using rawdict for precise character-level positioning) ----------
+    # The rawdict method provides character origin points for more accurate positioning
+    with timer.stage("text"):
+        text_items = _extract_text_with_rawdict_method(
+            page, page_index, page_w, page_h,
+            page_origin_x, page_origin_y, Z_BASE_TEXT,
+            textpage=textpage,
+        )
+    out.extend(text_items)
 
-    for page_index in range(len(doc)):
-        page = doc[page_index]
-        page_rect = page.rect
-        page_w = float(page_rect.width)
-        page_h = float(page_rect.height)
+    # ---------- IMAGES ----------
+    images_start = time.perf_counter()
+    img_list = page.get_images(full=True)
+    for img in img_list:
+        xref = img[0]
+        try:
+            rects = page.get_image_rects(xref)
+        except Exception:
+            rects = []
 
-        # Get page origin offset (some PDFs have non-zero origin)
-        page_origin_x = float(page_rect.x0)
-        page_origin_y = float(page_rect.y0)
+        asset_id = image_assets.lookup(xref) if rects else None
 
-        # Capture dimensions from first page
-        if page_index == 0:
-            page_dimensions = {"width": page_w, "height": page_h}
+        for r in rects:
+            img_x0, img_y0, img_x1, img_y1 = r
+            # Adjust for page origin offset
+            adjusted_img_x0 = img_x0 - page_origin_x
+            adjusted_img_y0 = img_y0 - page_origin_y
+            adjusted_img_x1 = img_x1 - page_origin_x
+            adjusted_img_y1 = img_y1 - page_origin_y
 
-        # zOrder bases to avoid collisions with pdf2svg DOM order
-        Z_BASE_IMAGES = 1_000_000
-        Z_BASE_TEXT   = 2_000_000
-        z_counter_images = 0
+            w = max(0.0, float(adjusted_img_x1 - adjusted_img_x0))
+            h = max(0.0, float(adjusted_img_y1 - adjusted_img_y0))
+            x_norm = adjusted_img_x0 / page_w if page_w else 0.0
+            y_norm_top = adjusted_img_y0 / page_h if page_h else 0.0
+            width_norm = w / page_w if page_w else 0.0
+            height_norm = h / page_h if page_h else 0.0
 
-        # ---------- TEXT (using rawdict for precise character-level positioning) ----------
-        # The rawdict method provides character origin points for more accurate positioning
-        text_items = _extract_text_with_rawdict_method(
-            page, page_index, page_w, page_h,
-            page_origin_x, page_origin_y, Z_BASE_TEXT
-        )
-        out.extend(text_items)
+            item = {
+                "xNorm": float(x_norm),
+                "yNormTop": float(y_norm_top),
+                "widthNorm": float(width_norm),
+                "heightNorm": float(height_norm),
+                "index": page_index,
+                "zOrder": int(Z_BASE_IMAGES + z_counter_images),
+            }
+            if asset_id:
+                if asset_mode == "table":
+                    item["asset"] = asset_id
+                elif asset_mode == "url":
+                    item["asset"] = asset_id
+                    item["url"] = _asset_url(asset_id)
+                else:
+                    item["data"] = image_assets.assets[asset_id]["data"]
 
-        # ---------- IMAGES ----------
-        img_list = page.get_images(full=True)
-        for img in img_list:
-            xref = img[0]
-            try:
-                rects = page.get_image_rects(xref)
-            except Exception:
-                rects = []
+            out.append(item)
+            z_counter_images += 1
 
-            data_uri = None
-            try:
-                img_dict = doc.extract_image(xref)
-                if img_dict:
-                    data_uri = _data_uri_from_image_dict(img_dict)
-            except Exception:
-                pass
+    timer.add("images", time.perf_counter() - images_start)
+    return out
 
-            for r in rects:
-                img_x0, img_y0, img_x1, img_y1 = r
-                # Adjust for page origin offset
-                adjusted_img_x0 = img_x0 - page_origin_x
-                adjusted_img_y0 = img_y0 - page_origin_y
-                adjusted_img_x1 = img_x1 - page_origin_x
-                adjusted_img_y1 = img_y1 - page_origin_y
-
-                w = max(0.0, float(adjusted_img_x1 - adjusted_img_x0))
-                h = max(0.0, float(adjusted_img_y1 - adjusted_img_y0))
-                x_norm = adjusted_img_x0 / page_w if page_w else 0.0
-                y_norm_top = adjusted_img_y0 / page_h if page_h else 0.0
-                width_norm = w / page_w if page_w else 0.0
-                height_norm = h / page_h if page_h else 0.0
-
-                item = {
-                    "xNorm": float(x_norm),
-                    "yNormTop": float(y_norm_top),
-                    "widthNorm": float(width_norm),
-                    "heightNorm": float(height_norm),
-                    "index": page_index,
-                    "zOrder": int(Z_BASE_IMAGES + z_counter_images),
-                }
-                if data_uri:
-                    item["data"] = data_uri
 
-                out.append(item)
-                z_counter_images += 1
+def _extract_with_pymupdf(source):
+    """
+    Fallback extractor using PyMuPDF (fitz). source is a path or PDF bytes.
+    Returns tuple: (items_list, page_dimensions)
+      - items_list: flat list of {type:"text"|"image", xNorm, yNormTop, ...}
+      - page_dimensions: {"width": float, "height": float} of first page (or default A4)
+    """
+    out = []
+    page_dimensions = {"width": 595.0, "height": 842.0}  # Default A4 dimensions
+    doc = _open_pdf(source)
+    image_assets = ImageAssets(doc)
+
+    for page_index in range(len(doc)):
+        page = doc[page_index]
+        # Capture dimensions from first page
+        if page_index == 0:
+            page_dimensions = _page_dimensions(page)
+        out.extend(_extract_page_with_pymupdf(doc, page, page_index, image_assets=image_assets))
 
     doc.close()
     return out, page_dimensions
 
 # ========= vector detection + pdf2svg export =========
 
-def _rects_overlap(a: Tuple[float, float, float, float],
-                   b: Tuple[float, float, float, float],
-                   pad: float = 1.0) -> bool:
-    ax0, ay0, ax1, ay1 = a
-    bx0, by0, bx1, by1 = b
-    return not (ax1 + pad < bx0 or bx1 + pad < ax0 or ay1 + pad < by0 or by1 + pad < ay0)
-
-def _merge_two(a, b):
-    ax0, ay0, ax1, ay1 = a
-    bx0, by0, bx1, by1 = b
-    return (min(ax0, bx0), min(ay0, by0), max(ax1, bx1), max(ay1, by1))
-
 def _merge_overlapping_rects(rects: List[Tuple[float, float, float, float]], pad: float = 1.0) -> List[Tuple[float, float, float, float]]:
-    rects = [tuple(map(float, r)) for r in rects]
-    changed = True
-    while changed and len(rects) > 1:
-        changed = False
-        merged = []
-        used = [False] * len(rects)
-        for i in range(len(rects)):
-            if used[i]:
-                continue
-            r = rects[i]
-            for j in range(i + 1, len(rects)):
-                if used[j]:
-                    continue
-                s = rects[j]
-                if _rects_overlap(r, s, pad=pad):
-                    r = _merge_two(r, s)
-                    used[j] = True
-                    changed = True
-            used[i] = True
-            merged.append(r)
-        rects = merged
-    return rects
+    # Grid index + union-find instead of repeated all-pairs passes
+    return merge_overlapping_rects(rects, pad=pad)
 
 def _get_pdf2svg_path() -> Optional[str]:
     """
@@ -2325,170 +3099,376 @@ def _calculate_element_rect(element: dict):
 
     return fitz.Rect(min(xs), min(ys), max(xs), max(ys))
 
-def _extract_vectors_with_pymupdf(path: str) -> List[dict]:
+def _vector_paths(drawings: List[dict], page_rect) -> List[dict]:
     """
-    Extract vector graphics using native PyMuPDF get_drawings() method.
-
-    Returns list of items with SVG data URIs for each vector path.
-    - Splits compound paths into individual elements
-    - Correctly handles stroke-only paths (no fill)
-    - Filters out white-filled shapes and very small shapes
+    The visible get_drawings() paths of a page, in paint order, each as
+    {"d", "style", "view": (x, y, w, h) in page space including the stroke
+    padding "pad", "norm": (xNorm, yNormTop, widthNorm, heightNorm), "order"}.
     """
-    import fitz  # PyMuPDF
-
-    out: List[dict] = []
-    Z_BASE_VECTORS = 500_000  # Base z-order for vectors
+    paths: List[dict] = []
+    page_w = float(page_rect.width)
+    page_h = float(page_rect.height)
+    page_origin_x = float(page_rect.x0)
+    page_origin_y = float(page_rect.y0)
+    element_order = 0
+
+    for drawing in drawings:
+        # Use the original drawing directly (don't split)
+        rect = drawing.get("rect")
+        if not rect:
+            continue
 
-    try:
-        doc = fitz.open(path)
-    except Exception as e:
-        print(f"[_extract_vectors_with_pymupdf] Failed to open PDF: {e}")
-        return out
+        # Get colors from drawing
+        fill_color = drawing.get("fill")
+        stroke_color = drawing.get("color")
+        stroke_width = drawing.get("width", 0)
+        fill_opacity = drawing.get("fill_opacity", 1)
+        stroke_opacity = drawing.get("stroke_opacity", 1)
 
-    for page_index in range(len(doc)):
-        page = doc[page_index]
-        page_rect = page.rect
-        page_w = float(page_rect.width)
-        page_h = float(page_rect.height)
-        page_origin_x = float(page_rect.x0)
-        page_origin_y = float(page_rect.y0)
-
-        try:
-            drawings = page.get_drawings()
-        except Exception as e:
-            print(f"[_extract_vectors_with_pymupdf] get_drawings failed on page {page_index}: {e}")
-            continue
+        # Determine if this should be stroke-only
+        is_stroke_only = _is_stroke_only_drawing(drawing)
 
-        element_order = 0
+        # Determine actual fill/stroke status
+        has_stroke = stroke_color is not None and stroke_width > 0
 
-        for drawing in drawings:
-            # Use the original drawing directly (don't split)
-            rect = drawing.get("rect")
-            if not rect:
+        # For stroke-only paths, ignore the fill color
+        if is_stroke_only:
+            has_fill = False
+        else:
+            has_fill = fill_color is not None
+
+        # Skip if no fill and no stroke
+        if not has_fill and not has_stroke:
+            # If it has items but no color info, try to render with default stroke
+            if drawing.get("items"):
+                has_stroke = True
+                stroke_color = (0, 0, 0)  # Default black stroke
+                stroke_width = 1.0
+            else:
                 continue
 
-            # Get colors from drawing
-            fill_color = drawing.get("fill")
-            stroke_color = drawing.get("color")
-            stroke_width = drawing.get("width", 0)
-            fill_opacity = drawing.get("fill_opacity", 1)
-            stroke_opacity = drawing.get("stroke_opacity", 1)
+        # Skip white-filled shapes without visible stroke
+        if has_fill and _is_white_color(fill_color) and not has_stroke:
+            continue
 
-            # Determine if this should be stroke-only
-            is_stroke_only = _is_stroke_only_drawing(drawing)
+        # Calculate dimensions
+        x0 = float(rect.x0) - page_origin_x
+        y0 = float(rect.y0) - page_origin_y
+        x1 = float(rect.x1) - page_origin_x
+        y1 = float(rect.y1) - page_origin_y
+        w = x1 - x0
+        h = y1 - y0
+
+        # Skip very small shapes (likely artifacts)
+        # But allow thin lines (small width OR small height)
+        if w < 0.5 and h < 0.5:
+            continue
 
-            # Determine actual fill/stroke status
-            has_stroke = stroke_color is not None and stroke_width > 0
+        # Convert drawing to SVG path
+        svg_path_data = _drawing_to_svg_path(drawing)
+        if not svg_path_data:
+            continue
+
+        # Build SVG style - be explicit about fill:none for stroke-only paths
+        style_parts = []
 
-            # For stroke-only paths, ignore the fill color
-            if is_stroke_only:
-                has_fill = False
+        if has_fill and not is_stroke_only:
+            fill_hex = _color_to_hex(fill_color)
+            if fill_hex:
+                style_parts.append(f"fill:{fill_hex}")
+                if fill_opacity < 1:
+                    style_parts.append(f"fill-opacity:{fill_opacity:.2f}")
             else:
-                has_fill = fill_color is not None
+                style_parts.append("fill:none")
+        else:
+            # Explicitly set fill:none for stroke-only paths
+            style_parts.append("fill:none")
+
+        if has_stroke:
+            stroke_hex = _color_to_hex(stroke_color)
+            if stroke_hex:
+                style_parts.append(f"stroke:{stroke_hex}")
+                style_parts.append(f"stroke-width:{stroke_width:.2f}")
+                if stroke_opacity < 1:
+                    style_parts.append(f"stroke-opacity:{stroke_opacity:.2f}")
+                # Add stroke linecap and linejoin for better line rendering
+                style_parts.append("stroke-linecap:square")
+                style_parts.append("stroke-linejoin:miter")
+        else:
+            style_parts.append("stroke:none")
+
+        # Handle fill rule
+        if drawing.get("even_odd"):
+            style_parts.append("fill-rule:evenodd")
+
+        # Add padding to viewBox for strokes that might extend beyond bbox
+        padding = stroke_width / 2 if has_stroke else 0
+        view_w = max(w, 1)
+        view_h = max(h, 1)
+
+        paths.append({
+            "d": svg_path_data,
+            "style": ";".join(style_parts),
+            # viewBox matching the original coordinates
+            "view": (float(rect.x0) - padding, float(rect.y0) - padding,
+                     view_w + padding * 2, view_h + padding * 2),
+            "norm": (
+                float((x0 - padding) / page_w if page_w else 0.0),
+                float((y0 - padding) / page_h if page_h else 0.0),
+                float((view_w + padding * 2) / page_w if page_w else 0.0),
+                float((view_h + padding * 2) / page_h if page_h else 0.0),
+            ),
+            "pad": padding,
+            "order": element_order,
+        })
+        element_order += 1
+    return paths
 
-            # Skip if no fill and no stroke
-            if not has_fill and not has_stroke:
-                # If it has items but no color info, try to render with default stroke
-                if drawing.get("items"):
-                    has_stroke = True
-                    stroke_color = (0, 0, 0)  # Default black stroke
-                    stroke_width = 1.0
-                else:
-                    continue
+def _boxes_overlap_inside(a: Tuple[float, float, float, float], b: Tuple[float, float, float, float],
+                          inset: float) -> bool:
+    """True if the boxes still intersect after shrinking both by inset (shared edges do not count)."""
+    return (min(a[2], b[2]) - max(a[0], b[0]) > 2 * inset
+            and min(a[3], b[3]) - max(a[1], b[1]) > 2 * inset)
 
-            # Skip white-filled shapes without visible stroke
-            if has_fill and _is_white_color(fill_color) and not has_stroke:
+def _coalesce_vector_paths(paths: List[dict], page_rect) -> List[dict]:
+    """
+    Merge adjacent or overlapping paths of the same style (fill, stroke,
+    width, opacity) into compound paths, e.g. the thousands of one-segment
+    strokes of a table grid.
+
+    A merged path is painted where its first member was. A member's barrier
+    is the last earlier path of another style that overlaps it, so a group is
+    only valid while its first member comes after every member's barrier.
+    Filled or translucent paths only merge if they overlap no path of their
+    style, since overlapping subpaths would change the fill (winding) or
+    double-blend. Groups are capped at VECTOR_COALESCE_MAX_PATHS members and
+    VECTOR_COALESCE_MAX_AREA of the page. Neighbours come from a uniform grid
+    over the page and groups are joined with union-find, so the pass stays
+    near-linear.
+    """
+    if len(paths) < 2:
+        return paths
+    page_w = float(page_rect.width)
+    page_h = float(page_rect.height)
+    max_area = VECTOR_COALESCE_MAX_AREA * page_w * page_h
+    gap = VECTOR_COALESCE_GAP
+
+    count = len(paths)
+    boxes = [(p["view"][0], p["view"][1], p["view"][0] + p["view"][2], p["view"][1] + p["view"][3])
+             for p in paths]
+    styles = [p["style"] for p in paths]
+    # Stroke-only, opaque styles may overlap; fills and translucency may not
+    overlap_ok = {style: "fill:none" in style and "opacity" not in style for style in set(styles)}
+    mergeable = [True] * count
+    barrier = [-1] * count
+    neighbours: List[List[int]] = [[] for _ in range(count)]
+
+    index = GridIndex(max(page_w, page_h, 1.0) / 64)
+    for i in range(count):
+        box, style = boxes[i], styles[i]
+        for j in index.candidates(box, gap):
+            if styles[j] != style:
+                if j > barrier[i] and rects_overlap(boxes[j], box):
+                    barrier[i] = j
+            elif rects_overlap(boxes[j], box, gap):
+                neighbours[i].append(j)
+                if not overlap_ok[style] and _boxes_overlap_inside(
+                        boxes[j], box, max(paths[i]["pad"], paths[j]["pad"])):
+                    mergeable[i] = mergeable[j] = False
+        index.insert(i, box)
+
+    sets = UnionFind(count)
+    # Per root: [first, max barrier, members, box]
+    groups = {i: [i, barrier[i], 1, boxes[i]] for i in range(count)}
+    for i in range(count):
+        if not mergeable[i]:
+            continue
+        for j in neighbours[i]:
+            a, b = sets.find(i), sets.find(j)
+            if a == b or not mergeable[j]:
                 continue
-
-            # Calculate dimensions
-            x0 = float(rect.x0) - page_origin_x
-            y0 = float(rect.y0) - page_origin_y
-            x1 = float(rect.x1) - page_origin_x
-            y1 = float(rect.y1) - page_origin_y
-            w = x1 - x0
-            h = y1 - y0
-
-            # Skip very small shapes (likely artifacts)
-            # But allow thin lines (small width OR small height)
-            if w < 0.5 and h < 0.5:
+            ga, gb = groups[a], groups[b]
+            first, last_barrier = min(ga[0], gb[0]), max(ga[1], gb[1])
+            box = (min(ga[3][0], gb[3][0]), min(ga[3][1], gb[3][1]),
+                   max(ga[3][2], gb[3][2]), max(ga[3][3], gb[3][3]))
+            if (first <= last_barrier
+                    or ga[2] + gb[2] > VECTOR_COALESCE_MAX_PATHS
+                    or (box[2] - box[0]) * (box[3] - box[1]) > max_area):
                 continue
+            del groups[a], groups[b]
+            groups[sets.union(a, b)] = [first, last_barrier, ga[2] + gb[2], box]
 
-            # Convert drawing to SVG path
-            svg_path_data = _drawing_to_svg_path(drawing)
-            if not svg_path_data:
-                continue
+    out: List[dict] = []
+    # Each group is painted at its first member; groups() is in that order
+    for group in sets.groups():
+        if len(group) == 1:
+            out.append(paths[group[0]])
+            continue
+        x0, y0, x1, y1 = groups[sets.find(group[0])][3]
+        first = paths[group[0]]
+        out.append({
+            "d": " ".join(paths[j]["d"] for j in group),
+            "style": first["style"],
+            "view": (x0, y0, x1 - x0, y1 - y0),
+            "norm": (
+                float((x0 - float(page_rect.x0)) / page_w if page_w else 0.0),
+                float((y0 - float(page_rect.y0)) / page_h if page_h else 0.0),
+                float((x1 - x0) / page_w if page_w else 0.0),
+                float((y1 - y0) / page_h if page_h else 0.0),
+            ),
+            "pad": max(paths[j]["pad"] for j in group),
+            "order": first["order"],
+        })
+    return out
 
-            # Build SVG style - be explicit about fill:none for stroke-only paths
-            style_parts = []
+def _vector_z(order: int) -> Tuple[int, float]:
+    """(zOrder, zIndex) of the order-th vector path on a page; zIndex preserves paint order."""
+    Z_BASE_VECTORS = 500_000  # Base z-order for vectors
+    return int(Z_BASE_VECTORS + order), float(min(-99 + (order / 1000.0), -50))
 
-            if has_fill and not is_stroke_only:
-                fill_hex = _color_to_hex(fill_color)
-                if fill_hex:
-                    style_parts.append(f"fill:{fill_hex}")
-                    if fill_opacity < 1:
-                        style_parts.append(f"fill-opacity:{fill_opacity:.2f}")
-                else:
-                    style_parts.append("fill:none")
-            else:
-                # Explicitly set fill:none for stroke-only paths
-                style_parts.append("fill:none")
+def _vector_ref(svg: str, asset_store: Optional["AssetStore"]) -> dict:
+    if asset_store is not None:
+        asset_id = asset_store.put(svg.encode("utf-8"), "image/svg+xml")
+        return {"asset": asset_id, "url": _asset_url(asset_id)}
+    return {"data": _svg_data_uri(svg)}
 
-            if has_stroke:
-                stroke_hex = _color_to_hex(stroke_color)
-                if stroke_hex:
-                    style_parts.append(f"stroke:{stroke_hex}")
-                    style_parts.append(f"stroke-width:{stroke_width:.2f}")
-                    if stroke_opacity < 1:
-                        style_parts.append(f"stroke-opacity:{stroke_opacity:.2f}")
-                    # Add stroke linecap and linejoin for better line rendering
-                    style_parts.append("stroke-linecap:square")
-                    style_parts.append("stroke-linejoin:miter")
-            else:
-                style_parts.append("stroke:none")
+def _vector_path_items(paths: List[dict], page_index: int,
+                       asset_store: Optional["AssetStore"]) -> List[dict]:
+    """One item per path, each carrying its own mini SVG."""
+    out: List[dict] = []
+    for path in paths:
+        vx, vy, vw, vh = path["view"]
+        mini_svg = (
+            f'<svg xmlns="http://www.w3.org/2000/svg" '
+            f'viewBox="{vx:.2f} {vy:.2f} {vw:.2f} {vh:.2f}" '
+            f'width="{vw:.2f}" height="{vh:.2f}" '
+            f'overflow="visible">'
+            f'<path d="{path["d"]}" style="{path["style"]}"/>'
+            f'</svg>'
+        )
+        x_norm, y_norm_top, width_norm, height_norm = path["norm"]
+        z_order, z_index = _vector_z(path["order"])
+        out.append({
+            "type": "vector",
+            **_vector_ref(mini_svg, asset_store),
+            "xNorm": x_norm,
+            "yNormTop": y_norm_top,
+            "widthNorm": width_norm,
+            "heightNorm": height_norm,
+            "index": page_index,
+            "zOrder": z_order,
+            "zIndex": z_index,
+        })
+    return out
 
-            # Handle fill rule
-            if drawing.get("even_odd"):
-                style_parts.append("fill-rule:evenodd")
+def _vector_layer_items(paths: List[dict], page_index: int, page_rect,
+                        asset_store: Optional["AssetStore"]) -> List[dict]:
+    """
+    Pack a page's paths into a few layered SVG documents, each a run of at
+    most VECTOR_LAYER_MAX_PATHS consecutive paths. Paths keep their id inside
+    the SVG ("v<page>-<n>") and "paths" maps each id to its normalized bbox,
+    so single paths can still be hit-tested and selected.
+    """
+    page_w = float(page_rect.width)
+    page_h = float(page_rect.height)
 
-            style_str = ";".join(style_parts)
+    layers = [paths[i:i + VECTOR_LAYER_MAX_PATHS] for i in range(0, len(paths), VECTOR_LAYER_MAX_PATHS)]
 
-            # Create mini SVG with viewBox matching the original coordinates
-            view_x0 = float(rect.x0)
-            view_y0 = float(rect.y0)
+    out: List[dict] = []
+    for layer in layers:
+        x0 = min(p["view"][0] for p in layer)
+        y0 = min(p["view"][1] for p in layer)
+        x1 = max(p["view"][0] + p["view"][2] for p in layer)
+        y1 = max(p["view"][1] + p["view"][3] for p in layer)
+        w, h = x1 - x0, y1 - y0
+
+        parts = [
+            f'<svg xmlns="http://www.w3.org/2000/svg" '
+            f'viewBox="{x0:.2f} {y0:.2f} {w:.2f} {h:.2f}" '
+            f'width="{w:.2f}" height="{h:.2f}" overflow="visible">'
+        ]
+        id_map = {}
+        # Runs of consecutive paths sharing a style share one <g>, keeping paint order
+        for style, run in itertools.groupby(layer, key=lambda p: p["style"]):
+            run = list(run)
+            if len(run) > 1:
+                parts.append(f'<g style="{style}">')
+            for path in run:
+                path_id = f"v{page_index}-{path['order']}"
+                style_attr = f' style="{style}"' if len(run) == 1 else ""
+                parts.append(f'<path id="{path_id}" d="{path["d"]}"{style_attr}/>')
+                id_map[path_id] = list(path["norm"])
+            if len(run) > 1:
+                parts.append("</g>")
+        parts.append("</svg>")
+
+        z_order, z_index = _vector_z(layer[0]["order"])
+        out.append({
+            "type": "vector",
+            **_vector_ref("".join(parts), asset_store),
+            "xNorm": float((x0 - float(page_rect.x0)) / page_w if page_w else 0.0),
+            "yNormTop": float((y0 - float(page_rect.y0)) / page_h if page_h else 0.0),
+            "widthNorm": float(w / page_w if page_w else 0.0),
+            "heightNorm": float(h / page_h if page_h else 0.0),
+            "index": page_index,
+            "zOrder": z_order,
+            "zIndex": z_index,
+            "paths": id_map,
+        })
+    return out
 
-            # Add padding to viewBox for strokes that might extend beyond bbox
-            padding = stroke_width / 2 if has_stroke else 0
-            view_w = max(w, 1)
-            view_h = max(h, 1)
+def _extract_page_vectors_with_pymupdf(page, page_index: int,
+                                       asset_store: Optional["AssetStore"] = None,
+                                       timer: Optional[StageTimer] = None,
+                                       mode: str = "items",
+                                       coalesce: bool = False) -> List[dict]:
+    """
+    Extract vector graphics from an already loaded page using get_drawings().
+    Returns list of items with SVG data URIs for each vector path, or with
+    "asset"/"url" references when the SVGs are written to asset_store.
+    mode "layers" returns a few layered SVGs per page instead (see
+    _vector_layer_items), and coalesce merges same-style neighbouring paths
+    first (see _coalesce_vector_paths).
+    """
+    timer = timer or StageTimer()
+    try:
+        with timer.stage("drawings"):
+            drawings = page.get_drawings()
+    except Exception as e:
+        print(f"[_extract_page_vectors_with_pymupdf] get_drawings failed on page {page_index}: {e}")
+        return []
+    timer.drawing_count += len(drawings)
 
-            mini_svg = (
-                f'<svg xmlns="http://www.w3.org/2000/svg" '
-                f'viewBox="{view_x0 - padding:.2f} {view_y0 - padding:.2f} {view_w + padding * 2:.2f} {view_h + padding * 2:.2f}" '
-                f'width="{view_w + padding * 2:.2f}" height="{view_h + padding * 2:.2f}" '
-                f'overflow="visible">'
-                f'<path d="{svg_path_data}" style="{style_str}"/>'
-                f'</svg>'
-            )
+    with timer.stage("svg"):
+        paths = _vector_paths(drawings, page.rect)
+    if coalesce:
+        with timer.stage("coalesce"):
+            paths = _coalesce_vector_paths(paths, page.rect)
+    with timer.stage("svg"):
+        if mode == "layers":
+            return _vector_layer_items(paths, page_index, page.rect, asset_store)
+        return _vector_path_items(paths, page_index, asset_store)
 
-            data_uri = _svg_data_uri(mini_svg)
 
-            # Calculate zIndex that preserves paint order
-            vector_z_index = -99 + (element_order / 1000.0)
-            vector_z_index = min(vector_z_index, -50)
+def _extract_vectors_with_pymupdf(source) -> List[dict]:
+    """
+    Extract vector graphics using native PyMuPDF get_drawings() method.
 
-            out.append({
-                "type": "vector",
-                "data": data_uri,
-                "xNorm": float((x0 - padding) / page_w if page_w else 0.0),
-                "yNormTop": float((y0 - padding) / page_h if page_h else 0.0),
-                "widthNorm": float((view_w + padding * 2) / page_w if page_w else 0.0),
-                "heightNorm": float((view_h + padding * 2) / page_h if page_h else 0.0),
-                "index": page_index,
-                "zOrder": int(Z_BASE_VECTORS + element_order),
-                "zIndex": float(vector_z_index),
-            })
+    Returns list of items with SVG data URIs for each vector path.
+    - Splits compound paths into individual elements
+    - Correctly handles stroke-only paths (no fill)
+    - Filters out white-filled shapes and very small shapes
+    """
+    out: List[dict] = []
 
-            element_order += 1
+    try:
+        doc = _open_pdf(source)
+    except Exception as e:
+        print(f"[_extract_vectors_with_pymupdf] Failed to open PDF: {e}")
+        return out
+
+    for page_index in range(len(doc)):
+        out.extend(_extract_page_vectors_with_pymupdf(doc[page_index], page_index))
 
     doc.close()
     return out
@@ -2572,86 +3552,1692 @@ def _extract_vectors_with_pdf2svg(path: str) -> List[dict]:
     doc.close()
     return out
 
+# ========= upload storage =========
+
+class UploadStore:
+    """
+    Content-addressed storage for uploaded PDFs.
+
+    Uploads are keyed by the SHA-256 of their bytes, so identical uploads are
+    stored once and concurrent uploads never overwrite each other. Every upload
+    is written atomically to <directory>/<sha256>.pdf, so other server workers
+    and restarted processes can still find it; small PDFs are also kept in an
+    in-memory cache in front of the disk and opened straight from their bytes.
+    A background sweeper drops uploads unused for ttl_seconds and keeps the
+    disk under max_disk_bytes.
+    """
+
+    def __init__(self, directory: str, ttl_seconds: float, max_disk_bytes: int,
+                 inmemory_max_bytes: int, max_memory_bytes: int,
+                 sweep_interval_seconds: float):
+        self.directory = directory
+        self.ttl_seconds = ttl_seconds
+        self.max_disk_bytes = max_disk_bytes
+        self.inmemory_max_bytes = inmemory_max_bytes
+        self.max_memory_bytes = max_memory_bytes
+        self.sweep_interval_seconds = sweep_interval_seconds
+        self._memory: "OrderedDict[str, Tuple[bytes, float]]" = OrderedDict()
+        self._memory_bytes = 0
+        self._lock = threading.Lock()
+        self._sweeper: Optional[threading.Thread] = None
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, digest: str) -> str:
+        return os.path.join(self.directory, f"{digest}.pdf")
+
+    def put(self, digest: str, data: bytes):
+        """
+        Store an upload and return its extraction source: the bytes themselves
+        for small uploads, otherwise the path of the stored file.
+        """
+        self._ensure_sweeper()
+
+        path = self._write(digest, data)
+        if len(data) > self.inmemory_max_bytes:
+            return path
+
+        with self._lock:
+            if digest not in self._memory:
+                self._memory_bytes += len(data)
+            self._memory[digest] = (data, time.time())
+            self._memory.move_to_end(digest)
+            # Evicting only drops the cached bytes; the file on disk stays
+            while self._memory_bytes > self.max_memory_bytes and len(self._memory) > 1:
+                _, (evicted, _) = self._memory.popitem(last=False)
+                self._memory_bytes -= len(evicted)
+        return data
+
+    def _write(self, digest: str, data: bytes) -> str:
+        path = self._path(digest)
+        if os.path.exists(path):
+            # Dedupe: identical content is already stored, just refresh its TTL
+            os.utime(path)
+            return path
+
+        # Write to a unique temp file and rename, so concurrent uploads of the
+        # same content never observe a partially written file
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+        return path
+
+    def get(self, digest: str):
+        """Return the extraction source for a stored upload, or None if it expired."""
+        # The file on disk is authoritative: touching it refreshes the TTL that
+        # every worker's sweeper sees, and a missing file means it was evicted
+        path = self._path(digest)
+        try:
+            os.utime(path)
+        except OSError:
+            self._forget(digest)
+            return None
+
+        with self._lock:
+            entry = self._memory.get(digest)
+            if entry is not None:
+                self._memory[digest] = (entry[0], time.time())
+                self._memory.move_to_end(digest)
+                return entry[0]
+        return path
+
+    def _forget(self, digest: str) -> None:
+        with self._lock:
+            entry = self._memory.pop(digest, None)
+            if entry is not None:
+                self._memory_bytes -= len(entry[0])
+
+    def sweep(self) -> None:
+        """Evict expired uploads from disk and the memory cache, and enforce the disk quota."""
+        cutoff = time.time() - self.ttl_seconds
+
+        with self._lock:
+            for digest in [d for d, (_, used) in self._memory.items() if used < cutoff]:
+                data, _ = self._memory.pop(digest)
+                self._memory_bytes -= len(data)
+
+        entries = []
+        for entry in os.scandir(self.directory):
+            if not entry.is_file():
+                continue
+            try:
+                st = entry.stat()
+            except OSError:
+                continue
+            if st.st_mtime < cutoff:
+                try:
+                    os.remove(entry.path)
+                except OSError:
+                    pass
+                continue
+            if entry.name.endswith(".pdf"):
+                entries.append((st.st_mtime, st.st_size, entry.path))
+
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= self.max_disk_bytes:
+                break
+            try:
+                os.remove(path)
+                total -= size
+            except OSError:
+                continue
+            self._forget(os.path.basename(path)[:-len(".pdf")])
+
+    def _ensure_sweeper(self) -> None:
+        # Started lazily so forked server workers each get their own thread
+        if self._sweeper is not None and self._sweeper.is_alive():
+            return
+        with self._lock:
+            if self._sweeper is not None and self._sweeper.is_alive():
+                return
+            self._sweeper = threading.Thread(
+                target=self._sweep_forever, name="upload-sweeper", daemon=True
+            )
+            self._sweeper.start()
+
+    def _sweep_forever(self) -> None:
+        while True:
+            time.sleep(self.sweep_interval_seconds)
+            try:
+                self.sweep()
+            except Exception as e:
+                print(f"[UploadStore.sweep] Sweep failed: {e}")
+
+
+upload_store = UploadStore(
+    UPLOAD_FOLDER,
+    ttl_seconds=UPLOAD_TTL_SECONDS,
+    max_disk_bytes=UPLOAD_MAX_DISK_BYTES,
+    inmemory_max_bytes=UPLOAD_INMEMORY_MAX_BYTES,
+    max_memory_bytes=UPLOAD_MAX_MEMORY_BYTES,
+    sweep_interval_seconds=UPLOAD_SWEEP_INTERVAL_SECONDS,
+)
+
+# ========= extracted asset storage =========
+
+_ASSET_EXTENSIONS = {
+    "image/png": ".png",
+    "image/jpeg": ".jpg",
+    "image/jp2": ".jp2",
+    "image/svg+xml": ".svg",
+    "image/x-portable-arbitrarymap": ".pam",
+    "image/x-portable-bitmap": ".pbm",
+    "image/x-portable-graymap": ".pgm",
+    "image/x-portable-pixmap": ".ppm",
+    "application/octet-stream": ".bin",
+}
+_ASSET_MIMES = {ext: mime for mime, ext in _ASSET_EXTENSIONS.items()}
+_SHA256_RE = re.compile(r"^[0-9a-f]{64}$")
+
+def _asset_url(asset_id: str) -> str:
+    return f"/assets/{asset_id}"
+
+class AssetStore:
+    """
+    Content-addressed storage for extracted images and vector SVGs.
+
+    Assets are keyed by the SHA-256 of their bytes and written atomically to
+    <directory>/<sha256><ext>, where the extension records the MIME type.
+    Extraction worker processes write to the same directory, so the size
+    kept here is only an estimate; the directory is rescanned whenever it
+    goes over max_disk_bytes and least recently served files are evicted.
+    """
+
+    def __init__(self, directory: str, max_disk_bytes: int):
+        self.directory = directory
+        self.max_disk_bytes = max_disk_bytes
+        self._disk_bytes: Optional[int] = None  # computed lazily on first write
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+
+    def put(self, data: bytes, mime: str, asset_id: Optional[str] = None) -> str:
+        """Store data (if not already present) and return its asset id."""
+        if asset_id is None:
+            asset_id = hashlib.sha256(data).hexdigest()
+        ext = _ASSET_EXTENSIONS.get(mime, ".bin")
+        path = os.path.join(self.directory, asset_id + ext)
+        try:
+            # Already stored: mark as recently used, since new results point at it
+            os.utime(path)
+            return asset_id
+        except OSError:
+            pass
+
+        try:
+            fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            print(f"[AssetStore.put] Failed to write {path}: {e}")
+            return asset_id
+
+        with self._lock:
+            if self._disk_bytes is None:
+                self._disk_bytes = self._scan_disk_bytes()
+            else:
+                self._disk_bytes += len(data)
+            if self._disk_bytes > self.max_disk_bytes:
+                self._evict_disk()
+        return asset_id
+
+    def get(self, asset_id: str) -> Optional[Tuple[str, str]]:
+        """Return (path, mime) for a stored asset, or None if unknown."""
+        if not _SHA256_RE.match(asset_id):
+            return None
+        for ext, mime in _ASSET_MIMES.items():
+            path = os.path.join(self.directory, asset_id + ext)
+            try:
+                os.utime(path)  # mark as recently used for disk eviction
+            except OSError:
+                continue
+            return path, mime
+        return None
+
+    def _scan_disk_bytes(self) -> int:
+        total = 0
+        for entry in os.scandir(self.directory):
+            if entry.is_file() and not entry.name.endswith(".tmp"):
+                total += entry.stat().st_size
+        return total
+
+    def _evict_disk(self) -> None:
+        """Drop least recently used files until the store fits its budget."""
+        entries = []
+        for entry in os.scandir(self.directory):
+            if entry.is_file() and not entry.name.endswith(".tmp"):
+                try:
+                    st = entry.stat()
+                except OSError:
+                    continue
+                entries.append((st.st_mtime, st.st_size, entry.path))
+        entries.sort()
+
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in entries:
+            if total <= self.max_disk_bytes:
+                break
+            try:
+                os.remove(path)
+                total -= size
+            except OSError:
+                pass
+        self._disk_bytes = total
+
+
+asset_store = AssetStore(ASSET_DIR, max_disk_bytes=ASSET_MAX_DISK_BYTES)
+
+# ========= response compression =========
+
+_ENCODING_SUFFIXES = {"gzip": ".gz", "br": ".br", "zstd": ".zst"}
+
+def _available_encodings() -> List[str]:
+    """Supported Content-Encodings, most preferred first."""
+    encodings = []
+    if zstandard is not None:
+        encodings.append("zstd")
+    if brotli is not None:
+        encodings.append("br")
+    encodings.append("gzip")
+    return encodings
+
+def _compress(raw: bytes, encoding: str) -> bytes:
+    if encoding == "gzip":
+        return gzip.compress(raw, compresslevel=RESULT_CACHE_GZIP_LEVEL, mtime=0)
+    if encoding == "br":
+        return brotli.compress(raw, quality=RESPONSE_BROTLI_QUALITY)
+    if encoding == "zstd":
+        return zstandard.ZstdCompressor(level=RESPONSE_ZSTD_LEVEL).compress(raw)
+    raise ValueError(f"Unsupported encoding: {encoding}")
+
+def _stream_compressor(encoding: str):
+    """
+    Incremental compressor for streamed responses: returns (compress, finish)
+    where compress(chunk) flushes after every chunk so each record reaches
+    the client immediately, and finish() returns the trailing bytes.
+    """
+    if encoding == "gzip":
+        c = zlib.compressobj(RESPONSE_STREAM_GZIP_LEVEL, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+        return (lambda chunk: c.compress(chunk) + c.flush(zlib.Z_SYNC_FLUSH)), c.flush
+    if encoding == "br":
+        c = brotli.Compressor(quality=RESPONSE_BROTLI_QUALITY)
+        return (lambda chunk: c.process(chunk) + c.flush()), c.finish
+    if encoding == "zstd":
+        c = zstandard.ZstdCompressor(level=RESPONSE_ZSTD_LEVEL).compressobj()
+        return (lambda chunk: c.compress(chunk) + c.flush(zstandard.COMPRESSOBJ_FLUSH_BLOCK)), c.flush
+    raise ValueError(f"Unsupported encoding: {encoding}")
+
+# ========= binary payload formats =========
+#
+# Besides JSON, complete (non-streaming) results can be returned column-wise,
+# chosen with ?format= or, failing that, the Accept header:
+#   columnar  application/vnd.pdfeditor.columnar
+#   msgpack   application/x-msgpack   (when the msgpack package is installed)
+# Each page's items become one typed array per key: "f32" (float32, NaN =
+# absent), "i32" (int32, -2**31 = absent) or "str" (uint32 index into the
+# document's string table, 0xFFFFFFFF = absent). Values no column can hold
+# (null, booleans, lists, objects) go in the page's "extra" list: one object
+# or null per item. Items' "index" is their page's. Works on schema 1 and 2
+# bodies; everything besides the items is carried over as is.
+#
+# The columnar container is little-endian:
+#   b"PDFC", u32 version, u32 metadata length, metadata JSON (space padded so
+#   the buffers that follow start 8-byte aligned), buffers
+# The metadata is the body with "pages": [{"index", ..., "count": n,
+# "columns": {key: {"type", "offset", "length"}}[, "extra"]}] and
+# "strings": {"offsets": {...}, "data": {...}} (u32 end offsets into UTF-8
+# data); offsets count from the first buffer. msgpack carries the same
+# document with each buffer inline as bin ({"type", "data"}).
+
+PAYLOAD_FORMATS = {
+    "json": "application/json",
+    "columnar": "application/vnd.pdfeditor.columnar",
+    "msgpack": "application/x-msgpack",
+}
+COLUMNAR_MAGIC = b"PDFC"
+COLUMNAR_VERSION = 1
+_I32_ABSENT = -2 ** 31
+_STR_ABSENT = 0xFFFFFFFF
+
+def _available_formats() -> List[str]:
+    return [fmt for fmt in PAYLOAD_FORMATS if fmt != "msgpack" or msgpack is not None]
+
+class _StringTable:
+    def __init__(self):
+        self.ids: dict = {}
+
+    def id(self, value: str) -> int:
+        return self.ids.setdefault(value, len(self.ids))
+
+    @property
+    def values(self) -> List[str]:
+        return list(self.ids)
+
+class _Absent:
+    """Marks a key an item does not have (None is a value)."""
+
+_ABSENT = _Absent()
+
+def _column(kind: str, values: list, strings: _StringTable) -> array:
+    if kind == "str":
+        return array("I", [_STR_ABSENT if v is _ABSENT else strings.id(v) for v in values])
+    if kind == "i32":
+        return array("i", [_I32_ABSENT if v is _ABSENT else v for v in values])
+    return array("f", [math.nan if v is _ABSENT else v for v in values])
+
+def _page_columns(items: List[dict], strings: _StringTable) -> Tuple[dict, List[Optional[dict]]]:
+    """Split one page of items into {key: (kind, array)} columns plus per-item extras."""
+    by_key: dict = {}
+    for i, item in enumerate(items):
+        for key, value in item.items():
+            if key not in by_key:
+                by_key[key] = [_ABSENT] * len(items)
+            by_key[key][i] = value
+    by_key.pop("index", None)
+
+    columns = {}
+    extra: List[Optional[dict]] = [None] * len(items)
+    for key, values in by_key.items():
+        types = {type(v) for v in values}
+        types.discard(_Absent)
+        if types == {str}:
+            kind = "str"
+        elif types == {int} and all(_I32_ABSENT < v < 2 ** 31 for v in values if v is not _ABSENT):
+            kind = "i32"
+        elif types and types <= {int, float}:
+            kind = "f32"
+        else:
+            # null, bool, nested or mixed values: the fitting ones still get a column
+            kind = "str" if str in types else "f32" if types & {int, float} else None
+            fits = (str,) if kind == "str" else (int, float)
+            for i, v in enumerate(values):
+                if v is not _ABSENT and (kind is None or type(v) not in fits):
+                    if extra[i] is None:
+                        extra[i] = {}
+                    extra[i][key] = v
+                    values[i] = _ABSENT
+            if kind is None:
+                continue
+        columns[key] = (kind, _column(kind, values, strings))
+    return columns, extra
+
+def _payload_pages(body: dict):
+    """Yield (page fields, items) per page of a schema 1 or schema 2 body."""
+    if body.get("schema") == 2:
+        for page in body["pages"]:
+            yield {k: v for k, v in page.items() if k != "items"}, page["items"]
+        return
+
+    by_page: dict = {}
+    for item in body["items"]:
+        by_page.setdefault(int(item.get("index", 0)), []).append(item)
+    indices = body.get("pages")
+    if indices is None:
+        indices = range(max(body.get("pageCount") or 0, max(by_page, default=-1) + 1))
+    for page_index in indices:
+        yield {"index": page_index}, by_page.get(page_index, [])
+
+def _encode_binary_payload(body: dict, fmt: str) -> bytes:
+    """Encode a complete payload as "columnar" or "msgpack" (see above)."""
+    buffers: List[bytes] = []
+    size = 0
+
+    def buffer(kind: str, data: array) -> dict:
+        nonlocal size
+        if sys.byteorder != "little":
+            data.byteswap()
+        raw = data.tobytes()
+        if fmt == "msgpack":
+            return {"type": kind, "data": raw}
+        ref = {"type": kind, "offset": size, "length": len(raw)}
+        buffers.append(raw + b"\0" * (-len(raw) % 8))
+        size += len(buffers[-1])
+        return ref
+
+    strings = _StringTable()
+    doc = {k: v for k, v in body.items() if k not in ("items", "pages")}
+    doc["pages"] = []
+    for page, items in _payload_pages(body):
+        columns, extra = _page_columns(items, strings)
+        page["count"] = len(items)
+        page["columns"] = {key: buffer(kind, values) for key, (kind, values) in columns.items()}
+        if any(e is not None for e in extra):
+            page["extra"] = extra
+        doc["pages"].append(page)
+
+    offsets = array("I")
+    data = bytearray()
+    for value in strings.values:
+        data += value.encode("utf-8")
+        offsets.append(len(data))
+    doc["strings"] = {"offsets": buffer("u32", offsets), "data": buffer("u8", array("B", data))}
+
+    if fmt == "msgpack":
+        return msgpack.packb(doc, use_bin_type=True)
+    meta = json.dumps(doc, separators=(",", ":")).encode("utf-8")
+    meta += b" " * (-(len(COLUMNAR_MAGIC) + 8 + len(meta)) % 8)
+    return b"".join([COLUMNAR_MAGIC, struct.pack("<II", COLUMNAR_VERSION, len(meta)), meta, *buffers])
+
+def _encode_payload(body: dict, fmt: str = "json") -> bytes:
+    if fmt == "json":
+        return app.json.dumps(body).encode("utf-8")
+    return _encode_binary_payload(body, fmt)
+
+# ========= extraction result cache =========
+
+class ResultCache:
+    """
+    Content-addressed cache of finished /upload-pdf payloads.
+
+    Entries are stored already serialized and compressed (gzip, plus br/zstd
+    variants once a client has asked for them), so a hit costs one hash of
+    the upload plus a dict lookup (memory tier) or a file read (disk tier)
+    instead of a full MuPDF extraction or any compression work.
+      - memory tier: LRU bounded by total compressed bytes
+      - disk tier:   one file per key, bounded by total bytes; the least
+                     recently used files (by mtime) are evicted first
+    """
+
+    def __init__(self, directory: str, max_memory_bytes: int, max_disk_bytes: int):
+        self.directory = directory
+        self.max_memory_bytes = max_memory_bytes
+        self.max_disk_bytes = max_disk_bytes
+        self._memory: "OrderedDict[Tuple[str, str], bytes]" = OrderedDict()
+        self._memory_bytes = 0
+        self._disk_bytes: Optional[int] = None  # computed lazily on first write
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, key: str, encoding: str) -> str:
+        return os.path.join(self.directory, f"{key}.json{_ENCODING_SUFFIXES[encoding]}")
+
+    def _remember(self, key: str, encoding: str, blob: bytes) -> None:
+        if len(blob) > self.max_memory_bytes:
+            return
+        with self._lock:
+            old = self._memory.pop((key, encoding), None)
+            if old is not None:
+                self._memory_bytes -= len(old)
+            self._memory[(key, encoding)] = blob
+            self._memory_bytes += len(blob)
+            while self._memory_bytes > self.max_memory_bytes and self._memory:
+                _, evicted = self._memory.popitem(last=False)
+                self._memory_bytes -= len(evicted)
+
+    def get(self, key: str, encoding: str = "gzip") -> Optional[bytes]:
+        """Return the JSON body for key compressed with encoding, or None on a miss."""
+        with self._lock:
+            blob = self._memory.get((key, encoding))
+            if blob is not None:
+                self._memory.move_to_end((key, encoding))
+                return blob
+
+        path = self._path(key, encoding)
+        try:
+            with open(path, "rb") as f:
+                blob = f.read()
+            os.utime(path)  # mark as recently used for disk eviction
+        except OSError:
+            return None
+
+        self._remember(key, encoding, blob)
+        return blob
+
+    def put(self, key: str, blob: bytes, encoding: str = "gzip") -> None:
+        """Store a JSON body compressed with encoding under key in both tiers."""
+        self._remember(key, encoding, blob)
+        if len(blob) > self.max_disk_bytes:
+            return
+
+        path = self._path(key, encoding)
+        try:
+            fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+            with os.fdopen(fd, "wb") as f:
+                f.write(blob)
+            previous = os.path.getsize(path) if os.path.exists(path) else 0
+            os.replace(tmp_path, path)
+        except OSError as e:
+            print(f"[ResultCache.put] Failed to write {path}: {e}")
+            return
+
+        with self._lock:
+            if self._disk_bytes is None:
+                self._disk_bytes = self._scan_disk_bytes()
+            else:
+                self._disk_bytes += len(blob) - previous
+            if self._disk_bytes > self.max_disk_bytes:
+                self._evict_disk()
+
+    def _scan_disk_bytes(self) -> int:
+        total = 0
+        for entry in os.scandir(self.directory):
+            if entry.is_file() and ".json." in entry.name and not entry.name.endswith(".tmp"):
+                total += entry.stat().st_size
+        return total
+
+    def _evict_disk(self) -> None:
+        """Drop least recently used files until the disk tier fits its budget."""
+        entries = []
+        for entry in os.scandir(self.directory):
+            if entry.is_file() and ".json." in entry.name and not entry.name.endswith(".tmp"):
+                st = entry.stat()
+                entries.append((st.st_mtime, st.st_size, entry.path))
+        entries.sort()
+
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in entries:
+            if total <= self.max_disk_bytes:
+                break
+            try:
+                os.remove(path)
+                total -= size
+            except OSError:
+                pass
+        self._disk_bytes = total
+
+
+result_cache = ResultCache(
+    RESULT_CACHE_DIR,
+    max_memory_bytes=RESULT_CACHE_MAX_MEMORY_BYTES,
+    max_disk_bytes=RESULT_CACHE_MAX_DISK_BYTES,
+)
+
+def _result_cache_key(digest: str, options: Optional[dict] = None) -> str:
+    """Cache key from upload content hash + extractor version + extraction options."""
+    blob = json.dumps(
+        {"sha256": digest, "version": EXTRACTOR_VERSION, "options": options or {}},
+        sort_keys=True,
+        separators=(",", ":"),
+    )
+    return hashlib.sha256(blob.encode("utf-8")).hexdigest()
+
+def _negotiate_encoding() -> Optional[str]:
+    """
+    Pick the Content-Encoding for this request from Accept-Encoding (q-values
+    honoured), among the encodings available here. None means identity.
+    """
+    accepted = {}
+    for part in request.headers.get("Accept-Encoding", "").split(","):
+        name, _, params = part.strip().partition(";")
+        name = name.strip().lower()
+        if not name:
+            continue
+        q = 1.0
+        match = re.search(r"q\s*=\s*([0-9.]+)", params)
+        if match:
+            try:
+                q = float(match.group(1))
+            except ValueError:
+                q = 0.0
+        accepted[name] = q
+
+    best, best_q = None, 0.0
+    for encoding in _available_encodings():  # server preference order
+        q = accepted.get(encoding, accepted.get("*", 0.0))
+        if q > best_q:
+            best, best_q = encoding, q
+    return best
+
+def _cached_response(blob: bytes, cache_status: str, raw: Optional[bytes] = None,
+                     cache_key: Optional[str] = None, fmt: str = "json") -> Response:
+    """
+    Serve a gzip-compressed payload in the encoding the client prefers.
+    Other encodings are produced from it once and, given cache_key, kept in
+    the result cache next to the gzip copy; identity clients get it inflated.
+    """
+    encoding = _negotiate_encoding()
+    if encoding is None:
+        body = raw if raw is not None else gzip.decompress(blob)
+    elif encoding == "gzip":
+        body = blob
+    else:
+        body = result_cache.get(cache_key, encoding) if cache_key else None
+        if body is None:
+            body = _compress(raw if raw is not None else gzip.decompress(blob), encoding)
+            if cache_key:
+                result_cache.put(cache_key, body, encoding)
+
+    resp = Response(body, status=200, mimetype=PAYLOAD_FORMATS[fmt])
+    if encoding:
+        resp.headers["Content-Encoding"] = encoding
+    resp.headers["Vary"] = "Accept, Accept-Encoding"
+    resp.headers["X-Cache"] = cache_status
+    return resp
+
+def _store_result(cache_key: str, body: dict, timer: Optional[StageTimer] = None,
+                  fmt: str = "json") -> Tuple[bytes, bytes]:
+    """Serialize and compress a finished payload, cache it, return (raw, gzip) bodies."""
+    timer = timer or StageTimer()
+    with timer.stage("serialize"):
+        raw = _encode_payload(body, fmt)
+    with timer.stage("compress"):
+        blob = gzip.compress(raw, compresslevel=RESULT_CACHE_GZIP_LEVEL, mtime=0)
+    with timer.stage("cache"):
+        result_cache.put(cache_key, blob)
+    return raw, blob
+
+def _cache_and_respond(cache_key: str, body: dict, timer: Optional[StageTimer] = None,
+                       fmt: str = "json") -> Response:
+    raw, blob = _store_result(cache_key, body, timer, fmt)
+    timer = timer or StageTimer()
+    with timer.stage("compress"):
+        return _cached_response(blob, "MISS", raw=raw, cache_key=cache_key, fmt=fmt)
+
+def _finish_timing(resp: Response, timer: StageTimer, **fields) -> Response:
+    """Attach Server-Timing to a complete response and log its timing line."""
+    resp.headers["Server-Timing"] = timer.server_timing()
+    timer.log(status=resp.status_code, payloadBytes=resp.content_length, **fields)
+    return resp
+
+# ========= page-parallel extraction =========
+#
+# PyMuPDF documents cannot be shared across processes, so each worker opens
+# the document itself and extracts a contiguous page range. Results are
+# yielded back in page order.
+
+_process_pool: Optional[ProcessPoolExecutor] = None
+_process_pool_lock = threading.Lock()
+
+def _warm_worker() -> None:
+    import fitz  # noqa: F401  (pay the import cost before the first real task)
+
+def _get_process_pool() -> ProcessPoolExecutor:
+    """Create the extraction process pool on first use and start all of its workers."""
+    global _process_pool
+    with _process_pool_lock:
+        if _process_pool is None:
+            # spawn: workers must not inherit the server's threads or MuPDF state
+            pool = ProcessPoolExecutor(
+                max_workers=EXTRACT_PROCESS_WORKERS,
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+            for f in [pool.submit(_warm_worker) for _ in range(EXTRACT_PROCESS_WORKERS)]:
+                f.result()
+            _process_pool = pool
+        return _process_pool
+
+def _reset_process_pool() -> None:
+    global _process_pool
+    with _process_pool_lock:
+        pool, _process_pool = _process_pool, None
+    if pool is not None:
+        pool.shutdown(wait=False, cancel_futures=True)
+
+def _extract_pages_from_doc(doc, page_indices: List[int], options: dict) -> List[Tuple[dict, List[dict], dict, StageTimer]]:
+    image_assets = _new_image_assets(doc, options)
+    pages = []
+    for page_index in page_indices:
+        timer = StageTimer()
+        page_dimensions, items = _extract_page(doc, page_index, image_assets, options, timer)
+        pages.append((page_dimensions, items, image_assets.drain_new(), timer))
+    return pages
+
+def _extract_pages(source, page_indices: List[int], options: dict) -> List[Tuple[dict, List[dict], dict, StageTimer]]:
+    """Process-pool task: open the document in this process and extract the given pages."""
+    doc = _open_pdf(source)
+    try:
+        return _extract_pages_from_doc(doc, page_indices, options)
+    finally:
+        doc.close()
+
+def _iter_pages(doc, source, page_indices: List[int], options: dict, timer: StageTimer):
+    """
+    Yield (page_index, page_dimensions, items, new_assets) for each of
+    page_indices in order, in parallel when there are many pages. new_assets
+    holds the image assets first referenced on that page.
+    """
+    if EXTRACT_PROCESS_WORKERS > 1 and len(page_indices) >= EXTRACT_PARALLEL_MIN_PAGES:
+        yield from _iter_pages_parallel(doc, source, page_indices, options, timer)
+        return
+    image_assets = _new_image_assets(doc, options)
+    for page_index in page_indices:
+        page_dimensions, items = _extract_page(doc, page_index, image_assets, options, timer)
+        yield page_index, page_dimensions, items, image_assets.drain_new()
+
+def _iter_pages_parallel(doc, source, page_indices: List[int], options: dict, timer: StageTimer):
+    tmp_path = None
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        # Hand workers a path instead of pickling the whole PDF into every task
+        fd, tmp_path = tempfile.mkstemp(suffix=".pdf")
+        with os.fdopen(fd, "wb") as f:
+            f.write(source)
+        source = tmp_path
+
+    count = len(page_indices)
+    chunk = max(1, min(EXTRACT_PARALLEL_CHUNK_PAGES, -(-count // EXTRACT_PROCESS_WORKERS)))
+    batches = [page_indices[start:start + chunk] for start in range(0, count, chunk)]
+    seen_assets = set()
+    futures = []
+    try:
+        pool = _get_process_pool()
+        futures = [pool.submit(_extract_pages, source, batch, options) for batch in batches]
+        for batch, future in zip(batches, futures):
+            try:
+                pages = future.result()
+            except Exception as e:
+                # e.g. a crashed worker: extract this batch in-process instead
+                print(f"[_iter_pages_parallel] Pages {batch[0]}-{batch[-1]} failed in worker: {e}")
+                if "BrokenProcessPool" in type(e).__name__:
+                    _reset_process_pool()
+                pages = _extract_pages_from_doc(doc, batch, options)
+            for page_index, (page_dimensions, items, new_assets, page_timer) in zip(batch, pages):
+                timer.merge(page_timer)
+                # Workers dedupe within their own batch; drop assets already sent
+                new_assets = {k: v for k, v in new_assets.items() if k not in seen_assets}
+                seen_assets.update(new_assets)
+                yield page_index, page_dimensions, items, new_assets
+    finally:
+        for future in futures:
+            future.cancel()
+        if tmp_path:
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+
+# ========= extraction records / streaming (NDJSON) responses =========
+#
+# Page-by-page extraction is expressed as a sequence of records, which
+# ?stream=ndjson emits one JSON record per line and background jobs consume:
+#   {"type": "header", "pageCount": N, "pageDimensions": {...},   (first page size)
+#    "documentId": sha256, "pages": [...]}       (pages only with ?pages=)
+#   {"type": "page", "index": i, "width": w, "height": h, "items": [...]}
+#                                          (items already in per-page z-order)
+#   {"type": "end", "itemCount": M}
+# or {"type": "error", "message": "..."} if extraction fails part way through.
+#
+# With ?assets=table, image items reference {"asset": id} and each page
+# record carries an "assets" map of the assets first used on that page; the
+# non-streaming body gets one top-level "assets" table instead.
+# With ?assets=url, image and vector items carry {"asset": id, "url": ...}
+# and the bytes are served from GET /assets/<id>; the url is relative to
+# this server.
+
+# ?schema=2 selects the compact payload (see _iter_schema_v2_records); the
+# flat item list above stays the default (schema 1).
+#
+# ?vectors=layers replaces the one-item-per-path vector output with a few
+# layer items per page, each an SVG of many paths plus a "paths" id map
+# (see _vector_layer_items). ?coalesce=1 merges neighbouring same-style
+# paths into compound paths first (see _coalesce_vector_paths).
+#
+# ?order=stream or ?order=paint extracts pages with the unified extractor,
+# which orders each page's items by the content stream (estimated) or by
+# PyMuPDF paint sequence numbers (exact) instead of the default z-order
+# bands (zorder). Manifest PDFs keep their manifest order. It cannot be
+# combined with ?vectors=layers or ?coalesce=1.
+
+ASSET_MODES = ("inline", "table", "url")
+SCHEMAS = (1, 2)
+VECTOR_MODES = ("items", "layers")
+ORDER_MODES = ("zorder", "stream", "paint")
+
+def _parse_page_spec(spec: str) -> str:
+    """
+    Validate a 1-based page selection like "1-5,10" and return it in
+    canonical form (sorted, overlapping ranges merged), so equivalent
+    selections share a cache entry. Raises ValueError if malformed.
+    """
+    ranges = []
+    for part in spec.split(","):
+        part = part.strip()
+        m = re.fullmatch(r"(\d+)(?:\s*-\s*(\d+))?", part)
+        if not m:
+            raise ValueError(f"Invalid page selection: {part!r}")
+        first = int(m.group(1))
+        last = int(m.group(2)) if m.group(2) else first
+        if first < 1 or last < first:
+            raise ValueError(f"Invalid page range: {part!r}")
+        ranges.append((first, last))
+
+    merged: List[List[int]] = []
+    for first, last in sorted(ranges):
+        if merged and first <= merged[-1][1] + 1:
+            merged[-1][1] = max(merged[-1][1], last)
+        else:
+            merged.append([first, last])
+    return ",".join(str(a) if a == b else f"{a}-{b}" for a, b in merged)
+
+def _page_indices(spec: Optional[str], page_count: int) -> List[int]:
+    """0-based page indices selected by a canonical page spec (None = all pages)."""
+    if spec is None:
+        return list(range(page_count))
+    indices = []
+    for part in spec.split(","):
+        first, _, last = part.partition("-")
+        indices.extend(range(int(first) - 1, min(int(last or first), page_count)))
+    return indices
+
+def _extraction_options_from_request():
+    """Return (options, None) from the query string, or (None, error_response)."""
+    asset_mode = (request.args.get("assets") or "inline").lower()
+    if asset_mode not in ASSET_MODES:
+        return None, (jsonify({"message": f"Unsupported assets mode: {asset_mode}"}), 400)
+
+    pages = request.args.get("pages")
+    if pages is not None:
+        try:
+            pages = _parse_page_spec(pages)
+        except ValueError as e:
+            return None, (jsonify({"message": str(e)}), 400)
+
+    options = {"assets": asset_mode, "pages": pages}
+
+    fmt, error = _payload_format_from_request()
+    if error:
+        return None, error
+    if fmt != "json":
+        options["format"] = fmt
+
+    schema = request.args.get("schema") or "1"
+    if not schema.isdigit() or int(schema) not in SCHEMAS:
+        return None, (jsonify({"message": f"Unsupported schema: {schema}"}), 400)
+    if int(schema) == 2:
+        # Only set for v2 so schema 1 keeps its existing cache keys
+        precision = request.args.get("precision") or str(SCHEMA_V2_PRECISION)
+        if not precision.isdigit() or int(precision) > SCHEMA_V2_MAX_PRECISION:
+            return None, (jsonify({"message": f"Invalid precision: {precision}"}), 400)
+        options["schema"] = 2
+        options["precision"] = int(precision)
+
+    vectors = (request.args.get("vectors") or "items").lower()
+    if vectors not in VECTOR_MODES:
+        return None, (jsonify({"message": f"Unsupported vectors mode: {vectors}"}), 400)
+    if vectors != "items":
+        options["vectors"] = vectors
+    if (request.args.get("coalesce") or "0").lower() in ("1", "true", "yes"):
+        options["coalesce"] = True
+
+    order = (request.args.get("order") or "zorder").lower()
+    if order not in ORDER_MODES:
+        return None, (jsonify({"message": f"Unsupported order: {order}"}), 400)
+    if order != "zorder":
+        # The unified extractor has no vector layers or coalescing
+        if "vectors" in options or "coalesce" in options:
+            message = f"order={order} cannot be combined with vectors=layers or coalesce"
+            return None, (jsonify({"message": message}), 400)
+        options["order"] = order
+
+    return options, None
+
+def _payload_format_from_request():
+    """
+    Return (format, None) from ?format= or, failing that, the Accept header,
+    or (None, error_response). Streamed responses are always NDJSON.
+    """
+    formats = _available_formats()
+    streaming = bool(request.args.get("stream"))
+    fmt = (request.args.get("format") or "").lower()
+    if fmt:
+        if fmt not in formats:
+            return None, (jsonify({"message": f"Unsupported format: {fmt}"}), 400)
+        if streaming and fmt != "json":
+            return None, (jsonify({"message": "stream=ndjson is only available as JSON"}), 400)
+        return fmt, None
+    if streaming:
+        return "json", None
+    best = request.accept_mimetypes.best_match([PAYLOAD_FORMATS[f] for f in formats],
+                                               default=PAYLOAD_FORMATS["json"])
+    return next(f for f in formats if PAYLOAD_FORMATS[f] == best), None
+
+def _payload_format(options: dict) -> str:
+    return options.get("format", "json")
+
+def _new_image_assets(doc, options: dict) -> ImageAssets:
+    return ImageAssets(doc, store=asset_store if options["assets"] == "url" else None)
+
+def _extract_page(doc, page_index: int, image_assets: ImageAssets, options: dict,
+                  timer: StageTimer) -> Tuple[dict, List[dict]]:
+    """
+    Single pass over one page: the page is loaded once and one TextPage is
+    shared by the text consumers, while text, images and drawings all come
+    from the same page object. Returns (page_dimensions, items) with items
+    sorted in paint order.
+    options["order"] "stream" or "paint" hands the page to the unified
+    extractor instead (_extract_unified_page).
+    """
+    import fitz  # PyMuPDF
+
+    page_start = time.perf_counter()
+    if options.get("order"):
+        with timer.stage("unified"):
+            page_dimensions, items = _extract_unified_page(doc, page_index, image_assets, options["order"],
+                                                           asset_mode=options["assets"])
+        timer.add_page(page_index, time.perf_counter() - page_start)
+        return page_dimensions, items
+    with timer.stage("load"):
+        page = doc[page_index]
+        page_dimensions = _page_dimensions(page)
+    with timer.stage("text"):
+        textpage = page.get_textpage(flags=fitz.TEXTFLAGS_RAWDICT)
+
+    items = _extract_page_with_pymupdf(
+        doc, page, page_index, textpage=textpage,
+        image_assets=image_assets, asset_mode=options["assets"], timer=timer,
+    )
+    try:
+        items.extend(_extract_page_vectors_with_pymupdf(
+            page, page_index, asset_store=image_assets.store, timer=timer,
+            mode=options.get("vectors", "items"),
+            coalesce=options.get("coalesce", False),
+        ))
+    except Exception as e:
+        print(f"[_extract_page] Vector extraction failed on page {page_index}: {e}")
+    with timer.stage("sort"):
+        items.sort(key=lambda it: float(it.get("zOrder", 0)))
+    timer.add_page(page_index, time.perf_counter() - page_start)
+    return page_dimensions, items
+
+def _first_page_dimensions(doc) -> dict:
+    return _page_dimensions(doc[0]) if len(doc) > 0 else {"width": 595.0, "height": 842.0}
+
+def _manifest_page_dimensions(manifest: LazyManifest, doc) -> dict:
+    """Page dimensions from the manifest, else from the first PDF page, else A4."""
+    if manifest.get("pageDimensions"):
+        return manifest["pageDimensions"]
+    try:
+        return _first_page_dimensions(doc)
+    except Exception:
+        return {"width": 595.0, "height": 842.0}
+
+def _iter_manifest_pages(doc, manifest: LazyManifest, page_indices: List[int], options: dict,
+                         timer: StageTimer):
+    """
+    Manifest counterpart of _iter_pages: flatten one manifest page at a time,
+    yielding (page_index, page_dimensions, items, new_assets).
+    """
+    image_assets = _new_image_assets(doc, options)
+    for page_index in page_indices:
+        with timer.stage("manifest"):
+            items = _flatten_manifest_page(manifest.page(page_index), page_index) \
+                if page_index < manifest.page_count else []
+        with timer.stage("images"):
+            _resolve_manifest_assets(items, manifest, image_assets, options["assets"])
+        page_dimensions = _page_dimensions(doc[page_index]) if page_index < len(doc) else {}
+        yield page_index, page_dimensions, items, image_assets.drain_new()
+
+def _header_record(page_count: int, page_dimensions: dict, document_id: Optional[str],
+                   page_indices: Optional[List[int]]) -> dict:
+    record = {"type": "header", "pageCount": page_count, "pageDimensions": page_dimensions}
+    if document_id:
+        record["documentId"] = document_id
+    if page_indices is not None:
+        record["pages"] = page_indices
+    return record
+
+def _iter_records_from_body(body: dict, doc):
+    """Replay a complete {"items", "pageDimensions"[, "assets"]} payload as extraction records."""
+    if body.get("schema") == 2:
+        yield from _iter_records_from_v2_body(body)
+        return
+
+    pages: dict = {}
+    for item in body["items"]:
+        pages.setdefault(int(item.get("index", 0)), []).append(item)
+
+    assets = body.get("assets")
+    sent_assets = set()
+
+    pdf_page_count = len(doc)
+    page_count = max(pdf_page_count, (max(pages) + 1) if pages else 0)
+    page_indices = body.get("pages")
+    yield _header_record(page_count, body["pageDimensions"], body.get("documentId"), page_indices)
+    for page_index in (range(page_count) if page_indices is None else page_indices):
+        record = {"type": "page", "index": page_index}
+        if page_index < pdf_page_count:
+            record.update(_page_dimensions(doc[page_index]))
+        record["items"] = pages.get(page_index, [])
+        if assets is not None:
+            record["assets"] = {}
+            for item in record["items"]:
+                asset_id = item.get("asset")
+                if asset_id in assets and asset_id not in sent_assets:
+                    record["assets"][asset_id] = assets[asset_id]
+                    sent_assets.add(asset_id)
+        yield record
+    yield {"type": "end", "itemCount": len(body["items"])}
+
+# ---------- schema 2 (compact payload) ----------
+#
+# The same records, compacted page by page:
+#   header: adds "schema": 2, "precision": p and "defaults": {...}
+#   page:   {"type": "page", "index", "width", "height",
+#            "styles": [{"fontSize", "color", "ascender", ...}, ...], "items": [...]}
+# Items drop "index" (implied by the page) and "zOrder" (items are already in
+# paint order; "zIndex" is kept where the source has one). Text items point
+# at styles[i] with "style": i instead of repeating font, size and colour.
+# Keys equal to their value in "defaults" are omitted, so a missing key
+# means the default, and coordinates are rounded to p decimals.
+# The non-streaming body is the header fields plus "pages": [page, ...]
+# (without "type"), and one top-level "assets" table with ?assets=table.
+
+SCHEMA_V2_DEFAULTS = {"anchor": "top", "fontFamily": "Lato"}
+_V2_STYLE_KEYS = frozenset(("fontFamily", "fontSize", "color", "ascender", "descender"))
+_V2_ROUNDED_KEYS = frozenset(("xNorm", "yNormTop", "yNormBaseline", "widthNorm", "heightNorm",
+                              "fontSize", "ascender", "descender"))
+_V2_DROPPED_KEYS = frozenset(("index", "zOrder"))
+
+def _round_v2_value(key: str, value, precision: int):
+    if key in _V2_ROUNDED_KEYS and isinstance(value, float):
+        return round(value, precision)
+    if key == "spans" and isinstance(value, list):
+        return [
+            {k: _round_v2_value(k, v, precision) for k, v in span.items()} if isinstance(span, dict) else span
+            for span in value
+        ]
+    return value
+
+def _compact_page_items(items: List[dict], precision: int) -> Tuple[List[dict], List[dict]]:
+    """Compact one page of schema 1 items; returns (styles, items)."""
+    styles: List[dict] = []
+    style_ids: dict = {}
+    compacted = []
+    for item in items:
+        compact = {}
+        style = {}
+        for key, value in item.items():
+            if key in _V2_DROPPED_KEYS:
+                continue
+            if key in SCHEMA_V2_DEFAULTS and SCHEMA_V2_DEFAULTS[key] == value:
+                continue
+            value = _round_v2_value(key, value, precision)
+            if key in _V2_STYLE_KEYS and "text" in item:
+                style[key] = value
+            else:
+                compact[key] = value
+        if style:
+            style_key = tuple(sorted(style.items()))
+            if style_key not in style_ids:
+                style_ids[style_key] = len(styles)
+                styles.append(style)
+            compact["style"] = style_ids[style_key]
+        compacted.append(compact)
+    return styles, compacted
+
+def _iter_schema_v2_records(records, precision: int, timer: StageTimer):
+    """Serialize schema 1 records from any extractor as schema 2 records."""
+    for record in records:
+        if record["type"] == "header":
+            record = {**record, "schema": 2, "precision": precision, "defaults": SCHEMA_V2_DEFAULTS}
+        elif record["type"] == "page":
+            with timer.stage("compact"):
+                styles, items = _compact_page_items(record["items"], precision)
+            record = {k: v for k, v in record.items() if k != "items"}
+            record["styles"] = styles
+            record["items"] = items
+        yield record
+
+def _iter_records_from_v2_body(body: dict):
+    """Replay a complete schema 2 payload as (schema 2) extraction records."""
+    header = {k: v for k, v in body.items() if k not in ("pages", "assets")}
+    if len(body["pages"]) != body.get("pageCount"):
+        header["pages"] = [page["index"] for page in body["pages"]]
+    yield {"type": "header", **header}
+
+    assets = body.get("assets")
+    sent_assets = set()
+    item_count = 0
+    for page in body["pages"]:
+        record = {"type": "page", **page}
+        if assets is not None:
+            record["assets"] = {}
+            for item in page["items"]:
+                asset_id = item.get("asset")
+                if asset_id in assets and asset_id not in sent_assets:
+                    record["assets"][asset_id] = assets[asset_id]
+                    sent_assets.add(asset_id)
+        item_count += len(page["items"])
+        yield record
+    yield {"type": "end", "itemCount": item_count}
+
+def _iter_extraction_records(source, options: dict, document_id: Optional[str] = None,
+                             timer: Optional[StageTimer] = None):
+    """
+    Extract page by page, yielding records as soon as each page is done.
+    The document is opened once and shared by every stage of the pipeline.
+    Only the pages selected by options["pages"] are extracted, and records
+    come out in the payload schema selected by options["schema"].
+    """
+    timer = timer or StageTimer()
+    metric_extractions_in_flight.inc()
+    try:
+        records = _iter_extraction_records_inner(source, options, document_id, timer)
+        if options.get("schema") == 2:
+            records = _iter_schema_v2_records(records, options["precision"], timer)
+        yield from records
+    finally:
+        metric_extractions_in_flight.dec()
+
+def _iter_extraction_records_inner(source, options: dict, document_id: Optional[str], timer: StageTimer):
+    with timer.stage("open"):
+        doc = _open_pdf(source)
+    try:
+        subset = options.get("pages") is not None
+        with timer.stage("manifest"):
+            manifest = try_extract_manifest(source, doc)
+            # A manifest without any items falls back to PyMuPDF extraction
+            if manifest is not None and not _manifest_has_items(manifest):
+                manifest = None
+        if manifest is not None:
+            timer.extractor = "manifest"
+            page_count = max(len(doc), manifest.page_count)
+            first_page_dimensions = _manifest_page_dimensions(manifest, doc)
+        else:
+            timer.extractor = "pymupdf"
+            page_count = len(doc)
+            first_page_dimensions = _first_page_dimensions(doc)
+
+        page_indices = _page_indices(options.get("pages"), page_count)
+        yield _header_record(page_count, first_page_dimensions, document_id, page_indices if subset else None)
+
+        if timer.extractor == "manifest":
+            pages = _iter_manifest_pages(doc, manifest, page_indices, options, timer)
+        else:
+            pages = _iter_pages(doc, source, page_indices, options, timer)
+        item_count = 0
+        for page_index, page_dimensions, items, new_assets in pages:
+            item_count += len(items)
+            timer.count_items(items)
+            record = {"type": "page", "index": page_index, **page_dimensions, "items": items}
+            if options["assets"] == "table":
+                record["assets"] = new_assets
+            yield record
+    finally:
+        doc.close()
+
+    yield {"type": "end", "itemCount": item_count}
+
+def _iter_cached_records(blob: bytes, source):
+    """Replay a cached gzip-compressed payload as extraction records."""
+    body = json.loads(gzip.decompress(blob))
+    doc = _open_pdf(source)
+    try:
+        yield from _iter_records_from_body(body, doc)
+    finally:
+        doc.close()
+
+class _RecordCollector:
+    """
+    Assembles extraction records back into a payload: {"items",
+    "pageDimensions", "pageCount", "documentId"} plus "pages" and "assets"
+    when present in the records. Schema 2 records assemble into the schema 2
+    body, with the page records under "pages".
+    """
+
+    def __init__(self):
+        self.header: dict = {}
+        self.items: List[dict] = []
+        self.pages: List[dict] = []
+        self.assets: Optional[dict] = None
+
+    def add(self, record: dict) -> None:
+        if record["type"] == "header":
+            self.header = record
+        elif record["type"] == "page":
+            if self.header.get("schema") == 2:
+                self.pages.append({k: v for k, v in record.items() if k not in ("type", "assets")})
+            else:
+                self.items.extend(record["items"])
+            if "assets" in record:
+                if self.assets is None:
+                    self.assets = {}
+                self.assets.update(record["assets"])
+
+    def body(self) -> dict:
+        if self.header.get("schema") == 2:
+            body = {k: v for k, v in self.header.items() if k not in ("type", "pages")}
+            body["pages"] = self.pages
+        else:
+            body = {"items": self.items, "pageDimensions": self.header.get("pageDimensions")}
+            for key in ("pageCount", "documentId", "pages"):
+                if key in self.header:
+                    body[key] = self.header[key]
+        if self.assets is not None:
+            body["assets"] = self.assets
+        return body
+
+def _caching_records(records, cache_key: str, timer: Optional[StageTimer] = None):
+    """Pass records through, caching the assembled payload once the stream completes."""
+    collector = _RecordCollector()
+    for record in records:
+        collector.add(record)
+        if record["type"] == "end":
+            _store_result(cache_key, collector.body(), timer)
+        yield record
+
+def _collect_records(records) -> dict:
+    """Assemble extraction records back into a complete payload."""
+    collector = _RecordCollector()
+    for record in records:
+        collector.add(record)
+    return collector.body()
+
+def _ndjson_response(records, cache_status: str, timer: Optional[StageTimer] = None,
+                     **log_fields) -> Response:
+    """
+    Stream records as NDJSON. Server-Timing can only cover the work done
+    before the headers go out; the full breakdown is logged once the stream
+    ends.
+    """
+    timer = timer or StageTimer()
+    encoding = _negotiate_encoding()
+    compress, finish = _stream_compressor(encoding) if encoding else (None, None)
+
+    def encode(line: str) -> bytes:
+        data = line.encode("utf-8")
+        if compress is None:
+            return data
+        with timer.stage("compress"):
+            return compress(data)
+
+    def generate():
+        payload_bytes = 0
+        try:
+            for record in records:
+                with timer.stage("serialize"):
+                    line = app.json.dumps(record) + "\n"
+                chunk = encode(line)
+                payload_bytes += len(chunk)
+                yield chunk
+        except Exception as e:
+            print(f"[_ndjson_response] Streaming extraction failed: {e}")
+            chunk = encode(app.json.dumps({"type": "error", "message": f"Extraction failed: {e}"}) + "\n")
+            payload_bytes += len(chunk)
+            yield chunk
+            log_fields["error"] = str(e)
+        finally:
+            if finish is not None:
+                tail = finish()
+                payload_bytes += len(tail)
+            timer.log(status=200, payloadBytes=payload_bytes, cache=cache_status,
+                      encoding=encoding or "identity", **log_fields)
+        if finish is not None:
+            yield tail
+
+    resp = Response(generate(), status=200, mimetype="application/x-ndjson")
+    if encoding:
+        resp.headers["Content-Encoding"] = encoding
+    resp.headers["Vary"] = "Accept-Encoding"
+    resp.headers["Server-Timing"] = timer.server_timing()
+    resp.headers["X-Cache"] = cache_status
+    # Ask reverse proxies not to buffer, so pages reach the client as they are extracted
+    resp.headers["X-Accel-Buffering"] = "no"
+    return resp
+
+# ========= asynchronous extraction jobs =========
+
+class ExtractionJob:
+    """State of one background extraction submitted through POST /jobs."""
+
+    def __init__(self, digest: str, cache_key: str, options: dict):
+        self.id = uuid.uuid4().hex
+        self.digest = digest
+        self.cache_key = cache_key
+        self.options = options
+        self.timer = StageTimer()
+        self.status = "queued"  # queued | running | done | failed | cancelled
+        self.pages_done = 0
+        self.pages_total: Optional[int] = None
+        self.error: Optional[str] = None
+        self.result: Optional[bytes] = None  # gzip-compressed JSON body
+        self.created_at = time.time()
+        self.finished_at: Optional[float] = None
+        self.cancel_event = threading.Event()
+        self.future = None
+
+    @property
+    def finished(self) -> bool:
+        return self.status in ("done", "failed", "cancelled")
+
+    def finish(self, status: str, error: Optional[str] = None) -> None:
+        self.status = status
+        self.error = error
+        self.finished_at = time.time()
+
+    def to_dict(self) -> dict:
+        return {
+            "jobId": self.id,
+            "status": self.status,
+            "pagesDone": self.pages_done,
+            "pagesTotal": self.pages_total,
+            "createdAt": self.created_at,
+            "finishedAt": self.finished_at,
+            "error": self.error,
+        }
+
+
+class JobManager:
+    """
+    Runs extraction jobs on a bounded thread pool.
+
+    At most max_pending jobs may be queued or running at once; further
+    submissions are rejected. Finished jobs (and their results) are kept for
+    result_ttl_seconds and then dropped.
+    """
+
+    def __init__(self, workers: int, max_pending: int, result_ttl_seconds: float):
+        self.max_pending = max_pending
+        self.result_ttl_seconds = result_ttl_seconds
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="extract-job")
+        self._jobs: dict = {}
+        self._lock = threading.Lock()
+
+    def _expire(self) -> None:
+        cutoff = time.time() - self.result_ttl_seconds
+        with self._lock:
+            for job_id in [j.id for j in self._jobs.values() if j.finished and j.finished_at < cutoff]:
+                del self._jobs[job_id]
+
+    def submit(self, digest: str, source, cache_key: str, options: dict) -> Optional[ExtractionJob]:
+        """Queue an extraction of source; returns None if the pool is saturated."""
+        self._expire()
+        job = ExtractionJob(digest, cache_key, options)
+        with self._lock:
+            pending = sum(1 for j in self._jobs.values() if not j.finished)
+            if pending >= self.max_pending:
+                return None
+            self._jobs[job.id] = job
+        job.future = self._executor.submit(self._run, job, source)
+        return job
+
+    def add_finished(self, digest: str, cache_key: str, options: dict, result: bytes) -> ExtractionJob:
+        """Register an already available (cached) result as a finished job."""
+        self._expire()
+        job = ExtractionJob(digest, cache_key, options)
+        job.result = result
+        job.finish("done")
+        with self._lock:
+            self._jobs[job.id] = job
+        return job
+
+    def get(self, job_id: str) -> Optional[ExtractionJob]:
+        self._expire()
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def cancel(self, job_id: str) -> Optional[ExtractionJob]:
+        job = self.get(job_id)
+        if job is None or job.finished:
+            return job
+        job.cancel_event.set()
+        if job.future is not None and job.future.cancel():
+            # Never started: nothing will pick it up, so finish it here
+            job.finish("cancelled")
+        return job
+
+    def _run(self, job: ExtractionJob, source) -> None:
+        if job.cancel_event.is_set():
+            job.finish("cancelled")
+            return
+        job.status = "running"
+        job.timer.add("queue", job.timer.elapsed())
+
+        records = _iter_extraction_records(source, job.options, job.digest, job.timer)
+        log_fields = {"route": "jobs", "jobId": job.id, "documentId": job.digest, "cache": "MISS"}
+        collector = _RecordCollector()
+        try:
+            for record in records:
+                if job.cancel_event.is_set():
+                    records.close()
+                    job.finish("cancelled")
+                    return
+                collector.add(record)
+                if record["type"] == "header":
+                    # With ?pages= only the selected pages are extracted
+                    job.pages_total = len(record["pages"]) if "pages" in record else record["pageCount"]
+                elif record["type"] == "page":
+                    job.pages_done += 1
+
+            # Keep our own reference to the result so it stays retrievable for the
+            # job's TTL even if the result cache evicts it
+            _, job.result = _store_result(job.cache_key, collector.body(), job.timer, _payload_format(job.options))
+        except Exception as e:
+            # Also covers assembling, encoding and caching the result, so a
+            # failure there cannot leave the job "running" forever
+            print(f"[JobManager._run] Job {job.id} failed: {e}")
+            job.finish("failed", f"Extraction failed: {e}")
+            job.timer.log(status=job.status, error=str(e), **log_fields)
+            return
+
+        job.finish("done")
+        job.timer.log(status=job.status, payloadBytes=len(job.result), **log_fields)
+
+
+job_manager = JobManager(
+    workers=JOB_WORKERS,
+    max_pending=JOB_MAX_PENDING,
+    result_ttl_seconds=JOB_RESULT_TTL_SECONDS,
+)
+
 # ========= route =========
 
 def allowed_file(filename: str) -> bool:
     return "." in filename and filename.rsplit(".", 1)[1].lower() in ALLOWED_EXTENSIONS
 
-@app.route("/upload-pdf", methods=["POST"])
-def upload_pdf():
+def _read_uploaded_pdf():
+    """Return (pdf_bytes, None) for a valid "pdf" upload, else (None, error_response)."""
     if "pdf" not in request.files:
-        return jsonify({"message": "No file part"}), 400
+        return None, (jsonify({"message": "No file part"}), 400)
 
     file = request.files["pdf"]
     if file.filename == "":
-        return jsonify({"message": "No selected file"}), 400
+        return None, (jsonify({"message": "No selected file"}), 400)
 
     if not (file and allowed_file(file.filename)):
-        return jsonify({"message": "Invalid file type. Only PDF files are allowed."}), 400
-
-    # Save uploaded file
-    unique_prefix = str(int(os.path.getmtime(os.path.abspath(__file__))))
-    filename = f"{unique_prefix}-{file.filename}"
-    saved_path = os.path.join(app.config["UPLOAD_FOLDER"], filename)
-    file.save(saved_path)
-
-    # Default page dimensions (A4)
-    page_dimensions = {"width": 595.0, "height": 842.0}
-
-    # 1) Preferred: embedded manifest.json (via pypdf)
-    manifest = try_extract_manifest(saved_path)
-    if manifest:
-        payload = flatten_manifest_to_payload(manifest) or []
-        # sort just in case we added zOrder above
-        payload.sort(key=lambda it: (int(it.get("index", 0)), int(it.get("zOrder", 0))))
-        if payload:
-            # Try to get page dimensions from manifest or extract from PDF
-            if manifest.get("pageDimensions"):
-                page_dimensions = manifest["pageDimensions"]
-            else:
-                # Extract dimensions from PDF even if manifest exists
-                try:
-                    import fitz
-                    doc = fitz.open(saved_path)
-                    if len(doc) > 0:
-                        first_page = doc[0]
-                        page_dimensions = {
-                            "width": float(first_page.rect.width),
-                            "height": float(first_page.rect.height)
-                        }
-                    doc.close()
-                except Exception:
-                    pass
+        return None, (jsonify({"message": "Invalid file type. Only PDF files are allowed."}), 400)
 
-            return jsonify({
-                "items": payload,
-                "pageDimensions": page_dimensions
-            }), 200
-        # else fall through to extractors
+    return file.read(), None
 
-    # 2) Fallback: PyMuPDF-based extraction (text + raster images)
+@app.route("/upload-pdf", methods=["POST"])
+def upload_pdf():
+    timer = StageTimer()
+    with timer.stage("upload"):
+        data, error = _read_uploaded_pdf()
+    if error:
+        return error
+
+    stream_mode = (request.args.get("stream") or "").lower()
+    if stream_mode not in ("", "ndjson"):
+        return jsonify({"message": f"Unsupported stream mode: {stream_mode}"}), 400
+
+    options, error = _extraction_options_from_request()
+    if error:
+        return error
+
+    with timer.stage("upload"):
+        digest = hashlib.sha256(data).hexdigest()
+        # Store upload by content hash (small PDFs are also cached in memory); it stays
+        # addressable as /documents/<digest> for on-demand page extraction
+        source = upload_store.put(digest, data)
+    log_fields = {"route": "upload-pdf", "documentId": digest, "uploadBytes": len(data)}
+
+    # Repeat opens of the same PDF are served from the result cache
+    cache_key = _result_cache_key(digest, options)
+    with timer.stage("cache"):
+        cached = result_cache.get(cache_key)
+    if cached is not None:
+        if stream_mode == "ndjson":
+            return _ndjson_response(_iter_cached_records(cached, source), "HIT", timer, **log_fields)
+        resp = _cached_response(cached, "HIT", cache_key=cache_key, fmt=_payload_format(options))
+        return _finish_timing(resp, timer, cache="HIT", **log_fields)
+
+    if stream_mode == "ndjson":
+        records = _iter_extraction_records(source, options, digest, timer)
+        return _ndjson_response(_caching_records(records, cache_key, timer), "MISS", timer, **log_fields)
+
+    # 1) Preferred: embedded manifest.json
+    # 2) Fallback: PyMuPDF-based extraction (text + raster images + vectors),
+    #    page by page and already in per-page paint order
     try:
-        pdf_data, page_dimensions = _extract_with_pymupdf(saved_path)
+        body = _collect_records(_iter_extraction_records(source, options, digest, timer))
     except Exception as e:
-        return jsonify({"message": f"Extraction failed: {e}"}), 500
+        resp = jsonify({"message": f"Extraction failed: {e}"})
+        resp.status_code = 500
+        return _finish_timing(resp, timer, cache="MISS", error=str(e), **log_fields)
+
+    resp = _cache_and_respond(cache_key, body, timer, _payload_format(options))
+    return _finish_timing(resp, timer, cache="MISS", **log_fields)
+
+@app.route("/documents/<document_id>/pages/<int:page_number>", methods=["GET"])
+def get_document_page(document_id, page_number):
+    """Extract one page (1-based) of a previously uploaded PDF, on demand."""
+    source = upload_store.get(document_id) if _SHA256_RE.match(document_id) else None
+    if source is None:
+        return jsonify({"message": "Unknown or expired document, upload it again"}), 404
+
+    if page_number < 1:
+        return jsonify({"message": "Page numbers start at 1"}), 404
+
+    options, error = _extraction_options_from_request()
+    if error:
+        return error
+    options["pages"] = str(page_number)
+
+    timer = StageTimer()
+    log_fields = {"route": "documents/pages", "documentId": document_id}
+
+    # Shares cache entries with POST /upload-pdf?pages=<n>
+    cache_key = _result_cache_key(document_id, options)
+    with timer.stage("cache"):
+        cached = result_cache.get(cache_key)
+    if cached is not None:
+        resp = _cached_response(cached, "HIT", cache_key=cache_key, fmt=_payload_format(options))
+        return _finish_timing(resp, timer, cache="HIT", **log_fields)
 
-    # 3) Vector extraction using native PyMuPDF get_drawings()
     try:
-        vector_items = _extract_vectors_with_pymupdf(saved_path)
+        body = _collect_records(_iter_extraction_records(source, options, document_id, timer))
     except Exception as e:
-        print(f"[upload_pdf] Vector extraction failed: {e}")
-        vector_items = []
+        resp = jsonify({"message": f"Extraction failed: {e}"})
+        resp.status_code = 500
+        return _finish_timing(resp, timer, cache="MISS", error=str(e), **log_fields)
+
+    if page_number > body["pageCount"]:
+        return jsonify({"message": f"Page {page_number} out of range (1-{body['pageCount']})"}), 404
 
-    # Merge all items (frontend expects a flat list)
-    payload = pdf_data + vector_items
+    resp = _cache_and_respond(cache_key, body, timer, _payload_format(options))
+    return _finish_timing(resp, timer, cache="MISS", **log_fields)
 
-    # ✅ Stable per-page paint order
-    payload.sort(key=lambda it: (int(it.get("index", 0)), float(it.get("zOrder", 0))))
+@app.route("/documents/<document_id>/info", methods=["GET"])
+def get_document_info(document_id):
+    """
+    Page count and per-page geometry of a stored upload, straight from the
+    page tree, so the client can lay out (and virtualize) every page before
+    any content has been extracted.
+    """
+    source = upload_store.get(document_id) if _SHA256_RE.match(document_id) else None
+    if source is None:
+        return jsonify({"message": "Unknown or expired document, upload it again"}), 404
 
-    return jsonify({
-        "items": payload,
-        "pageDimensions": page_dimensions
-    }), 200
+    cache_key = _result_cache_key(document_id, {"view": "info"})
+    cached = result_cache.get(cache_key)
+    if cached is not None:
+        return _cached_response(cached, "HIT", cache_key=cache_key)
+
+    try:
+        doc = _open_pdf(source)
+    except Exception as e:
+        return jsonify({"message": f"Could not open document: {e}"}), 500
+
+    try:
+        pages = []
+        attached = list(doc.embfile_names()) + _af_file_names(doc, doc.pdf_catalog())
+        for xref, info in _iter_page_tree_info(doc):
+            pages.append(info)
+            attached.extend(_af_file_names(doc, xref))
+    except Exception as e:
+        return jsonify({"message": f"Could not read page tree: {e}"}), 500
+    finally:
+        doc.close()
+
+    return _cache_and_respond(cache_key, {
+        "documentId": document_id,
+        "pageCount": len(pages),
+        "hasManifest": any(str(name).lower().endswith("manifest.json") for name in attached),
+        "pages": pages,
+    })
+
+def _job_links(job: ExtractionJob) -> dict:
+    return {
+        **job.to_dict(),
+        "statusUrl": f"/jobs/{job.id}",
+        "resultUrl": f"/jobs/{job.id}/result",
+    }
+
+@app.route("/jobs", methods=["POST"])
+def create_job():
+    data, error = _read_uploaded_pdf()
+    if error:
+        return error
+
+    options, error = _extraction_options_from_request()
+    if error:
+        return error
+
+    digest = hashlib.sha256(data).hexdigest()
+    source = upload_store.put(digest, data)
+    cache_key = _result_cache_key(digest, options)
+    cached = result_cache.get(cache_key)
+    if cached is not None:
+        job = job_manager.add_finished(digest, cache_key, options, cached)
+    else:
+        job = job_manager.submit(digest, source, cache_key, options)
+        if job is None:
+            return jsonify({"message": "Too many extraction jobs in progress, retry later."}), 503
+
+    resp = jsonify(_job_links(job))
+    resp.status_code = 202
+    resp.headers["Location"] = f"/jobs/{job.id}"
+    return resp
+
+@app.route("/jobs/<job_id>", methods=["GET"])
+def get_job(job_id):
+    job = job_manager.get(job_id)
+    if job is None:
+        return jsonify({"message": "Unknown or expired job"}), 404
+    return jsonify(_job_links(job)), 200
+
+@app.route("/jobs/<job_id>", methods=["DELETE"])
+def cancel_job(job_id):
+    job = job_manager.cancel(job_id)
+    if job is None:
+        return jsonify({"message": "Unknown or expired job"}), 404
+    return jsonify(_job_links(job)), 200
+
+@app.route("/jobs/<job_id>/result", methods=["GET"])
+def get_job_result(job_id):
+    job = job_manager.get(job_id)
+    if job is None:
+        return jsonify({"message": "Unknown or expired job"}), 404
+    if job.status == "done":
+        return _cached_response(job.result, "HIT", cache_key=job.cache_key, fmt=_payload_format(job.options))
+    if job.status == "failed":
+        return jsonify({**job.to_dict(), "message": job.error}), 500
+    if job.status == "cancelled":
+        return jsonify({**job.to_dict(), "message": "Job was cancelled"}), 409
+    # Still queued or running
+    return jsonify(_job_links(job)), 202
+
+@app.route("/metrics", methods=["GET"])
+def get_metrics():
+    return Response(metrics.render(), content_type="text/plain; version=0.0.4; charset=utf-8")
+
+@app.route("/assets/<asset_id>", methods=["GET"])
+def get_asset(asset_id):
+    found = asset_store.get(asset_id)
+    if found is None:
+        return jsonify({"message": "Unknown or expired asset"}), 404
+    path, mime = found
+    # Content-addressed: the id is the content hash, so the body never changes
+    resp = send_file(os.path.abspath(path), mimetype=mime, etag=asset_id, conditional=True,
+                     max_age=ASSET_MAX_AGE_SECONDS)
+    resp.cache_control.public = True
+    resp.cache_control.immutable = True
+    resp.headers["X-Content-Type-Options"] = "nosniff"
+    if mime == "image/svg+xml":
+        # Extracted SVGs are only ever displayed as images
+        resp.headers["Content-Security-Policy"] = "default-src 'none'; style-src 'unsafe-inline'"
+    return resp
 
 if __name__ == "__main__":
     app.run(debug=True)
@@ -0,0 +1 @@
+"""Extraction benchmarks for the PdfEditorServer backend (see benchmarks/run.py)."""
@@ -0,0 +1,76 @@
+"""
+Compare two benchmark result files from benchmarks/run.py.
+
+    python -m benchmarks.compare baseline.json candidate.json [--threshold 10]
+
+Prints median wall time, peak RSS and payload size deltas per (document,
+extractor) and exits with status 1 if any median wall time regressed by more
+than --threshold percent. Results from different corpora (sha256 mismatch)
+are flagged, since their numbers are not comparable.
+"""
+import argparse
+import json
+import sys
+from typing import Optional
+
+
+def _pct(old: Optional[float], new: Optional[float]) -> Optional[float]:
+    if not old or new is None:
+        return None
+    return (new - old) / old * 100.0
+
+
+def _fmt_pct(value: Optional[float]) -> str:
+    return "     n/a" if value is None else f"{value:+7.1f}%"
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("baseline")
+    parser.add_argument("candidate")
+    parser.add_argument("--threshold", type=float, default=10.0,
+                        help="fail if median wall time regresses by more than this percentage")
+    args = parser.parse_args()
+
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    with open(args.candidate) as f:
+        candidate = json.load(f)
+
+    print(f"baseline:  {baseline['meta'].get('commit')}  ({baseline['meta'].get('createdAt')})")
+    print(f"candidate: {candidate['meta'].get('commit')}  ({candidate['meta'].get('createdAt')})")
+
+    base_corpus = baseline["meta"].get("corpus", {})
+    for name, entry in candidate["meta"].get("corpus", {}).items():
+        if name in base_corpus and base_corpus[name]["sha256"] != entry["sha256"]:
+            print(f"warning: corpus document {name!r} differs between runs")
+
+    base_results = {(r["document"], r["extractor"]): r for r in baseline["results"]}
+    regressions = []
+    print(f"\n{'document':15s} {'extractor':18s} {'wall':>12s} {'delta':>8s} {'peak RSS':>8s} {'payload':>8s}")
+    for result in candidate["results"]:
+        key = (result["document"], result["extractor"])
+        old = base_results.get(key)
+        if old is None or "error" in old or "error" in result:
+            status = result.get("error") or (old or {}).get("error") or "new"
+            print(f"{key[0]:15s} {key[1]:18s} {status}")
+            continue
+        wall = result["wallSeconds"]["median"]
+        wall_delta = _pct(old["wallSeconds"]["median"], wall)
+        print(
+            f"{key[0]:15s} {key[1]:18s} {wall * 1000:9.1f} ms {_fmt_pct(wall_delta)} "
+            f"{_fmt_pct(_pct(old.get('peakRssBytes'), result.get('peakRssBytes')))} "
+            f"{_fmt_pct(_pct(old.get('payloadBytes'), result.get('payloadBytes')))}"
+        )
+        if wall_delta is not None and wall_delta > args.threshold:
+            regressions.append((key, wall_delta))
+
+    if regressions:
+        print(f"\n{len(regressions)} regression(s) over {args.threshold:g}%:")
+        for (document, extractor), delta in regressions:
+            print(f"  {document} / {extractor}: {delta:+.1f}%")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
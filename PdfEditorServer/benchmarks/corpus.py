@@ -0,0 +1,283 @@
+"""
+Deterministic synthetic PDF corpus for the extraction benchmarks.
+
+Every document is generated with PyMuPDF from a fixed random seed and saved
+without a new /ID, so the same scale produces byte-identical files and runs
+on different commits measure the same input. The SHA-256 of each file is
+recorded next to the results.
+
+Usage:
+    python -m benchmarks.corpus --out bench-corpus [--scale 0.1]
+"""
+import argparse
+import base64
+import hashlib
+import json
+import os
+import random
+from typing import Callable, Dict, List
+
+SEED = 20240601
+FIXED_DATE = "(D:20240601000000)"
+
+LOREM = (
+    "lorem ipsum dolor sit amet consectetur adipiscing elit sed do eiusmod tempor "
+    "incididunt ut labore et dolore magna aliqua ut enim ad minim veniam quis nostrud "
+    "exercitation ullamco laboris nisi ut aliquip ex ea commodo consequat"
+).split()
+
+FONTS = ("helv", "tiro", "cour", "hebo")
+
+
+def _scaled(n: int, scale: float) -> int:
+    return max(1, int(round(n * scale)))
+
+
+def _save(doc, path: str) -> None:
+    doc.set_metadata({})
+    # Embedded files are stamped with the current time; pin it
+    for xref in range(1, doc.xref_length()):
+        if doc.xref_get_key(xref, "Type") == ("name", "/EmbeddedFile"):
+            doc.xref_set_key(xref, "Params/CreationDate", FIXED_DATE)
+            doc.xref_set_key(xref, "Params/ModDate", FIXED_DATE)
+    doc.save(path, garbage=3, deflate=True, no_new_id=True)
+    doc.close()
+
+
+def _png(rng: random.Random, width: int, height: int) -> bytes:
+    import fitz  # PyMuPDF
+
+    pix = fitz.Pixmap(fitz.csRGB, fitz.IRect(0, 0, width, height), False)
+    pix.clear_with(rng.randrange(256))
+    # A few solid blocks so images differ and do not compress to nothing
+    for _ in range(6):
+        x0, y0 = rng.randrange(width), rng.randrange(height)
+        x1, y1 = min(width, x0 + rng.randrange(1, width)), min(height, y0 + rng.randrange(1, height))
+        pix.set_rect(fitz.IRect(x0, y0, x1, y1), (rng.randrange(256), rng.randrange(256), rng.randrange(256)))
+    return pix.tobytes("png")
+
+
+def _sentence(rng: random.Random, words: int) -> str:
+    return " ".join(rng.choice(LOREM) for _ in range(words))
+
+
+def build_text_heavy(path: str, rng: random.Random, scale: float) -> None:
+    """Dense body text in several fonts, sizes and colours."""
+    import fitz  # PyMuPDF
+
+    doc = fitz.open()
+    for _ in range(_scaled(20, scale)):
+        page = doc.new_page()
+        y = 40.0
+        while y < page.rect.height - 40:
+            size = rng.choice((8, 9, 10, 11, 12, 14))
+            page.insert_text(
+                (40, y), _sentence(rng, 14),
+                fontname=rng.choice(FONTS), fontsize=size,
+                color=(rng.random() * 0.5, rng.random() * 0.5, rng.random() * 0.5),
+            )
+            y += size * 1.4
+    _save(doc, path)
+
+
+def build_cad_vectors(path: str, rng: random.Random, scale: float) -> None:
+    """CAD-like pages with tens of thousands of short stroked paths and small fills."""
+    import fitz  # PyMuPDF
+
+    doc = fitz.open()
+    for _ in range(2):
+        page = doc.new_page(width=1191, height=842)  # A3 landscape
+        shape = page.new_shape()
+        for i in range(_scaled(20_000, scale)):
+            x, y = rng.uniform(20, 1170), rng.uniform(20, 820)
+            if i % 10 == 0:
+                shape.draw_rect(fitz.Rect(x, y, x + rng.uniform(2, 20), y + rng.uniform(2, 20)))
+                shape.finish(color=(0, 0, 0), fill=(rng.random(), rng.random(), rng.random()), width=0.3)
+            else:
+                shape.draw_line((x, y), (x + rng.uniform(-15, 15), y + rng.uniform(-15, 15)))
+                shape.finish(color=(0, 0, rng.random()), width=rng.choice((0.25, 0.5, 1.0)))
+        shape.commit()
+    _save(doc, path)
+
+
+def build_image_heavy(path: str, rng: random.Random, scale: float) -> None:
+    """Pages tiled with distinct raster images."""
+    import fitz  # PyMuPDF
+
+    doc = fitz.open()
+    for _ in range(_scaled(10, scale)):
+        page = doc.new_page()
+        for row in range(4):
+            for col in range(3):
+                rect = fitz.Rect(30 + col * 180, 40 + row * 195, 200 + col * 180, 225 + row * 195)
+                page.insert_image(rect, stream=_png(rng, 160, 160))
+    _save(doc, path)
+
+
+def build_repeated_logo(path: str, rng: random.Random, scale: float) -> None:
+    """Letterhead-style pages that all place the same logo several times."""
+    import fitz  # PyMuPDF
+
+    logo = _png(rng, 96, 96)
+    doc = fitz.open()
+    for _ in range(_scaled(50, scale)):
+        page = doc.new_page()
+        for rect in ((40, 30, 100, 90), (495, 30, 555, 90), (40, 760, 80, 800), (515, 760, 555, 800)):
+            page.insert_image(fitz.Rect(*rect), stream=logo)
+        page.insert_text((120, 70), _sentence(rng, 6), fontsize=16)
+        page.insert_text((40, 140), _sentence(rng, 12), fontsize=10)
+    _save(doc, path)
+
+
+def build_manifest(path: str, rng: random.Random, scale: float) -> None:
+    """PDF carrying an embedded manifest.json like the editor's own exports."""
+    import fitz  # PyMuPDF
+
+    page_count = _scaled(10, scale)
+    images = [base64.b64encode(_png(rng, 64, 64)).decode("ascii") for _ in range(3)]
+    pages = []
+    for _ in range(page_count):
+        pages.append({
+            "texts": [
+                {"text": _sentence(rng, 5), "xNorm": rng.random(), "yNormTop": rng.random(),
+                 "fontSize": 12, "color": "#333333", "id": f"t{rng.randrange(10**6)}"}
+                for _ in range(30)
+            ],
+            "images": [
+                {"xNorm": 0.1, "yNormTop": 0.1, "widthNorm": 0.2, "heightNorm": 0.2,
+                 "name": f"img{i}.png", "data": images[i]}
+                for i in range(len(images))
+            ],
+            "shapes": [
+                {"type": "rectangle", "xNorm": rng.random(), "yNormTop": rng.random(),
+                 "widthNorm": 0.1, "heightNorm": 0.1, "strokeColor": "#000000", "strokeWidth": 1}
+                for _ in range(10)
+            ],
+        })
+    doc = fitz.open()
+    for _ in range(page_count):
+        doc.new_page()
+    doc.embfile_add("manifest.json", json.dumps({"pages": pages}, sort_keys=True).encode("utf-8"))
+    _save(doc, path)
+
+
+def build_manifest_v2(path: str, rng: random.Random, scale: float) -> None:
+    """Manifest v2: the images are separate embedded files referenced by SHA-256."""
+    import fitz  # PyMuPDF
+
+    page_count = _scaled(10, scale)
+    images = [_png(rng, 64, 64) for _ in range(3)]
+    assets = {
+        hashlib.sha256(data).hexdigest(): {"file": f"assets/img{i}.png", "mime": "image/png"}
+        for i, data in enumerate(images)
+    }
+    pages = []
+    for _ in range(page_count):
+        pages.append({
+            "texts": [
+                {"text": _sentence(rng, 5), "xNorm": rng.random(), "yNormTop": rng.random(),
+                 "fontSize": 12, "color": "#333333", "id": f"t{rng.randrange(10**6)}"}
+                for _ in range(30)
+            ],
+            "images": [
+                {"xNorm": 0.1, "yNormTop": 0.1, "widthNorm": 0.2, "heightNorm": 0.2,
+                 "name": f"img{i}.png", "asset": asset_id}
+                for i, asset_id in enumerate(assets)
+            ],
+        })
+    doc = fitz.open()
+    for _ in range(page_count):
+        doc.new_page()
+    for data, spec in zip(images, assets.values()):
+        doc.embfile_add(spec["file"], data)
+    manifest = {"version": 2, "assets": assets, "pages": pages}
+    doc.embfile_add("manifest.json", json.dumps(manifest, sort_keys=True).encode("utf-8"))
+    _save(doc, path)
+
+
+def build_ruled_form(path: str, rng: random.Random, scale: float) -> None:
+    """Ruled forms: tables drawn as one-segment strokes, with banded row fills and cell text."""
+    import fitz  # PyMuPDF
+
+    doc = fitz.open()
+    for _ in range(_scaled(10, scale)):
+        page = doc.new_page()
+        for top in (60.0, 440.0):
+            rows, cols = 18, 6
+            x0, x1, row_h = 40.0, 555.0, 19.0
+            col_w = (x1 - x0) / cols
+            for r in range(rows):
+                y = top + r * row_h
+                if r % 2:
+                    page.draw_rect(fitz.Rect(x0, y, x1, y + row_h), color=None, fill=(0.93, 0.93, 0.93))
+                for c in range(cols):
+                    page.insert_text((x0 + c * col_w + 3, y + 13), _sentence(rng, 2), fontsize=8)
+            # Every rule segment is its own path, as form generators emit them
+            for r in range(rows + 1):
+                y = top + r * row_h
+                for c in range(cols):
+                    page.draw_line((x0 + c * col_w, y), (x0 + (c + 1) * col_w, y), color=(0, 0, 0), width=0.5)
+            for c in range(cols + 1):
+                x = x0 + c * col_w
+                for r in range(rows):
+                    page.draw_line((x, top + r * row_h), (x, top + (r + 1) * row_h), color=(0, 0, 0), width=0.5)
+    _save(doc, path)
+
+
+def build_long(path: str, rng: random.Random, scale: float) -> None:
+    """A 1,000-page document with light content on every page."""
+    import fitz  # PyMuPDF
+
+    doc = fitz.open()
+    for i in range(_scaled(1000, scale)):
+        page = doc.new_page()
+        page.insert_text((40, 60), f"Page {i + 1}", fontsize=14)
+        page.insert_text((40, 90), _sentence(rng, 10), fontsize=10)
+        page.draw_line((40, 100), (555, 100), color=(0.5, 0.5, 0.5), width=0.5)
+    _save(doc, path)
+
+
+DOCUMENTS: Dict[str, Callable[[str, random.Random, float], None]] = {
+    "text_heavy": build_text_heavy,
+    "cad_vectors": build_cad_vectors,
+    "image_heavy": build_image_heavy,
+    "repeated_logo": build_repeated_logo,
+    "manifest": build_manifest,
+    "manifest_v2": build_manifest_v2,
+    "ruled_form": build_ruled_form,
+    "long_1000": build_long,
+}
+
+
+def build_corpus(out_dir: str, scale: float = 1.0, only: List[str] = None) -> Dict[str, dict]:
+    """
+    Generate the corpus into out_dir (reusing files that already exist) and
+    return {name: {"path", "sha256", "bytes"}}.
+    """
+    os.makedirs(out_dir, exist_ok=True)
+    corpus = {}
+    for name, build in DOCUMENTS.items():
+        if only and name not in only:
+            continue
+        path = os.path.abspath(os.path.join(out_dir, f"{name}@{scale:g}.pdf"))
+        if not os.path.exists(path):
+            # Seed per document so subsets and reorderings stay reproducible
+            build(path, random.Random(f"{SEED}:{name}"), scale)
+        with open(path, "rb") as f:
+            data = f.read()
+        corpus[name] = {"path": path, "sha256": hashlib.sha256(data).hexdigest(), "bytes": len(data)}
+    return corpus
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--out", default="bench-corpus", help="output directory")
+    parser.add_argument("--scale", type=float, default=1.0, help="size multiplier (pages, drawings)")
+    parser.add_argument("--only", nargs="*", choices=sorted(DOCUMENTS), help="subset of documents")
+    args = parser.parse_args()
+    for name, entry in build_corpus(args.out, args.scale, args.only).items():
+        print(f"{name:15s} {entry['bytes']:>12,d}  {entry['sha256'][:16]}  {entry['path']}")
+
+
+if __name__ == "__main__":
+    main()
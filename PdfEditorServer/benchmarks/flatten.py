@@ -0,0 +1,125 @@
+"""
+Manifest flatten benchmark: the page-by-page generator in app.py against the
+whole-document version it replaced (benchmarks/legacy_flatten.py).
+
+    python -m benchmarks.flatten [--pages 2000] [--repeat 5]
+
+Run from the PdfEditorServer directory. The manifest is synthetic and
+seeded, with every element type on every page. The legacy path is measured
+the way the route used it (one list for the whole document, then one sort);
+the generator is consumed page by page as the records pipeline does. Outputs
+are checked for equality before anything is timed.
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+from typing import Callable, List
+
+from benchmarks.corpus import LOREM, SEED
+
+APP_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def build_manifest(pages: int, rng: random.Random) -> dict:
+    """A large editor-style manifest; some entries leave zIndex null or missing."""
+    def z_index():
+        return rng.choice((None, rng.randrange(-200, 200), rng.randrange(-200, 200)))
+
+    def words(n):
+        return " ".join(rng.choice(LOREM) for _ in range(n))
+
+    manifest_pages = []
+    for _ in range(pages):
+        manifest_pages.append({
+            "texts": [
+                {"text": words(5), "xNorm": rng.random(), "yNormTop": rng.random(), "fontSize": 12,
+                 "fontFamily": "Lato", "color": "#333333", "id": f"t{rng.randrange(10 ** 6)}",
+                 "zIndex": z_index(), "visible": True}
+                for _ in range(60)
+            ],
+            "images": [
+                {"xNorm": 0.1, "yNormTop": 0.1, "widthNorm": 0.2, "heightNorm": 0.2, "name": f"img{i}.png",
+                 "asset": f"{i:064x}", "pixelWidth": 64, "pixelHeight": 64, "zIndex": z_index()}
+                for i in range(4)
+            ],
+            "shapes": [
+                {"type": rng.choice(("rectangle", "line", "freehand")), "xNorm": rng.random(),
+                 "yNormTop": rng.random(), "widthNorm": 0.1, "heightNorm": 0.1, "strokeColor": "#000000",
+                 "strokeWidth": 1, "fillColor": rng.choice(("transparent", "#ff0000")),
+                 "points": [[0, 0], [1, 1]], "zIndex": z_index()}
+                for _ in range(20)
+            ],
+            "formFields": [
+                {"type": "textInput", "fieldName": f"f{i}", "xNorm": 0.5, "yNormTop": i / 10, "widthNorm": 0.3,
+                 "heightNorm": 0.05, "label": "Label", "fontSize": 12, "borderWidth": 1, "zIndex": z_index()}
+                for i in range(5)
+            ],
+            "annotations": [
+                {"type": "highlight", "id": f"a{i}", "color": "#FFFF00", "opacity": 0.4, "zIndex": z_index(),
+                 "spans": [{"xNorm": 0.1, "yNormTop": 0.2, "widthNorm": 0.3, "heightNorm": 0.02,
+                            "text": words(2), "fontSize": 12}]}
+                for i in range(5)
+            ],
+        })
+    return {"pages": manifest_pages}
+
+
+def _timed(fn: Callable[[], int], repeat: int) -> dict:
+    walls: List[float] = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        walls.append(time.perf_counter() - start)
+    tracemalloc.start()
+    fn()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {"median": statistics.median(walls), "min": min(walls), "peak": peak}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pages", type=int, default=2000, help="manifest pages")
+    parser.add_argument("--repeat", type=int, default=5, help="timed runs per implementation")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory(prefix="pdfeditor-bench-") as workdir:
+        os.chdir(workdir)  # app.py creates its storage directories on import
+        sys.path.insert(0, APP_DIR)
+        import app
+        from benchmarks import legacy_flatten
+
+        manifest = build_manifest(args.pages, random.Random(f"{SEED}:flatten"))
+
+        def legacy():
+            items = legacy_flatten.flatten_manifest_to_payload(manifest)
+            items.sort(key=lambda it: (int(it.get("index", 0)), int(it.get("zOrder", 0))))
+            return len(items)
+
+        def paged():
+            count = 0
+            for _ in app.flatten_manifest_to_payload(manifest):
+                count += 1
+            return count
+
+        expected = legacy_flatten.flatten_manifest_to_payload(manifest)
+        expected.sort(key=lambda it: (int(it.get("index", 0)), int(it.get("zOrder", 0))))
+        if list(app.flatten_manifest_to_payload(manifest)) != expected:
+            sys.exit("paged output differs from the legacy flatten")
+        print(f"{args.pages} pages, {len(expected):,d} items, outputs identical")
+
+        results = {"legacy": _timed(legacy, args.repeat), "paged": _timed(paged, args.repeat)}
+        for name, r in results.items():
+            print(f"{name:8s} median {r['median'] * 1000:9.1f} ms  min {r['min'] * 1000:9.1f} ms  "
+                  f"peak {r['peak'] / 2 ** 20:7.1f} MiB")
+        # Best runs: shared machines make the median noisy
+        print(f"paged is {results['legacy']['min'] / results['paged']['min']:.2f}x the legacy speed (best runs)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,419 @@
+"""
+The manifest flatten as it was before app.py yielded it page by page (one
+list for the whole document, sorted by the caller), kept only as the
+baseline for benchmarks/flatten.py. Do not use it from the app.
+"""
+from typing import List
+
+from app import _ensure_data_uri_from_ref_or_data
+
+
+def flatten_manifest_to_payload(manifest):
+    """
+    Convert embedded manifest into the flat list your frontend consumes.
+    (No clamping of normalized coords.)
+    """
+    if not isinstance(manifest, dict):
+        return None
+    pages = manifest.get("pages")
+    if not isinstance(pages, list):
+        return None
+
+    out = []
+    for i, page in enumerate(pages):
+        out.extend(_flatten_manifest_page(page, i))
+    return out
+
+def _flatten_manifest_page(page: dict, i: int) -> List[dict]:
+    """Flatten one manifest page (page index i) into payload items."""
+    out = []
+    # TEXT
+    text_span_counter = 0
+    for t in (page.get("texts") or []):
+        x_norm = t.get("xNorm")
+        y_norm_top = t.get("yNormTop")
+        if x_norm is None or y_norm_top is None:
+            continue
+        text_content = t.get("text", "")
+        font_size = float(t.get("fontSize")) if t.get("fontSize") is not None else None
+
+        z_index = t.get("zIndex", 10)
+        item = {
+            "text": text_content,
+            "xNorm": float(x_norm),
+            "yNormTop": float(y_norm_top),
+            "fontSize": font_size,
+            "index": i,
+            "anchor": "top",
+            # Use zIndex from manifest for proper layer ordering
+            "zOrder": int(z_index) if z_index is not None else (2_000_000 + len(out)),
+            "zIndex": int(z_index) if z_index is not None else 10,
+        }
+        if "boxPadding" in t and t["boxPadding"] is not None:
+            try:
+                item["boxPadding"] = float(t["boxPadding"])
+            except Exception:
+                pass
+        if "fontFamily" in t and t["fontFamily"]:
+            item["fontFamily"] = str(t["fontFamily"])
+        # Include color if available (preserve original text color)
+        if "color" in t and t["color"]:
+            item["color"] = str(t["color"])
+        # Include text item ID for annotation linking if available
+        if "id" in t and t["id"]:
+            item["id"] = str(t["id"])
+        # Layer properties
+        if "visible" in t:
+            item["visible"] = bool(t["visible"])
+        if "locked" in t:
+            item["locked"] = bool(t["locked"])
+        if "name" in t and t["name"]:
+            item["name"] = str(t["name"])
+        out.append(item)
+
+    # TEXT SPANS - prefer pre-computed textSpans from manifest if available
+    # Otherwise generate from texts array
+    manifest_text_spans = page.get("textSpans") or []
+    if manifest_text_spans:
+        # Use pre-computed textSpans from manifest (accurate measurements from client)
+        for ts in manifest_text_spans:
+            x_norm = ts.get("xNorm")
+            y_norm_top = ts.get("yNormTop")
+            if x_norm is None or y_norm_top is None:
+                continue
+
+            text_span_item = {
+                "type": "textSpan",
+                "text": ts.get("text", ""),
+                "xNorm": float(x_norm),
+                "yNormTop": float(y_norm_top),
+                "widthNorm": float(ts.get("widthNorm", 0)),
+                "heightNorm": float(ts.get("heightNorm", 0)),
+                "fontSize": float(ts.get("fontSize")) if ts.get("fontSize") is not None else None,
+                "index": i,
+                "zOrder": 2_500_000 + text_span_counter,
+            }
+
+            # Include font metrics if available
+            if ts.get("ascentRatio") is not None:
+                text_span_item["ascentRatio"] = float(ts["ascentRatio"])
+            if ts.get("descentRatio") is not None:
+                text_span_item["descentRatio"] = float(ts["descentRatio"])
+
+            out.append(text_span_item)
+            text_span_counter += 1
+    else:
+        # Fallback: generate textSpans from texts array
+        for t in (page.get("texts") or []):
+            x_norm = t.get("xNorm")
+            y_norm_top = t.get("yNormTop")
+            if x_norm is None or y_norm_top is None:
+                continue
+            text_content = t.get("text", "")
+            font_size = float(t.get("fontSize")) if t.get("fontSize") is not None else None
+
+            # Only generate textSpan if we have text content and font size
+            if text_content and font_size:
+                # Try to get accurate dimensions from manifest
+                width_norm = t.get("widthNorm")
+                height_norm = t.get("heightNorm")
+                ascent_ratio = t.get("ascentRatio")  # baseline position from top
+                descent_ratio = t.get("descentRatio")
+
+                # Fall back to estimates if not available
+                if width_norm is None:
+                    # Rough character width estimate (0.5 * fontSize for average char)
+                    # Assume A4 page width of 595 points (standard PDF)
+                    char_width_estimate = font_size * 0.5
+                    text_width_points = len(text_content) * char_width_estimate
+                    width_norm = text_width_points / 595.0
+                if height_norm is None:
+                    # Estimate: textHeight ≈ fontSize (ascent + descent)
+                    # A4 height is 842 points
+                    height_norm = font_size / 842.0
+
+                text_span_item = {
+                    "type": "textSpan",
+                    "text": text_content,
+                    "xNorm": float(x_norm),
+                    "yNormTop": float(y_norm_top),
+                    "widthNorm": float(width_norm),
+                    "heightNorm": float(height_norm),
+                    "fontSize": font_size,
+                    "index": i,
+                    "zOrder": 2_500_000 + text_span_counter,
+                }
+
+                # Include font metrics if available for accurate annotation positioning
+                if ascent_ratio is not None:
+                    text_span_item["ascentRatio"] = float(ascent_ratio)
+                if descent_ratio is not None:
+                    text_span_item["descentRatio"] = float(descent_ratio)
+
+                out.append(text_span_item)
+                text_span_counter += 1
+
+    # IMAGES
+    for im in (page.get("images") or []):
+        try:
+            x_norm = float(im["xNorm"])
+            y_norm_top = float(im["yNormTop"])
+            width_norm = float(im["widthNorm"])
+            height_norm = float(im["heightNorm"])
+        except Exception:
+            continue
+
+        z_index = im.get("zIndex", -100)
+        img_item = {
+            "type": "image",
+            "xNorm": x_norm,
+            "yNormTop": y_norm_top,
+            "widthNorm": width_norm,
+            "heightNorm": height_norm,
+            "index": i,
+            # Use zIndex from manifest for proper layer ordering
+            "zOrder": int(z_index) if z_index is not None else (1_000_000 + len(out)),
+            "zIndex": int(z_index) if z_index is not None else -100,
+        }
+
+        if "name" in im:
+            img_item["name"] = im.get("name")
+        # Layer properties
+        if "visible" in im:
+            img_item["visible"] = bool(im["visible"])
+        if "locked" in im:
+            img_item["locked"] = bool(im["locked"])
+        if "pixelWidth" in im:
+            try:
+                img_item["pixelWidth"] = int(im["pixelWidth"]) if im["pixelWidth"] is not None else None
+            except Exception:
+                img_item["pixelWidth"] = None
+        if "pixelHeight" in im:
+            try:
+                img_item["pixelHeight"] = int(im["pixelHeight"]) if im["pixelHeight"] is not None else None
+            except Exception:
+                img_item["pixelHeight"] = None
+
+        if isinstance(im.get("asset"), str):
+            # Manifest v2: bytes live in a separate embedded file, resolved
+            # by _resolve_manifest_assets without any base64 round trip
+            img_item["asset"] = im["asset"]
+        else:
+            data_uri = _ensure_data_uri_from_ref_or_data(im)
+            if data_uri:
+                img_item["ref"] = data_uri
+            else:
+                if "ref" in im:
+                    img_item["ref"] = im.get("ref")
+
+        out.append(img_item)
+
+    # SHAPES (rectangle, circle, line, arrow, triangle, diamond, freehand)
+    shape_counter = 0
+    for shape in (page.get("shapes") or []):
+        shape_type = shape.get("type")
+        if not shape_type:
+            continue
+
+        try:
+            x_norm = float(shape.get("xNorm", 0))
+            y_norm_top = float(shape.get("yNormTop", 0))
+            width_norm = float(shape.get("widthNorm", 0))
+            height_norm = float(shape.get("heightNorm", 0))
+        except Exception:
+            continue
+
+        z_index = shape.get("zIndex", 0)
+        shape_item = {
+            "type": "shape",
+            "shapeType": str(shape_type),
+            "xNorm": x_norm,
+            "yNormTop": y_norm_top,
+            "widthNorm": width_norm,
+            "heightNorm": height_norm,
+            "index": i,
+            # Use zIndex from manifest for proper layer ordering
+            "zOrder": int(z_index) if z_index is not None else (500_000 + shape_counter),
+            "zIndex": int(z_index) if z_index is not None else 0,
+        }
+
+        # Include stroke properties
+        if shape.get("strokeColor"):
+            shape_item["strokeColor"] = str(shape["strokeColor"])
+        if shape.get("strokeWidth") is not None:
+            try:
+                shape_item["strokeWidth"] = float(shape["strokeWidth"])
+            except Exception:
+                pass
+
+        # Include fill color if available
+        if shape.get("fillColor") and shape["fillColor"] != "transparent":
+            shape_item["fillColor"] = str(shape["fillColor"])
+
+        # Layer properties
+        if "visible" in shape:
+            shape_item["visible"] = bool(shape["visible"])
+        if "locked" in shape:
+            shape_item["locked"] = bool(shape["locked"])
+        if "name" in shape and shape["name"]:
+            shape_item["name"] = str(shape["name"])
+
+        # Include freehand points if available
+        if shape_type == "freehand" and shape.get("points"):
+            shape_item["points"] = shape["points"]
+
+        out.append(shape_item)
+        shape_counter += 1
+
+    # FORM FIELDS (textInput, textarea, checkbox, radio, dropdown)
+    form_field_counter = 0
+    for field in (page.get("formFields") or []):
+        field_type = field.get("type")
+        if not field_type:
+            continue
+
+        try:
+            x_norm = float(field.get("xNorm", 0))
+            y_norm_top = float(field.get("yNormTop", 0))
+            width_norm = float(field.get("widthNorm", 0))
+            height_norm = float(field.get("heightNorm", 0))
+        except Exception:
+            continue
+
+        z_index = field.get("zIndex", 100)
+        form_field_item = {
+            "type": "formField",
+            "fieldType": str(field_type),
+            "fieldName": str(field.get("fieldName", f"field_{form_field_counter}")),
+            "xNorm": x_norm,
+            "yNormTop": y_norm_top,
+            "widthNorm": width_norm,
+            "heightNorm": height_norm,
+            "index": i,
+            # Use zIndex from manifest for proper layer ordering
+            "zOrder": int(z_index) if z_index is not None else (4_000_000 + form_field_counter),
+            "zIndex": int(z_index) if z_index is not None else 100,
+        }
+
+        # Include optional properties
+        if field.get("label"):
+            form_field_item["label"] = str(field["label"])
+        if field.get("placeholder"):
+            form_field_item["placeholder"] = str(field["placeholder"])
+        if field.get("defaultValue"):
+            form_field_item["defaultValue"] = str(field["defaultValue"])
+        if field.get("required"):
+            form_field_item["required"] = bool(field["required"])
+
+        # Radio/dropdown options
+        if field.get("options") and isinstance(field["options"], list):
+            form_field_item["options"] = field["options"]
+        if field.get("groupName"):
+            form_field_item["groupName"] = str(field["groupName"])
+
+        # Styling properties
+        if field.get("fontSize") is not None:
+            try:
+                form_field_item["fontSize"] = float(field["fontSize"])
+            except Exception:
+                form_field_item["fontSize"] = 14
+        if field.get("fontFamily"):
+            form_field_item["fontFamily"] = str(field["fontFamily"])
+        if field.get("textColor"):
+            form_field_item["textColor"] = str(field["textColor"])
+        if field.get("backgroundColor"):
+            form_field_item["backgroundColor"] = str(field["backgroundColor"])
+        if field.get("borderColor"):
+            form_field_item["borderColor"] = str(field["borderColor"])
+        if field.get("borderWidth") is not None:
+            try:
+                form_field_item["borderWidth"] = float(field["borderWidth"])
+            except Exception:
+                pass
+
+        # Layer properties
+        if "visible" in field:
+            form_field_item["visible"] = bool(field["visible"])
+        if "locked" in field:
+            form_field_item["locked"] = bool(field["locked"])
+        if "name" in field and field["name"]:
+            form_field_item["name"] = str(field["name"])
+
+        out.append(form_field_item)
+        form_field_counter += 1
+
+    # ANNOTATIONS (highlight, strikethrough, underline)
+    annotation_counter = 0
+    for ann in (page.get("annotations") or []):
+        ann_id = ann.get("id")
+        ann_type = ann.get("type")
+        if not ann_type:
+            continue
+
+        spans = ann.get("spans") or []
+        if not spans:
+            continue
+
+        # Build span objects with all necessary fields for linked annotations
+        span_items = []
+        for s in spans:
+            span_item = {
+                "xNorm": float(s.get("xNorm", 0)),
+                "yNormTop": float(s.get("yNormTop", 0)),
+                "widthNorm": float(s.get("widthNorm", 0)),
+                "heightNorm": float(s.get("heightNorm", 0)),
+            }
+            # Include text and fontSize for accurate visual rendering
+            if s.get("text"):
+                span_item["text"] = str(s["text"])
+            if s.get("fontSize") is not None:
+                span_item["fontSize"] = float(s["fontSize"])
+            # Include relative offsets for linked annotations
+            if s.get("relativeXNorm") is not None:
+                span_item["relativeXNorm"] = float(s["relativeXNorm"])
+            if s.get("relativeYNorm") is not None:
+                span_item["relativeYNorm"] = float(s["relativeYNorm"])
+            # Include font metrics if available
+            if s.get("ascentRatio") is not None:
+                span_item["ascentRatio"] = float(s["ascentRatio"])
+            if s.get("descentRatio") is not None:
+                span_item["descentRatio"] = float(s["descentRatio"])
+            span_items.append(span_item)
+
+        z_index = ann.get("zIndex", -50)
+        annotation_item = {
+            "type": "annotation",
+            "annotationType": str(ann_type),
+            "spans": span_items,
+            "color": str(ann.get("color", "#FFFF00")),
+            "opacity": float(ann.get("opacity", 0.4)),
+            "index": i,
+            # Use zIndex from manifest for proper layer ordering
+            "zOrder": int(z_index) if z_index is not None else (3_000_000 + annotation_counter),
+            "zIndex": int(z_index) if z_index is not None else -50,
+        }
+
+        # Include annotation ID
+        if ann_id:
+            annotation_item["id"] = str(ann_id)
+
+        # Include linked text item ID for annotations linked to text items
+        if ann.get("linkedTextItemId"):
+            annotation_item["linkedTextItemId"] = str(ann["linkedTextItemId"])
+
+        # Include annotated text for reference
+        if ann.get("annotatedText"):
+            annotation_item["annotatedText"] = str(ann["annotatedText"])
+
+        # Layer properties
+        if "visible" in ann:
+            annotation_item["visible"] = bool(ann["visible"])
+        if "locked" in ann:
+            annotation_item["locked"] = bool(ann["locked"])
+        if "name" in ann and ann["name"]:
+            annotation_item["name"] = str(ann["name"])
+
+        out.append(annotation_item)
+        annotation_counter += 1
+
+    return out
@@ -0,0 +1,42 @@
+"""
+The all-pairs rectangle merge as it was before spatial_index.py replaced it,
+kept only as the baseline for benchmarks/rects.py. Do not use it from the app.
+"""
+from typing import List, Tuple
+
+
+def _rects_overlap(a: Tuple[float, float, float, float],
+                   b: Tuple[float, float, float, float],
+                   pad: float = 1.0) -> bool:
+    ax0, ay0, ax1, ay1 = a
+    bx0, by0, bx1, by1 = b
+    return not (ax1 + pad < bx0 or bx1 + pad < ax0 or ay1 + pad < by0 or by1 + pad < ay0)
+
+def _merge_two(a, b):
+    ax0, ay0, ax1, ay1 = a
+    bx0, by0, bx1, by1 = b
+    return (min(ax0, bx0), min(ay0, by0), max(ax1, bx1), max(ay1, by1))
+
+def _merge_overlapping_rects(rects: List[Tuple[float, float, float, float]], pad: float = 1.0) -> List[Tuple[float, float, float, float]]:
+    rects = [tuple(map(float, r)) for r in rects]
+    changed = True
+    while changed and len(rects) > 1:
+        changed = False
+        merged = []
+        used = [False] * len(rects)
+        for i in range(len(rects)):
+            if used[i]:
+                continue
+            r = rects[i]
+            for j in range(i + 1, len(rects)):
+                if used[j]:
+                    continue
+                s = rects[j]
+                if _rects_overlap(r, s, pad=pad):
+                    r = _merge_two(r, s)
+                    used[j] = True
+                    changed = True
+            used[i] = True
+            merged.append(r)
+        rects = merged
+    return rects
@@ -0,0 +1,103 @@
+"""
+Rectangle merge benchmark: merge_overlapping_rects from spatial_index.py
+against the all-pairs version it replaced (benchmarks/legacy_rects.py).
+
+    python -m benchmarks.rects [--rects 10000] [--repeat 3]
+
+Run from the PdfEditorServer directory. Each layout is synthetic and seeded
+on an A3 page: "glyphs" are character boxes in text lines that merge into
+word boxes, "scatter" are small, mostly isolated boxes, and "clusters"
+are drawings whose boxes chain into a few large regions. Outputs are
+checked for equality before anything is timed.
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import time
+from typing import Callable, Dict, List, Tuple
+
+from benchmarks.corpus import SEED
+
+APP_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+PAGE_W, PAGE_H = 1191.0, 842.0  # A3 landscape, as in corpus.cad_vectors
+
+Rect = Tuple[float, float, float, float]
+
+
+def _glyphs(n: int, rng: random.Random) -> List[Rect]:
+    rects = []
+    line, x = 0, 20.0
+    while len(rects) < n:
+        w = rng.uniform(3, 6)
+        if x + w > PAGE_W - 20:
+            line, x = line + 1, 20.0
+        y = 20.0 + line * 11.0
+        rects.append((x, y, x + w, y + 9.0))
+        # Characters touch within a word; every few a word gap
+        x += w + (rng.uniform(2.5, 5.0) if rng.random() < 0.2 else rng.uniform(0.0, 0.5))
+    return rects
+
+
+def _scatter(n: int, rng: random.Random) -> List[Rect]:
+    rects = []
+    for _ in range(n):
+        x, y = rng.uniform(0, PAGE_W - 4), rng.uniform(0, PAGE_H - 4)
+        rects.append((x, y, x + rng.uniform(0.5, 3), y + rng.uniform(0.5, 3)))
+    return rects
+
+
+def _clusters(n: int, rng: random.Random) -> List[Rect]:
+    centres = [(rng.uniform(100, PAGE_W - 100), rng.uniform(100, PAGE_H - 100)) for _ in range(12)]
+    rects = []
+    for _ in range(n):
+        cx, cy = rng.choice(centres)
+        x, y = rng.gauss(cx, 40), rng.gauss(cy, 40)
+        rects.append((x, y, x + rng.uniform(1, 12), y + rng.uniform(1, 12)))
+    return rects
+
+
+LAYOUTS: Dict[str, Callable[[int, random.Random], List[Rect]]] = {
+    "glyphs": _glyphs,
+    "scatter": _scatter,
+    "clusters": _clusters,
+}
+
+
+def _best(fn: Callable[[], object], repeat: int) -> Tuple[float, float]:
+    walls: List[float] = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        walls.append(time.perf_counter() - start)
+    return min(walls), statistics.median(walls)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rects", type=int, default=10_000, help="rectangles per layout")
+    parser.add_argument("--repeat", type=int, default=3, help="timed runs per implementation")
+    parser.add_argument("--layouts", nargs="*", choices=sorted(LAYOUTS), help="subset of layouts")
+    args = parser.parse_args()
+
+    sys.path.insert(0, APP_DIR)
+    import spatial_index
+    from benchmarks import legacy_rects
+
+    for name in args.layouts or list(LAYOUTS):
+        rects = LAYOUTS[name](args.rects, random.Random(f"{SEED}:rects:{name}"))
+        expected = legacy_rects._merge_overlapping_rects(rects)
+        if spatial_index.merge_overlapping_rects(rects) != expected:
+            sys.exit(f"{name}: merge_overlapping_rects differs from the legacy merge")
+
+        legacy_min, legacy_median = _best(lambda: legacy_rects._merge_overlapping_rects(rects), args.repeat)
+        grid_min, grid_median = _best(lambda: spatial_index.merge_overlapping_rects(rects), args.repeat)
+        print(f"{name:9s} {len(rects):,d} -> {len(expected):,d} rects  "
+              f"legacy {legacy_median * 1000:10.1f} ms  grid {grid_median * 1000:8.1f} ms  "
+              f"{legacy_min / grid_min:7.1f}x (best runs)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,226 @@
+"""
+Extraction benchmark runner.
+
+Generates (or reuses) the synthetic corpus from benchmarks/corpus.py, runs
+every extractor over every document and writes machine-readable results:
+
+    python -m benchmarks.run --out results.json [--scale 0.1] [--repeat 3]
+    python -m benchmarks.compare baseline.json results.json
+
+Run from the PdfEditorServer directory. Each (document, extractor) pair runs
+in a fresh spawned process, so peak RSS is attributable to that extraction
+alone. Per run it records wall time, the StageTimer stage breakdown, and the
+size of the JSON payload (raw and gzip). Untimed warm-up runs go first so
+lazy imports and process pool start-up are not measured.
+"""
+import argparse
+import gzip
+import json
+import multiprocessing
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Callable, Dict, List, Optional
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+from benchmarks.corpus import DOCUMENTS, build_corpus
+
+APP_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+DEFAULT_OPTIONS = {"assets": "inline", "pages": None}
+
+
+def _peak_rss_bytes(who: int) -> Optional[int]:
+    if resource is None:
+        return None
+    peak = resource.getrusage(who).ru_maxrss
+    # ru_maxrss is KiB on Linux, bytes on macOS
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+# ---------- extractors (run inside the measurement process) ----------
+
+def _run_pipeline(app, path: str, parallel: bool, schema: int = 1, vectors: str = "items"):
+    """The /upload-pdf path: records pipeline, collected into one payload."""
+    app.EXTRACT_PROCESS_WORKERS = (os.cpu_count() or 1) if parallel else 1
+    options = dict(DEFAULT_OPTIONS)
+    if schema == 2:
+        options.update(schema=2, precision=app.SCHEMA_V2_PRECISION)
+    if vectors != "items":
+        options["vectors"] = vectors
+    timer = app.StageTimer()
+    body = app._collect_records(app._iter_extraction_records(path, options, None, timer))
+    return body, timer
+
+
+def _body_items(body: dict) -> List[dict]:
+    if "items" in body:
+        return body["items"]
+    return [item for page in body["pages"] for item in page["items"]]
+
+
+def _run_unified(app, path: str, order: str = "stream"):
+    """The content-stream ordered extractor (no stage breakdown)."""
+    items, page_dimensions = app._extract_unified_content_stream(path, order=order)
+    return {"items": items, "pageDimensions": page_dimensions}, app.StageTimer()
+
+
+EXTRACTORS: Dict[str, Callable] = {
+    "pipeline": lambda app, path: _run_pipeline(app, path, parallel=False),
+    "pipeline-parallel": lambda app, path: _run_pipeline(app, path, parallel=True),
+    "pipeline-schema2": lambda app, path: _run_pipeline(app, path, parallel=False, schema=2),
+    "pipeline-layers": lambda app, path: _run_pipeline(app, path, parallel=False, vectors="layers"),
+    "unified": _run_unified,
+    "unified-paint": lambda app, path: _run_unified(app, path, order="paint"),
+}
+
+
+def _measure(workdir: str, extractor: str, path: str, repeats: int, warmup: int, results) -> None:
+    """Measurement process entry point; puts one result dict on the queue."""
+    os.chdir(workdir)  # app.py creates its storage directories on import
+    sys.path.insert(0, APP_DIR)
+    import app
+
+    import_rss = _peak_rss_bytes(resource.RUSAGE_SELF) if resource else None
+    for _ in range(warmup):
+        EXTRACTORS[extractor](app, path)
+
+    walls: List[float] = []
+    stage_runs: List[dict] = []
+    body = None
+    timer = None
+    for _ in range(repeats):
+        start = time.perf_counter()
+        body, timer = EXTRACTORS[extractor](app, path)
+        with timer.stage("serialize"):
+            raw = app.app.json.dumps(body).encode("utf-8")
+        with timer.stage("compress"):
+            compressed = gzip.compress(raw, compresslevel=app.RESULT_CACHE_GZIP_LEVEL, mtime=0)
+        walls.append(time.perf_counter() - start)
+        stage_runs.append(dict(timer.stages))
+
+    counts: Dict[str, int] = {}
+    items = _body_items(body)
+    for item in items:
+        kind = item.get("type") or ("text" if "text" in item else "image")
+        counts[kind] = counts.get(kind, 0) + 1
+
+    stages = sorted({name for run in stage_runs for name in run})
+    app._reset_process_pool()
+    results.put({
+        "wallSeconds": {
+            "min": min(walls),
+            "median": statistics.median(walls),
+            "max": max(walls),
+        },
+        "stagesSeconds": {name: statistics.median(run.get(name, 0.0) for run in stage_runs) for name in stages},
+        "importRssBytes": import_rss,
+        "peakRssBytes": _peak_rss_bytes(resource.RUSAGE_SELF) if resource else None,
+        "childrenPeakRssBytes": _peak_rss_bytes(resource.RUSAGE_CHILDREN) if resource else None,
+        "payloadBytes": len(raw),
+        "gzipBytes": len(compressed),
+        "items": len(items),
+        "itemsByType": counts,
+        "pagesExtracted": len(timer.page_seconds),
+        "extractedBy": timer.extractor,
+        "extractorVersion": app.EXTRACTOR_VERSION,
+    })
+
+
+def _run_one(workdir: str, extractor: str, path: str, repeats: int, warmup: int, timeout: float) -> dict:
+    ctx = multiprocessing.get_context("spawn")
+    results = ctx.Queue()
+    proc = ctx.Process(target=_measure, args=(workdir, extractor, path, repeats, warmup, results))
+    proc.start()
+    try:
+        return results.get(timeout=timeout)
+    except Exception as e:
+        return {"error": f"{type(e).__name__}: {e}" if str(e) else f"no result (exit code {proc.exitcode})"}
+    finally:
+        proc.join(5)
+        if proc.is_alive():
+            proc.terminate()
+
+
+def _git_revision() -> Optional[str]:
+    try:
+        rev = subprocess.run(["git", "rev-parse", "HEAD"], cwd=APP_DIR, capture_output=True,
+                             text=True, check=True).stdout.strip()
+        dirty = subprocess.run(["git", "status", "--porcelain", "--untracked-files=no"], cwd=APP_DIR,
+                               capture_output=True, text=True, check=True).stdout.strip()
+        return rev + ("-dirty" if dirty else "")
+    except Exception:
+        return None
+
+
+def _environment() -> dict:
+    import fitz  # PyMuPDF
+
+    return {
+        "commit": _git_revision(),
+        "python": platform.python_version(),
+        "pymupdf": getattr(fitz, "VersionBind", None),
+        "platform": platform.platform(),
+        "cpuCount": os.cpu_count(),
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--out", default="benchmark-results.json", help="results file (JSON)")
+    parser.add_argument("--corpus", default="bench-corpus", help="corpus directory (generated if missing)")
+    parser.add_argument("--scale", type=float, default=1.0, help="corpus size multiplier")
+    parser.add_argument("--repeat", type=int, default=3, help="timed runs per document and extractor")
+    parser.add_argument("--warmup", type=int, default=1, help="untimed runs before the timed ones")
+    parser.add_argument("--timeout", type=float, default=900, help="seconds per document and extractor")
+    parser.add_argument("--documents", nargs="*", choices=sorted(DOCUMENTS), help="subset of documents")
+    parser.add_argument("--extractors", nargs="*", choices=sorted(EXTRACTORS), help="subset of extractors")
+    args = parser.parse_args()
+
+    corpus = build_corpus(args.corpus, args.scale, args.documents)
+    extractors = args.extractors or list(EXTRACTORS)
+    results = []
+    with tempfile.TemporaryDirectory(prefix="pdfeditor-bench-") as workdir:
+        for document, entry in corpus.items():
+            for extractor in extractors:
+                measured = _run_one(workdir, extractor, entry["path"], args.repeat, args.warmup, args.timeout)
+                results.append({"document": document, "extractor": extractor, **measured})
+                if "error" in measured:
+                    print(f"{document:15s} {extractor:18s} ERROR {measured['error']}")
+                    continue
+                rss = measured["peakRssBytes"]
+                print(
+                    f"{document:15s} {extractor:18s} "
+                    f"median {measured['wallSeconds']['median'] * 1000:9.1f} ms  "
+                    f"payload {measured['payloadBytes']:>12,d} B  "
+                    f"peak RSS {rss / 2 ** 20 if rss else 0:7.1f} MiB"
+                )
+
+    versions = {r["extractorVersion"] for r in results if "extractorVersion" in r}
+    report = {
+        "meta": {
+            **_environment(),
+            "extractorVersion": versions.pop() if len(versions) == 1 else sorted(versions),
+            "scale": args.scale,
+            "repeat": args.repeat,
+            "warmup": args.warmup,
+            "createdAt": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+            "corpus": {name: {"sha256": e["sha256"], "bytes": e["bytes"]} for name, e in corpus.items()},
+        },
+        "results": results,
+    }
+    with open(args.out, "w") as f:
+        json.dump(report, f, indent=2, sort_keys=True)
+    print(f"Wrote {args.out}")
+
+
+if __name__ == "__main__":
+    main()
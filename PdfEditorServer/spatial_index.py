@@ -0,0 +1,263 @@
+# spatial_index.py
+"""
+Spatial index over page coordinates, shared by the extractors.
+
+Rectangles are (x0, y0, x1, y1) tuples in PDF points. GridIndex buckets
+them into a uniform grid so overlap, containment and nearest-neighbour
+queries only look at nearby cells, and UnionFind groups them (e.g. into
+overlapping clusters) in near-constant time per union. On a page the grid
+beats an R-tree in plain Python: rectangles are small relative to the page
+and there are no deep trees to rebalance.
+"""
+import itertools
+import math
+from typing import Callable, Dict, Hashable, Iterable, List, Optional, Set, Tuple
+
+Rect = Tuple[float, float, float, float]
+
+# A single rectangle is indexed in at most about this many cells per axis
+# when merge_overlapping_rects picks the cell size
+GRID_MAX_CELLS_PER_AXIS = 128
+
+
+# ---------- rectangle helpers ----------
+
+def rects_overlap(a: Rect, b: Rect, pad: float = 0.0) -> bool:
+    """True if a and b overlap or touch once grown by pad (edges count)."""
+    return not (a[2] + pad < b[0] or b[2] + pad < a[0] or a[3] + pad < b[1] or b[3] + pad < a[1])
+
+
+def rect_contains(outer: Rect, inner: Rect) -> bool:
+    return outer[0] <= inner[0] and outer[1] <= inner[1] and outer[2] >= inner[2] and outer[3] >= inner[3]
+
+
+def rect_union(a: Rect, b: Rect) -> Rect:
+    return (min(a[0], b[0]), min(a[1], b[1]), max(a[2], b[2]), max(a[3], b[3]))
+
+
+def rect_distance(a: Rect, b: Rect) -> float:
+    """Euclidean gap between a and b; 0.0 if they overlap or touch."""
+    dx = max(0.0, b[0] - a[2], a[0] - b[2])
+    dy = max(0.0, b[1] - a[3], a[1] - b[3])
+    return math.hypot(dx, dy)
+
+
+def rect_manhattan_distance(a: Rect, b: Rect) -> float:
+    """Gap between a and b summed over both axes; 0.0 if they overlap or touch."""
+    return max(0.0, b[0] - a[2], a[0] - b[2]) + max(0.0, b[1] - a[3], a[1] - b[3])
+
+
+# ---------- union-find ----------
+
+class UnionFind:
+    """Disjoint sets over the keys 0..n-1 (path halving, union by size)."""
+
+    def __init__(self, n: int):
+        self.parent = list(range(n))
+        self.size = [1] * n
+
+    def find(self, key: int) -> int:
+        parent = self.parent
+        while parent[key] != key:
+            parent[key] = parent[parent[key]]
+            key = parent[key]
+        return key
+
+    def union(self, a: int, b: int) -> int:
+        """Join the sets of a and b; returns the root of the joined set."""
+        a, b = self.find(a), self.find(b)
+        if a == b:
+            return a
+        if self.size[a] < self.size[b]:
+            a, b = b, a
+        self.parent[b] = a
+        self.size[a] += self.size[b]
+        return a
+
+    def groups(self) -> List[List[int]]:
+        """The sets as lists of keys, ordered by their smallest key."""
+        by_root: Dict[int, List[int]] = {}
+        for key in range(len(self.parent)):
+            by_root.setdefault(self.find(key), []).append(key)
+        return list(by_root.values())
+
+
+# ---------- uniform grid ----------
+
+class GridIndex:
+    """
+    Uniform grid of cell_size points. Each rectangle is stored in every cell
+    it covers, so pick a cell size around the typical rectangle size: much
+    smaller multiplies the cells per rectangle, much larger makes every query
+    scan crowded cells.
+    """
+
+    def __init__(self, cell_size: float):
+        if not cell_size > 0:
+            raise ValueError("cell_size must be positive")
+        self.cell_size = float(cell_size)
+        self.cells: Dict[Tuple[int, int], List[Hashable]] = {}
+        self.rects: Dict[Hashable, Rect] = {}
+        self._bounds: Optional[List[int]] = None  # [cx0, cy0, cx1, cy1] of occupied cells
+
+    def __len__(self) -> int:
+        return len(self.rects)
+
+    def _span(self, rect: Rect, pad: float = 0.0) -> Tuple[int, int, int, int]:
+        cell = self.cell_size
+        return (int(math.floor((rect[0] - pad) / cell)), int(math.floor((rect[1] - pad) / cell)),
+                int(math.floor((rect[2] + pad) / cell)), int(math.floor((rect[3] + pad) / cell)))
+
+    def insert(self, key: Hashable, rect: Rect) -> None:
+        rect = (float(rect[0]), float(rect[1]), float(rect[2]), float(rect[3]))
+        if key in self.rects:
+            self.remove(key)
+        self.rects[key] = rect
+        cx0, cy0, cx1, cy1 = self._span(rect)
+        for cx in range(cx0, cx1 + 1):
+            for cy in range(cy0, cy1 + 1):
+                self.cells.setdefault((cx, cy), []).append(key)
+        if self._bounds is None:
+            self._bounds = [cx0, cy0, cx1, cy1]
+        else:
+            b = self._bounds
+            b[0], b[1], b[2], b[3] = min(b[0], cx0), min(b[1], cy0), max(b[2], cx1), max(b[3], cy1)
+
+    def remove(self, key: Hashable) -> None:
+        rect = self.rects.pop(key)
+        cx0, cy0, cx1, cy1 = self._span(rect)
+        for cx in range(cx0, cx1 + 1):
+            for cy in range(cy0, cy1 + 1):
+                bucket = self.cells[(cx, cy)]
+                bucket.remove(key)
+                if not bucket:
+                    del self.cells[(cx, cy)]
+
+    def candidates(self, rect: Rect, pad: float = 0.0) -> Set[Hashable]:
+        """Keys sharing a cell with rect grown by pad (a superset of the overlaps)."""
+        cx0, cy0, cx1, cy1 = self._span(rect, pad)
+        cells = self.cells
+        found: Set[Hashable] = set()
+        for cx in range(cx0, cx1 + 1):
+            for cy in range(cy0, cy1 + 1):
+                bucket = cells.get((cx, cy))
+                if bucket:
+                    found.update(bucket)
+        return found
+
+    def overlapping(self, rect: Rect, pad: float = 0.0) -> List[Hashable]:
+        """Keys whose rectangles overlap or touch rect grown by pad."""
+        rects = self.rects
+        return [key for key in self.candidates(rect, pad) if rects_overlap(rects[key], rect, pad)]
+
+    def containing(self, rect: Rect) -> List[Hashable]:
+        """Keys whose rectangles contain rect."""
+        rects = self.rects
+        return [key for key in self.candidates(rect) if rect_contains(rects[key], rect)]
+
+    def contained_in(self, rect: Rect) -> List[Hashable]:
+        """Keys whose rectangles lie inside rect."""
+        rects = self.rects
+        return [key for key in self.candidates(rect) if rect_contains(rect, rects[key])]
+
+    def nearest(self, rect: Rect, max_distance: float = math.inf,
+                exclude: Iterable[Hashable] = (),
+                distance: Callable[[Rect, Rect], float] = rect_distance) -> Optional[Tuple[Hashable, float]]:
+        """
+        (key, distance) of the rectangle closest to rect, or None if nothing
+        lies within max_distance; ties go to the lowest key, so keys must be
+        comparable.
+        distance defaults to rect_distance and may be any measure that is
+        never less than the larger per-axis gap (e.g. rect_manhattan_distance).
+        Searches rings of cells outwards and stops once a ring cannot hold
+        anything closer, or scans every key once that is cheaper.
+        """
+        if self._bounds is None:
+            return None
+        rects, cells, cell = self.rects, self.cells, self.cell_size
+        cx0, cy0, cx1, cy1 = self._span(rect)
+        bx0, by0, bx1, by1 = self._bounds
+        # Rings short of or beyond the occupied cells hold nothing
+        first_ring = max(bx0 - cx1, cx0 - bx1, by0 - cy1, cy0 - by1, 0)
+        last_ring = max(bx1 - cx0, cx1 - bx0, by1 - cy0, cy1 - by0, 0)
+        # Past this many cells, scanning every key is cheaper than more rings
+        budget = len(rects)
+        best: Optional[Hashable] = None
+        best_distance = max_distance
+        seen: Set[Hashable] = set(exclude)
+        for ring in range(first_ring, last_ring + 1):
+            # Anything first met in this ring is at least (ring - 1) cells away
+            if (ring - 1) * cell > best_distance:
+                break
+            x0, y0, x1, y1 = cx0 - ring, cy0 - ring, cx1 + ring, cy1 + ring
+            # The ring's rows and columns, clipped to the occupied cells
+            columns = range(max(x0, bx0), min(x1, bx1) + 1)
+            if ring == 0:
+                rows = range(max(y0, by0), min(y1, by1) + 1)
+                budget -= len(columns) * len(rows)
+                ring_cells = itertools.product(columns, rows)
+            else:
+                rows = range(max(y0 + 1, by0), min(y1 - 1, by1) + 1)
+                top = columns if y0 >= by0 else ()
+                bottom = columns if y1 <= by1 else ()
+                left = rows if x0 >= bx0 else ()
+                right = rows if x1 <= bx1 else ()
+                budget -= len(top) + len(bottom) + len(left) + len(right)
+                ring_cells = itertools.chain(((cx, y0) for cx in top), ((cx, y1) for cx in bottom),
+                                             ((x0, cy) for cy in left), ((x1, cy) for cy in right))
+            scan = budget < 0
+            keys = rects if scan else (key for c in ring_cells for key in cells.get(c, ()))
+            for key in keys:
+                if key in seen:
+                    continue
+                seen.add(key)
+                d = distance(rects[key], rect)
+                if best is None:
+                    if d <= best_distance:
+                        best, best_distance = key, d
+                elif d < best_distance or (d == best_distance and key < best):
+                    best, best_distance = key, d
+            if scan:
+                break
+        return None if best is None else (best, best_distance)
+
+
+# ---------- overlap merge ----------
+
+def _grid_cell_size(rects: List[Rect], pad: float) -> float:
+    """Mean rectangle size, bounded so no rectangle spans too many cells."""
+    extent = max(max(r[2] for r in rects) - min(r[0] for r in rects),
+                 max(r[3] for r in rects) - min(r[1] for r in rects))
+    mean = sum(max(r[2] - r[0], r[3] - r[1]) for r in rects) / len(rects)
+    return max(mean, extent / GRID_MAX_CELLS_PER_AXIS, pad, 1e-6)
+
+
+def merge_overlapping_rects(rects: Iterable[Rect], pad: float = 1.0) -> List[Rect]:
+    """
+    Merge rectangles that overlap (or come within pad of each other) into
+    their bounding boxes until no two results overlap, since a merged box
+    can reach rectangles none of its members did. Results are ordered by
+    their first input rectangle.
+
+    Each round indexes the boxes in a GridIndex and joins overlapping ones
+    with UnionFind, so a round is near-linear instead of all-pairs.
+    """
+    rects = [(float(r[0]), float(r[1]), float(r[2]), float(r[3])) for r in rects]
+    while len(rects) > 1:
+        index = GridIndex(_grid_cell_size(rects, pad))
+        sets = UnionFind(len(rects))
+        for i, rect in enumerate(rects):
+            for j in index.overlapping(rect, pad):
+                sets.union(i, j)
+            index.insert(i, rect)
+        groups = sets.groups()
+        if len(groups) == len(rects):
+            break
+        merged = []
+        for group in groups:
+            box = rects[group[0]]
+            for j in group[1:]:
+                box = rect_union(box, rects[j])
+            merged.append(box)
+        rects = merged
+    return rects
@@ -0,0 +1,47 @@
+import io
+import json
+import os
+import sys
+
+import pytest
+
+APP_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+@pytest.fixture(scope="session")
+def app_module(tmp_path_factory):
+    """app.py, imported inside a scratch directory (it creates its storage directories on import)."""
+    os.chdir(tmp_path_factory.mktemp("server"))
+    sys.path.insert(0, APP_DIR)
+    import app
+
+    app.EXTRACT_PROCESS_WORKERS = 1
+    return app
+
+
+@pytest.fixture
+def client(app_module):
+    return app_module.app.test_client()
+
+
+def make_pdf(pages: int = 1, lines=("Hello world",), manifest=None) -> bytes:
+    """
+    A small PDF whose pages each carry the given text lines, top to bottom,
+    in that order, with manifest (if given) embedded as manifest.json.
+    """
+    import fitz  # PyMuPDF
+
+    doc = fitz.open()
+    for _ in range(pages):
+        page = doc.new_page()
+        for i, line in enumerate(lines):
+            page.insert_text((72, 100 + 40 * i), line, fontsize=14)
+    if manifest is not None:
+        doc.embfile_add("manifest.json", json.dumps(manifest).encode("utf-8"))
+    data = doc.tobytes()
+    doc.close()
+    return data
+
+
+def upload(client, url: str, data: bytes):
+    return client.post(url, data={"pdf": (io.BytesIO(data), "test.pdf")}, content_type="multipart/form-data")
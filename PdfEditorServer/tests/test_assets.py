@@ -0,0 +1,48 @@
+import hashlib
+import os
+
+from tests.conftest import upload
+
+
+def _logo_pdf() -> bytes:
+    """Two pages showing the same image."""
+    import fitz  # PyMuPDF
+
+    pix = fitz.Pixmap(fitz.csRGB, fitz.IRect(0, 0, 12, 12), False)
+    pix.clear_with(150)
+    logo = pix.tobytes("png")
+    doc = fitz.open()
+    for _ in range(2):
+        doc.new_page().insert_image(fitz.Rect(72, 72, 144, 144), stream=logo)
+    data = doc.tobytes()
+    doc.close()
+    return data
+
+
+def test_url_assets_are_served_by_content_hash(client):
+    items = upload(client, "/upload-pdf?assets=url", _logo_pdf()).get_json()["items"]
+    assert len(items) == 2 and items[0]["url"] == items[1]["url"]
+    assert "data" not in items[0]
+
+    resp = client.get(items[0]["url"])
+    assert resp.status_code == 200
+    assert resp.mimetype == "image/png"
+    assert hashlib.sha256(resp.get_data()).hexdigest() == items[0]["asset"]
+    assert resp.cache_control.immutable
+
+    cached = client.get(items[0]["url"], headers={"If-None-Match": f'"{items[0]["asset"]}"'})
+    assert cached.status_code == 304
+    assert client.get(f"/assets/{'0' * 64}").status_code == 404
+
+
+def test_asset_store_dedupes_and_evicts_least_recently_used(app_module, tmp_path):
+    store = app_module.AssetStore(str(tmp_path), max_disk_bytes=250)
+    first = store.put(b"a" * 100, "image/png")
+    assert store.put(b"a" * 100, "image/png") == first
+    assert os.listdir(tmp_path) == [f"{first}.png"]
+
+    second = store.put(b"b" * 100, "image/svg+xml")
+    os.utime(tmp_path / f"{first}.png", (1, 1))
+    store.put(b"c" * 100, "image/jpeg")
+    assert store.get(first) is None
+    assert store.get(second) == (str(tmp_path / f"{second}.svg"), "image/svg+xml")
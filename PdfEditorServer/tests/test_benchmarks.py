@@ -0,0 +1,31 @@
+import json
+import sys
+
+import pytest
+
+from benchmarks import compare, corpus
+
+
+def test_corpus_is_byte_identical_across_builds(tmp_path):
+    first = corpus.build_corpus(str(tmp_path / "a"), scale=0.02)
+    second = corpus.build_corpus(str(tmp_path / "b"), scale=0.02)
+    assert set(first) == set(corpus.DOCUMENTS)
+    assert {name: e["sha256"] for name, e in first.items()} == {name: e["sha256"] for name, e in second.items()}
+
+
+def _results(path, wall: float) -> str:
+    result = {"document": "text_heavy", "extractor": "pymupdf", "wallSeconds": {"median": wall}}
+    path.write_text(json.dumps({"meta": {"corpus": {}}, "results": [result]}))
+    return str(path)
+
+
+def test_compare_fails_on_wall_time_regression(tmp_path, monkeypatch):
+    baseline = _results(tmp_path / "base.json", 1.0)
+
+    monkeypatch.setattr(sys, "argv", ["compare", baseline, _results(tmp_path / "ok.json", 1.05)])
+    compare.main()
+
+    monkeypatch.setattr(sys, "argv", ["compare", baseline, _results(tmp_path / "slow.json", 1.2)])
+    with pytest.raises(SystemExit) as exc:
+        compare.main()
+    assert exc.value.code == 1
@@ -0,0 +1,17 @@
+from tests.conftest import make_pdf, upload
+
+
+def test_identical_upload_is_a_cache_hit(client):
+    data = make_pdf(lines=("Cached once",))
+    first = upload(client, "/upload-pdf", data)
+    second = upload(client, "/upload-pdf", data)
+    assert first.headers["X-Cache"] == "MISS"
+    assert second.headers["X-Cache"] == "HIT"
+    assert second.get_json() == first.get_json()
+
+
+def test_options_are_part_of_the_cache_key(client):
+    data = make_pdf(lines=("Cached per option",))
+    assert upload(client, "/upload-pdf", data).headers["X-Cache"] == "MISS"
+    assert upload(client, "/upload-pdf?assets=table", data).headers["X-Cache"] == "MISS"
+    assert upload(client, "/upload-pdf?assets=table", data).headers["X-Cache"] == "HIT"
@@ -0,0 +1,91 @@
+import io
+import json
+import math
+import struct
+from array import array
+
+import pytest
+
+from tests.conftest import make_pdf, upload
+
+_TYPECODES = {"f32": "f", "i32": "i", "str": "I", "u32": "I", "u8": "B"}
+
+
+def _decode(doc: dict, read) -> list:
+    """Items of a columnar/msgpack document; read(ref) returns a buffer's bytes."""
+    def column(ref: dict) -> array:
+        return array(_TYPECODES[ref["type"]], read(ref))
+
+    data = bytes(column(doc["strings"]["data"]))
+    strings, start = [], 0
+    for end in column(doc["strings"]["offsets"]):
+        strings.append(data[start:end].decode("utf-8"))
+        start = end
+
+    items = []
+    for page in doc["pages"]:
+        columns = {key: (ref["type"], column(ref)) for key, ref in page["columns"].items()}
+        for i in range(page["count"]):
+            item = {"index": page["index"]}
+            for key, (kind, values) in columns.items():
+                value = values[i]
+                if kind == "str" and value != 0xFFFFFFFF:
+                    item[key] = strings[value]
+                elif kind == "i32" and value != -2 ** 31:
+                    item[key] = value
+                elif kind == "f32" and not math.isnan(value):
+                    item[key] = value
+            item.update((page.get("extra") or [None] * page["count"])[i] or {})
+            items.append(item)
+    return items
+
+
+def _decode_columnar(blob: bytes) -> list:
+    assert blob[:4] == b"PDFC"
+    version, meta_length = struct.unpack_from("<II", blob, 4)
+    assert version == 1
+    base = 12 + meta_length
+    assert base % 8 == 0
+    doc = json.loads(blob[12:base])
+    return _decode(doc, lambda ref: blob[base + ref["offset"]:base + ref["offset"] + ref["length"]])
+
+
+def _decode_msgpack(blob: bytes) -> list:
+    import msgpack
+
+    return _decode(msgpack.unpackb(blob, raw=False), lambda ref: ref["data"])
+
+
+def _as_float32(items: list) -> list:
+    return [{k: array("f", [v])[0] if isinstance(v, float) else v for k, v in item.items()} for item in items]
+
+
+def _pdf() -> bytes:
+    """Text plus a vector, so columns hold strings, numbers and nested values."""
+    import fitz  # PyMuPDF
+
+    doc = fitz.open(stream=make_pdf(pages=2, lines=("Columnar", "round trip")))
+    doc[1].draw_rect(fitz.Rect(200, 200, 300, 260), color=(0, 0, 0), fill=(1, 0, 0))
+    data = doc.tobytes()
+    doc.close()
+    return data
+
+
+@pytest.mark.parametrize("fmt", ["columnar", "msgpack"])
+def test_binary_payload_round_trips(client, app_module, fmt):
+    if fmt not in app_module._available_formats():
+        pytest.skip(f"{fmt} is not available")
+    data = _pdf()
+    items = upload(client, "/upload-pdf", data).get_json()["items"]
+
+    resp = upload(client, f"/upload-pdf?format={fmt}", data)
+    assert resp.mimetype == app_module.PAYLOAD_FORMATS[fmt]
+    decoded = (_decode_columnar if fmt == "columnar" else _decode_msgpack)(resp.get_data())
+    assert decoded == _as_float32(items)
+
+
+def test_format_from_accept_header(client):
+    resp = client.post("/upload-pdf", data={"pdf": (io.BytesIO(_pdf()), "test.pdf")},
+                       headers={"Accept": "application/vnd.pdfeditor.columnar"},
+                       content_type="multipart/form-data")
+    assert resp.get_data()[:4] == b"PDFC"
@@ -0,0 +1,48 @@
+import gzip
+import io
+import json
+
+import pytest
+
+from tests.conftest import make_pdf, upload
+
+
+def _decompress(body: bytes, encoding) -> bytes:
+    if encoding is None:
+        return body
+    if encoding == "gzip":
+        return gzip.decompress(body)
+    if encoding == "br":
+        import brotli
+        return brotli.decompress(body)
+    import zstandard
+    return zstandard.ZstdDecompressor().decompressobj().decompress(body)
+
+
+@pytest.mark.parametrize("accept, expected", [
+    (None, None),
+    ("identity", None),
+    ("gzip", "gzip"),
+    ("br", "br"),
+    ("zstd", "zstd"),
+    ("gzip, br;q=0.5", "gzip"),
+    ("br;q=0, *", "zstd"),
+    ("*;q=0", None),
+])
+def test_content_encoding_follows_accept_encoding(client, app_module, accept, expected):
+    if expected not in (None, "gzip") and expected not in app_module._available_encodings():
+        pytest.skip(f"{expected} is not installed")
+    data = make_pdf(lines=("Negotiated",))
+    plain = upload(client, "/upload-pdf", data).get_json()
+
+    headers = {"Accept-Encoding": accept} if accept is not None else {}
+    for stream in ("", "?stream=ndjson"):
+        resp = client.post(f"/upload-pdf{stream}", data={"pdf": (io.BytesIO(data), "test.pdf")},
+                           headers=headers, content_type="multipart/form-data")
+        assert resp.headers.get("Content-Encoding") == expected
+        raw = _decompress(resp.get_data(), expected)
+        if stream:
+            records = [json.loads(line) for line in raw.decode("utf-8").splitlines()]
+            assert [item for r in records if r["type"] == "page" for item in r["items"]] == plain["items"]
+        else:
+            assert json.loads(raw) == plain
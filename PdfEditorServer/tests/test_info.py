@@ -0,0 +1,44 @@
+import hashlib
+
+from tests.conftest import make_pdf, upload
+
+
+def _mixed_size_pdf() -> bytes:
+    """A4 portrait, then a letter page rotated by 90 degrees."""
+    import fitz  # PyMuPDF
+
+    doc = fitz.open()
+    doc.new_page(width=595, height=842)
+    doc.new_page(width=612, height=792).set_rotation(90)
+    data = doc.tobytes()
+    doc.close()
+    return data
+
+
+def test_info_reads_page_geometry_from_the_page_tree(client, app_module):
+    data = _mixed_size_pdf()
+    digest = hashlib.sha256(data).hexdigest()
+    upload(client, "/upload-pdf", data)
+
+    info = client.get(f"/documents/{digest}/info").get_json()
+    assert info["pageCount"] == 2
+    assert info["hasManifest"] is False
+    assert [page["rotation"] for page in info["pages"]] == [0, 90]
+
+    # Sizes are as displayed, the same as extraction reports for loaded pages
+    doc = app_module._open_pdf(data)
+    expected = [app_module._page_dimensions(page) for page in doc]
+    doc.close()
+    assert [{"width": p["width"], "height": p["height"]} for p in info["pages"]] == expected
+    assert expected[1] == {"width": 792.0, "height": 612.0}
+
+
+def test_info_detects_manifest(client):
+    data = make_pdf(manifest={"pages": [{"texts": [{"text": "Hi", "xNorm": 0.1, "yNormTop": 0.1}]}]})
+    upload(client, "/upload-pdf", data)
+    info = client.get(f"/documents/{hashlib.sha256(data).hexdigest()}/info").get_json()
+    assert info["hasManifest"] is True
+
+
+def test_info_of_unknown_document(client):
+    assert client.get(f"/documents/{'0' * 64}/info").status_code == 404
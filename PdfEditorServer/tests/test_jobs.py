@@ -0,0 +1,29 @@
+import time
+
+from tests.conftest import make_pdf, upload
+
+
+def _wait(client, status_url: str) -> dict:
+    deadline = time.time() + 30
+    while True:
+        job = client.get(status_url).get_json()
+        if job["status"] not in ("queued", "running") or time.time() > deadline:
+            return job
+        time.sleep(0.05)
+
+
+def test_job_progress_counts_selected_pages(client):
+    resp = upload(client, "/jobs?pages=2-4", make_pdf(pages=6, lines=("jobs progress",)))
+    assert resp.status_code == 202
+
+    job = _wait(client, resp.get_json()["statusUrl"])
+    assert job["status"] == "done"
+    assert job["pagesDone"] == 3
+    assert job["pagesTotal"] == 3
+
+
+def test_job_progress_without_selection(client):
+    resp = upload(client, "/jobs", make_pdf(pages=4, lines=("all pages",)))
+    job = _wait(client, resp.get_json()["statusUrl"])
+    assert job["status"] == "done"
+    assert job["pagesDone"] == job["pagesTotal"] == 4
@@ -0,0 +1,138 @@
+import base64
+import hashlib
+import json
+
+from tests.conftest import make_pdf, upload
+
+
+def test_manifest_items_replace_extraction(client):
+    manifest = {"pages": [{"texts": [{"text": "From manifest", "xNorm": 0.1, "yNormTop": 0.1}]}]}
+    body = upload(client, "/upload-pdf", make_pdf(manifest=manifest)).get_json()
+    assert [item["text"] for item in body["items"]] == ["From manifest"]
+
+
+def test_manifest_without_items_falls_back_to_pymupdf(client):
+    resp = upload(client, "/upload-pdf", make_pdf(manifest={"pages": [{}]}))
+    assert resp.status_code == 200
+    items = resp.get_json()["items"]
+    assert [item["type"] for item in items] == ["text", "textSpan"]
+    assert items[0]["text"] == "Hello world"
+
+
+FIXTURE_MANIFEST = {
+    "pages": [
+        {
+            "texts": [
+                {"text": "Title", "xNorm": 0.1, "yNormTop": 0.1, "fontSize": 18, "fontFamily": "Lato",
+                 "color": "#333333", "id": "t1", "zIndex": 12, "visible": True, "name": "title"},
+                {"text": "No z", "xNorm": "0.2", "yNormTop": 0.3, "zIndex": None, "boxPadding": "bad"},
+                {"text": "Skipped, no position", "yNormTop": 0.5},
+            ],
+            "images": [
+                {"xNorm": 0.1, "yNormTop": 0.5, "widthNorm": 0.2, "heightNorm": 0.2, "name": "logo",
+                 "asset": "ab" * 32, "pixelWidth": "64", "pixelHeight": "x"},
+                {"xNorm": 0.1, "yNormTop": 0.5, "widthNorm": "wide", "heightNorm": 0.2},
+            ],
+            "shapes": [
+                {"type": "rectangle", "xNorm": 0.4, "fillColor": "transparent", "strokeWidth": "thin"},
+                {"type": "freehand", "points": [[0, 0], [1, 1]], "fillColor": "#ff0000", "zIndex": 3},
+                {"xNorm": 0.1},
+            ],
+            "formFields": [
+                {"type": "checkbox", "xNorm": 0.5, "yNormTop": 0.1, "fontSize": "big", "options": "a,b"},
+                {"type": "dropdown", "fieldName": "choice", "options": ["a", "b"], "required": 1},
+            ],
+            "annotations": [
+                {"type": "highlight", "id": "a1", "linkedTextItemId": "t1", "zIndex": None,
+                 "spans": [{"xNorm": 0.1, "yNormTop": 0.1, "widthNorm": 0.3, "heightNorm": 0.02,
+                            "text": "Title", "fontSize": 18}, {"relativeXNorm": 0.5}]},
+                {"type": "underline", "spans": []},
+            ],
+        },
+        {"textSpans": [{"text": "measured", "xNorm": 0.2, "yNormTop": 0.2, "widthNorm": 0.1}]},
+        {},
+    ]
+}
+
+
+def test_flatten_matches_legacy(app_module):
+    from benchmarks import legacy_flatten
+
+    expected = legacy_flatten.flatten_manifest_to_payload(FIXTURE_MANIFEST)
+    expected.sort(key=lambda it: (int(it.get("index", 0)), int(it.get("zOrder", 0))))
+    assert list(app_module.flatten_manifest_to_payload(FIXTURE_MANIFEST)) == expected
+    assert len(expected) == 10
+
+
+def test_flatten_is_a_page_by_page_generator(app_module, monkeypatch):
+    lazy = app_module.LazyManifest.load(json.dumps(FIXTURE_MANIFEST).encode("utf-8"))
+    flatten = app_module.flatten_manifest_to_payload
+    assert list(flatten(lazy)) == list(flatten(FIXTURE_MANIFEST))
+
+    parsed = []
+    page = app_module.LazyManifest.page
+    monkeypatch.setattr(app_module.LazyManifest, "page", lambda self, i: parsed.append(i) or page(self, i))
+    next(flatten(lazy))
+    assert parsed == [0]
+
+
+def test_lazy_manifest_pages_match_json(app_module):
+    manifest = {"version": 1, "pages": [{"texts": []}, [], {"n": "x\"]}"}], "pageDimensions": {"width": 1}}
+    for text in (json.dumps(manifest), json.dumps(manifest, indent=2)):
+        lazy = app_module.LazyManifest.load(text.encode("utf-8"))
+        assert lazy.page_count == 3
+        assert lazy.get("version") == 1 and lazy.get("pageDimensions") == {"width": 1}
+        assert lazy.get("pages") is None
+        # Pages that are not objects read as empty ones
+        assert [lazy.page(i) for i in range(3)] == [{"texts": []}, {}, {"n": "x\"]}"}]
+
+    assert app_module.LazyManifest.load(b'{"pages": []}').page_count == 0
+    assert app_module.LazyManifest.load(b"{}").page_count == 0
+    for bad in (b"", b"[]", b'{"pages": [1,]}', b'{"pages": [1]'):
+        assert app_module.LazyManifest.load(bad) is None
+
+
+def test_only_selected_manifest_pages_are_parsed(client, app_module, monkeypatch):
+    manifest = {"pages": [{"texts": [{"text": f"Page {i}", "xNorm": 0.1, "yNormTop": 0.1}]} for i in range(3)]}
+    parsed = []
+    page = app_module.LazyManifest.page
+    monkeypatch.setattr(app_module.LazyManifest, "page", lambda self, i: parsed.append(i) or page(self, i))
+
+    body = upload(client, "/upload-pdf?pages=3", make_pdf(pages=3, manifest=manifest)).get_json()
+    assert [item["text"] for item in body["items"]] == ["Page 2"]
+    # Page 0 answers whether the manifest has items at all; page 1 is never parsed
+    assert 1 not in parsed
+
+
+def _manifest_v2_pdf():
+    """(PDF, image bytes, image SHA-256) for a v2 manifest whose image is a separate embedded file."""
+    import fitz  # PyMuPDF
+
+    pix = fitz.Pixmap(fitz.csRGB, fitz.IRect(0, 0, 8, 8), False)
+    pix.clear_with(30)
+    logo = pix.tobytes("png")
+    digest = hashlib.sha256(logo).hexdigest()
+    image = {"xNorm": 0.1, "yNormTop": 0.1, "widthNorm": 0.2, "heightNorm": 0.2, "asset": digest}
+    manifest = {
+        "version": 2,
+        "assets": {digest: {"file": "assets/logo.png", "mime": "image/png"}},
+        "pages": [{"images": [image]}, {"images": [image]}],
+    }
+    doc = fitz.open(stream=make_pdf(pages=2, manifest=manifest))
+    doc.embfile_add("assets/logo.png", logo)
+    data = doc.tobytes()
+    doc.close()
+    return data, logo, digest
+
+
+def test_manifest_v2_images_resolve_from_embedded_files(client):
+    data, logo, digest = _manifest_v2_pdf()
+
+    items = upload(client, "/upload-pdf", data).get_json()["items"]
+    assert [item["type"] for item in items] == ["image", "image"]
+    assert all(item["ref"] == "data:image/png;base64," + base64.b64encode(logo).decode("ascii") for item in items)
+    assert all("asset" not in item for item in items)
+
+    body = upload(client, "/upload-pdf?assets=table", data).get_json()
+    assert [item["asset"] for item in body["items"]] == [digest, digest]
+    assert list(body["assets"]) == [digest]
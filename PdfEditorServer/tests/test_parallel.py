@@ -0,0 +1,33 @@
+def _logo_pdf(pages: int) -> bytes:
+    """Pages with a line of text and the same image, so assets repeat across pages."""
+    import fitz  # PyMuPDF
+
+    pix = fitz.Pixmap(fitz.csRGB, fitz.IRect(0, 0, 16, 16), False)
+    pix.clear_with(200)
+    logo = pix.tobytes("png")
+    doc = fitz.open()
+    for i in range(pages):
+        page = doc.new_page()
+        page.insert_text((72, 100), f"Page {i + 1}", fontsize=14)
+        page.insert_image(fitz.Rect(72, 120, 120, 168), stream=logo)
+    data = doc.tobytes()
+    doc.close()
+    return data
+
+
+def test_parallel_extraction_matches_serial(app_module, monkeypatch):
+    data = _logo_pdf(pages=5)
+    options = {"assets": "table", "pages": None}
+    serial = list(app_module._iter_extraction_records(data, options))
+
+    monkeypatch.setattr(app_module, "EXTRACT_PROCESS_WORKERS", 2)
+    monkeypatch.setattr(app_module, "EXTRACT_PARALLEL_MIN_PAGES", 2)
+    monkeypatch.setattr(app_module, "EXTRACT_PARALLEL_CHUNK_PAGES", 2)
+    try:
+        parallel = list(app_module._iter_extraction_records(data, options))
+    finally:
+        app_module._reset_process_pool()
+
+    assert parallel == serial
+    # The shared image is sent once, with the first page that uses it
+    assert [len(r["assets"]) for r in parallel if r["type"] == "page"] == [1, 0, 0, 0, 0]
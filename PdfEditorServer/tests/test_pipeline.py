@@ -0,0 +1,35 @@
+def _mixed_pdf() -> bytes:
+    """Two pages with text, an image and a filled rectangle each."""
+    import fitz  # PyMuPDF
+
+    pix = fitz.Pixmap(fitz.csRGB, fitz.IRect(0, 0, 16, 16), False)
+    pix.clear_with(90)
+    doc = fitz.open()
+    for i in range(2):
+        page = doc.new_page()
+        page.insert_text((72, 100), f"Page {i + 1}", fontsize=14)
+        page.insert_image(fitz.Rect(72, 120, 120, 168), stream=pix.tobytes("png"))
+        page.draw_rect(fitz.Rect(200, 200, 300, 260), color=(0, 0, 0), fill=(1, 0, 0))
+    data = doc.tobytes()
+    doc.close()
+    return data
+
+
+def test_single_pass_matches_whole_document_extractors(app_module):
+    data = _mixed_pdf()
+    body = app_module._collect_records(app_module._iter_extraction_records(data, {"assets": "inline", "pages": None}))
+
+    items, page_dimensions = app_module._extract_with_pymupdf(data)
+    items += app_module._extract_vectors_with_pymupdf(data)
+    items.sort(key=lambda it: (it["index"], float(it.get("zOrder", 0))))
+    assert body["items"] == items
+    assert body["pageDimensions"] == page_dimensions
+
+
+def test_document_is_opened_once(app_module, monkeypatch):
+    opened = []
+    open_pdf = app_module._open_pdf
+    monkeypatch.setattr(app_module, "_open_pdf", lambda source: opened.append(source) or open_pdf(source))
+    records = app_module._iter_extraction_records(_mixed_pdf(), {"assets": "inline", "pages": None})
+    app_module._collect_records(records)
+    assert len(opened) == 1
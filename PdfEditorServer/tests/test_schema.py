@@ -0,0 +1,44 @@
+import json
+
+from tests.conftest import make_pdf, upload
+
+
+def _expand(body: dict) -> list:
+    """Schema 2 body back to schema 1 items, less zOrder."""
+    items = []
+    for page in body["pages"]:
+        for compact in page["items"]:
+            item = {**body["defaults"], "index": page["index"], **compact}
+            if "style" in item:
+                item.update(page["styles"][item.pop("style")])
+            items.append(item)
+    return items
+
+
+def test_schema_2_expands_to_schema_1(client, app_module):
+    data = make_pdf(pages=2, lines=("Compact", "payload"))
+    v1 = upload(client, "/upload-pdf", data).get_json()
+    v2 = upload(client, "/upload-pdf?schema=2&precision=3", data).get_json()
+
+    assert v2["schema"] == 2 and v2["precision"] == 3
+    assert [page["index"] for page in v2["pages"]] == [0, 1]
+    assert all("index" not in item and "zOrder" not in item for page in v2["pages"] for item in page["items"])
+
+    expected = []
+    for item in v1["items"]:
+        item = {k: app_module._round_v2_value(k, v, 3) for k, v in item.items() if k != "zOrder"}
+        expected.append({**v2["defaults"], **item})
+    assert _expand(v2) == expected
+
+
+def test_schema_2_streams_the_same_pages(client):
+    data = make_pdf(pages=2, lines=("Compact stream",))
+    body = upload(client, "/upload-pdf?schema=2", data).get_json()
+    streamed = upload(client, "/upload-pdf?schema=2&stream=ndjson", data).get_data(as_text=True)
+    records = [json.loads(line) for line in streamed.splitlines()]
+    pages = [{k: v for k, v in r.items() if k != "type"} for r in records if r["type"] == "page"]
+    assert pages == body["pages"]
+
+
+def test_unsupported_schema(client):
+    assert upload(client, "/upload-pdf?schema=3", make_pdf()).status_code == 400
@@ -0,0 +1,65 @@
+import random
+
+import pytest
+
+from benchmarks import legacy_rects
+from benchmarks.rects import LAYOUTS
+from spatial_index import GridIndex, UnionFind, merge_overlapping_rects, rect_distance, rects_overlap
+
+
+def _random_rects(rng: random.Random, n: int, max_size: float) -> list:
+    rects = []
+    for _ in range(n):
+        x, y = rng.uniform(0, 600), rng.uniform(0, 800)
+        rects.append((x, y, x + rng.uniform(0, max_size), y + rng.uniform(0, max_size)))
+    return rects
+
+
+@pytest.mark.parametrize("seed", range(20))
+def test_merge_matches_all_pairs_on_random_rects(seed):
+    rng = random.Random(seed)
+    rects = _random_rects(rng, rng.randrange(1, 300), rng.choice((2.0, 20.0, 120.0)))
+    pad = rng.choice((0.0, 1.0, 5.0))
+    assert merge_overlapping_rects(rects, pad=pad) == legacy_rects._merge_overlapping_rects(rects, pad=pad)
+
+
+@pytest.mark.parametrize("layout", sorted(LAYOUTS))
+def test_merge_matches_all_pairs_on_benchmark_layouts(layout):
+    rects = LAYOUTS[layout](1000, random.Random(layout))
+    assert merge_overlapping_rects(rects) == legacy_rects._merge_overlapping_rects(rects)
+
+
+def test_merge_edge_cases():
+    assert merge_overlapping_rects([]) == []
+    assert merge_overlapping_rects([(1, 2, 3, 4)]) == [(1.0, 2.0, 3.0, 4.0)]
+    # A merged box can reach rectangles none of its members did
+    chain = [(0, 0, 10, 1), (20, 0, 30, 10), (9, 0, 21, 1), (5, 9, 25, 20)]
+    assert merge_overlapping_rects(chain, pad=0) == [(0.0, 0.0, 30.0, 20.0)]
+
+
+def test_grid_queries_match_brute_force():
+    rng = random.Random(7)
+    rects = _random_rects(rng, 400, 30.0)
+    index = GridIndex(15.0)
+    for key, rect in enumerate(rects):
+        index.insert(key, rect)
+    for key in range(0, 400, 3):
+        index.remove(key)
+    live = {key: rect for key, rect in enumerate(rects) if key % 3}
+
+    for query in _random_rects(rng, 100, 50.0):
+        expected = [k for k, r in live.items() if rects_overlap(r, query, 2.0)]
+        assert sorted(index.overlapping(query, 2.0)) == expected
+        key, distance = index.nearest(query)
+        best = min(rect_distance(r, query) for r in live.values())
+        assert distance == best
+        assert key == min(k for k, r in live.items() if rect_distance(r, query) == best)
+
+
+def test_union_find_groups():
+    sets = UnionFind(6)
+    sets.union(4, 1)
+    sets.union(5, 3)
+    sets.union(3, 1)
+    assert sets.groups() == [[0], [1, 3, 4, 5], [2]]
+    assert sets.find(5) == sets.find(4)
@@ -0,0 +1,32 @@
+import json
+
+from tests.conftest import make_pdf, upload
+
+
+def _records(resp) -> list:
+    assert resp.mimetype == "application/x-ndjson"
+    return [json.loads(line) for line in resp.get_data(as_text=True).splitlines()]
+
+
+def test_ndjson_streams_header_pages_end(client):
+    data = make_pdf(pages=3, lines=("Streamed",))
+    records = _records(upload(client, "/upload-pdf?stream=ndjson", data))
+
+    assert [r["type"] for r in records] == ["header", "page", "page", "page", "end"]
+    assert records[0]["pageCount"] == 3
+    assert [r["index"] for r in records[1:-1]] == [0, 1, 2]
+    assert all(item["index"] == r["index"] for r in records[1:-1] for item in r["items"])
+    assert records[-1]["itemCount"] == sum(len(r["items"]) for r in records[1:-1])
+
+
+def test_ndjson_cache_hit_replays_the_same_records(client):
+    data = make_pdf(pages=2, lines=("Streamed twice",))
+    first = upload(client, "/upload-pdf?stream=ndjson", data)
+    first_records = _records(first)
+    second = upload(client, "/upload-pdf?stream=ndjson", data)
+    assert (first.headers["X-Cache"], second.headers["X-Cache"]) == ("MISS", "HIT")
+    assert _records(second) == first_records
+
+    # The streamed result also serves the complete payload
+    body = upload(client, "/upload-pdf", data).get_json()
+    assert body["items"] == [item for r in first_records if r["type"] == "page" for item in r["items"]]
@@ -0,0 +1,54 @@
+from tests.conftest import make_pdf, upload
+
+
+def _texts(items) -> list:
+    return [item["text"] for item in items if item["type"] == "text"]
+
+
+def test_stream_order_keeps_lines_top_to_bottom(app_module):
+    items, _ = app_module._extract_unified_content_stream(make_pdf(lines=("Hello world", "Second line")))
+    assert _texts(items) == ["Hello world", "Second line"]
+
+
+def _covered_text_pdf() -> bytes:
+    """A page whose text is painted first and then covered by a filled rectangle."""
+    import fitz  # PyMuPDF
+
+    doc = fitz.open()
+    page = doc.new_page()
+    page.insert_text((72, 100), "Hello world", fontsize=14)
+    page.draw_rect(fitz.Rect(60, 80, 200, 110), color=None, fill=(0, 0, 1))
+    data = doc.tobytes()
+    doc.close()
+    return data
+
+
+def test_upload_paint_order(client):
+    resp = upload(client, "/upload-pdf?order=paint", _covered_text_pdf())
+    assert resp.status_code == 200
+    items = resp.get_json()["items"]
+    assert [item["type"] for item in items] == ["text", "textSpan", "vector"]
+    assert [item["zOrder"] for item in items] == [0, 1, 2]
+
+
+def test_upload_default_order_puts_vectors_below_text(client):
+    items = upload(client, "/upload-pdf", _covered_text_pdf()).get_json()["items"]
+    assert items[0]["type"] == "vector"
+
+
+def test_paint_order_puts_items_without_seqno_last(app_module, monkeypatch):
+    monkeypatch.setattr(app_module, "_text_paint_seqnos", lambda page: {})
+    items, _ = app_module._extract_unified_content_stream(_covered_text_pdf(), order="paint")
+    assert [item["type"] for item in items] == ["vector", "text", "textSpan"]
+
+
+def test_upload_rejects_unknown_order(client):
+    resp = upload(client, "/upload-pdf?order=random", make_pdf())
+    assert resp.status_code == 400
+
+
+def test_upload_rejects_order_with_vector_options(client):
+    for query in ("order=paint&vectors=layers", "order=stream&coalesce=1"):
+        resp = upload(client, f"/upload-pdf?{query}", make_pdf())
+        assert resp.status_code == 400, query
+    assert upload(client, "/upload-pdf?order=zorder&coalesce=1", make_pdf()).status_code == 200
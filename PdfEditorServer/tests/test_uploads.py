@@ -0,0 +1,38 @@
+import hashlib
+
+from tests.conftest import make_pdf, upload
+
+
+def test_small_upload_survives_a_fresh_store(client, app_module, monkeypatch):
+    data = make_pdf(pages=2)
+    digest = hashlib.sha256(data).hexdigest()
+    assert upload(client, "/upload-pdf", data).status_code == 200
+
+    # Another worker (or a restarted server) shares the directory but not the memory cache
+    store = app_module.upload_store
+    fresh = app_module.UploadStore(
+        store.directory,
+        ttl_seconds=store.ttl_seconds,
+        max_disk_bytes=store.max_disk_bytes,
+        inmemory_max_bytes=store.inmemory_max_bytes,
+        max_memory_bytes=store.max_memory_bytes,
+        sweep_interval_seconds=store.sweep_interval_seconds,
+    )
+    monkeypatch.setattr(app_module, "upload_store", fresh)
+
+    resp = client.get(f"/documents/{digest}/info")
+    assert resp.status_code == 200
+    assert client.get(f"/documents/{digest}/pages/2").status_code == 200
+
+
+def test_memory_eviction_keeps_the_file(app_module, tmp_path):
+    store = app_module.UploadStore(
+        str(tmp_path), ttl_seconds=3600, max_disk_bytes=1 << 30,
+        inmemory_max_bytes=1 << 20, max_memory_bytes=1, sweep_interval_seconds=3600,
+    )
+    first, second = make_pdf(lines=("first",)), make_pdf(lines=("second",))
+    first_digest = hashlib.sha256(first).hexdigest()
+    assert store.put(first_digest, first) == first
+    store.put(hashlib.sha256(second).hexdigest(), second)
+
+    assert store.get(first_digest) == str(tmp_path / f"{first_digest}.pdf")
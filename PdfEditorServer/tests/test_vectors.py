@@ -0,0 +1,86 @@
+from tests.conftest import upload
+
+
+def _grid_pdf(rows: int = 4, cols: int = 3) -> bytes:
+    """A table grid drawn as one-segment strokes, as form generators emit it."""
+    import fitz  # PyMuPDF
+
+    doc = fitz.open()
+    page = doc.new_page()
+    x0, y0, cell = 100.0, 100.0, 40.0
+    for r in range(rows + 1):
+        for c in range(cols):
+            page.draw_line((x0 + c * cell, y0 + r * cell), (x0 + (c + 1) * cell, y0 + r * cell), color=(0, 0, 0))
+    for c in range(cols + 1):
+        for r in range(rows):
+            page.draw_line((x0 + c * cell, y0 + r * cell), (x0 + c * cell, y0 + (r + 1) * cell), color=(0, 0, 0))
+    data = doc.tobytes()
+    doc.close()
+    return data
+
+
+def _vectors(resp) -> list:
+    assert resp.status_code == 200
+    return [item for item in resp.get_json()["items"] if item["type"] == "vector"]
+
+
+def test_layers_carry_every_path(client):
+    data = _grid_pdf()
+    paths = _vectors(upload(client, "/upload-pdf", data))
+    layers = _vectors(upload(client, "/upload-pdf?vectors=layers", data))
+    assert len(paths) == 31 and len(layers) == 1
+
+    # Each path keeps its id and normalized bbox in the layer's "paths" map
+    boxes = [[p["xNorm"], p["yNormTop"], p["widthNorm"], p["heightNorm"]] for p in paths]
+    assert sorted(layers[0]["paths"].values()) == sorted(boxes)
+    assert layers[0]["zOrder"] == paths[0]["zOrder"]
+
+
+def test_layers_split_at_max_paths(client, app_module, monkeypatch):
+    monkeypatch.setattr(app_module, "VECTOR_LAYER_MAX_PATHS", 10)
+    data = _grid_pdf(rows=4, cols=4)
+    paths = _vectors(upload(client, "/upload-pdf", data))
+    layers = _vectors(upload(client, "/upload-pdf?vectors=layers", data))
+
+    assert [len(layer["paths"]) for layer in layers] == [10, 10, 10, 10]
+    assert [layer["zOrder"] for layer in layers] == [paths[i]["zOrder"] for i in range(0, 40, 10)]
+
+
+def _page_paths(app_module, data: bytes) -> tuple:
+    doc = app_module._open_pdf(data)
+    page = doc[0]
+    paths = app_module._vector_paths(page.get_drawings(), page.rect)
+    rect = page.rect
+    doc.close()
+    return paths, rect
+
+
+def test_coalesce_merges_a_grid_without_losing_segments(client, app_module):
+    paths, rect = _page_paths(app_module, _grid_pdf())
+    merged = app_module._coalesce_vector_paths(paths, rect)
+
+    assert len(paths) == 31 and len(merged) == 1
+    assert sorted(merged[0]["d"].split()) == sorted(" ".join(p["d"] for p in paths).split())
+    assert len(_vectors(upload(client, "/upload-pdf?coalesce=1", _grid_pdf()))) == 1
+
+
+def test_coalesce_keeps_paint_order_across_other_styles(app_module):
+    import fitz  # PyMuPDF
+
+    def pdf(between: bool) -> bytes:
+        doc = fitz.open()
+        page = doc.new_page()
+        page.draw_line((100, 100), (200, 100), color=(0, 0, 0))
+        if between:
+            # Painted over the end of the first line and the start of the next
+            page.draw_rect(fitz.Rect(150, 90, 250, 110), color=None, fill=(1, 0, 0))
+        page.draw_line((200, 100), (300, 100), color=(0, 0, 0))
+        data = doc.tobytes()
+        doc.close()
+        return data
+
+    paths, rect = _page_paths(app_module, pdf(between=False))
+    assert len(app_module._coalesce_vector_paths(paths, rect)) == 1
+
+    paths, rect = _page_paths(app_module, pdf(between=True))
+    assert app_module._coalesce_vector_paths(paths, rect) == paths